@@ -1,10 +1,12 @@
 """Flask Application entry point."""
 
 from src.bh_aust_postcode import create_app
-from src.bh_aust_postcode.api.postcode_pool import load_postcode
+from src.bh_aust_postcode.api.warm_up import warm_up
 
 app = create_app()
 
+warm_up.start(app)
+
 with app.app_context():
-    load_postcode()
     from src.bh_aust_postcode.commands import update_postcode
+    from src.bh_aust_postcode.commands import profile_summary
@@ -0,0 +1,91 @@
+"""
+Benchmark helper functions.
+
+Benchmarks are standalone scripts, run from the project root against the 
+configured database or snapshot, e.g.::
+
+    python -m benchmarks.batch_lookup
+"""
+
+import os
+import time
+
+def disable_caches():
+    """Turn off search results, response and refinement caches, so that repeated 
+    searches are measured rather than cache hits. Must be called before the 
+    application is created.
+    """
+    os.environ['SEARCH_CACHE_MAX_SIZE'] = '0'
+    os.environ['RESPONSE_CACHE_MAX_SIZE'] = '0'
+    os.environ['REFINEMENT_CACHE_MAX_BYTES'] = '0'
+
+def create_benchmark_app():
+    """Create the application, and load postcodes into the configured search backend.
+
+    :return: the application, with its application context pushed.
+    :rtype: Flask.
+    """
+    from src.bh_aust_postcode import create_app
+    from src.bh_aust_postcode.api.search_backend import load_search_backend
+
+    app = create_app()
+    app.app_context().push()
+
+    load_search_backend()
+
+    return app
+
+def best_of(fn, repeat: int=5) -> float:
+    """Time a function.
+
+    :param fn: function without arguments.
+    :param int repeat: number of runs.
+
+    :return: the fastest run, in seconds.
+    :rtype: float.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+def report(name: str, seconds: float, operations: int):
+    """Print a benchmark result line.
+
+    :param str name: what was measured.
+    :param float seconds: time taken.
+    :param int operations: number of operations in that time.
+    """
+    print(f'{name:<40} {seconds * 1000:10.2f} ms {operations / seconds:12.0f} ops/s')
+
+def latencies(fn, arguments: list) -> list:
+    """Time a function once per argument.
+
+    :param fn: function of one argument.
+    :param list arguments: the arguments, one call each.
+
+    :return: sorted call times, in seconds.
+    :rtype: list.
+    """
+    times = []
+    for argument in arguments:
+        start = time.perf_counter()
+        fn(argument)
+        times.append(time.perf_counter() - start)
+
+    return sorted(times)
+
+def report_latencies(name: str, times: list):
+    """Print a latency percentiles line.
+
+    :param str name: what was measured.
+    :param list times: sorted call times, in seconds, see :func:`latencies`.
+    """
+    def percentile(p):
+        return times[min(len(times) - 1, int(len(times) * p / 100))] * 1000
+
+    print(f'{name:<40} p50 {percentile(50):7.2f} ms  p95 {percentile(95):7.2f} ms  '
+          f'p99 {percentile(99):7.2f} ms  max {times[-1] * 1000:7.2f} ms')
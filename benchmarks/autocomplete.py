@@ -0,0 +1,83 @@
+"""
+Autocomplete typing replay.
+
+Replays users typing random localities character by character, as the jQuery plugin
+sends them: from the third character on, until the locality is typed out or a
+handful of postcodes are left to pick from, now and then mistyping a character and
+deleting it again. Every keystroke is searched through :meth:`PostcodePool.search`
+and through ``GET /api/v0/aust-postcode/<locality>``, with the refinement cache off,
+then on, all other caches disabled, and latency percentiles are reported::
+
+    python -m benchmarks.autocomplete [sessions]
+"""
+
+import sys
+import random
+import string
+
+from benchmarks import (
+    disable_caches,
+    create_benchmark_app,
+    latencies,
+    report_latencies,
+)
+
+#: The plugin only searches texts of at least this many characters.
+MIN_LENGTH = 3
+#: Users stop typing once this few postcodes are left to pick from.
+PICK_AT = 5
+#: Chance of mistyping a character, then deleting it, per keystroke.
+TYPO_RATE = 0.1
+
+def typing_sequence(rng: random.Random, locality: str, search) -> list:
+    """The search texts sent while typing a locality.
+
+    :param random.Random rng: random number generator.
+    :param str locality: the locality being typed.
+    :param search: search function, to know when the user stops.
+
+    :return: search texts, in the order sent.
+    :rtype: list.
+    """
+    texts = []
+    for length in range(MIN_LENGTH, len(locality) + 1):
+        typed = locality[:length]
+        if rng.random() < TYPO_RATE:
+            texts.append(typed[:-1] + rng.choice(string.ascii_lowercase))
+        texts.append(typed)
+
+        if len(search(typed)) <= PICK_AT: break
+
+    return texts
+
+def main(sessions: int=500):
+    disable_caches()
+    app = create_benchmark_app()
+    client = app.test_client()
+
+    from src.bh_aust_postcode.api.postcode_pool import postcode_pool, PostcodePool
+    from src.bh_aust_postcode.api.refinement_cache import RefinementCache
+
+    rng = random.Random(0)
+    postcodes = PostcodePool.postcodes
+    texts = []
+    for _ in range(sessions):
+        locality = postcodes[rng.randrange(len(postcodes))]['locality'].lower()
+        texts.extend(typing_sequence(rng, locality, postcode_pool.search))
+
+    def get(text):
+        return client.get(f'/api/v0/aust-postcode/{text}')
+
+    max_bytes = 4 * 1024 * 1024
+    for name in ['off', 'on']:
+        for label, fn in [('PostcodePool.search', postcode_pool.search), ('GET /<locality>', get)]:
+            PostcodePool.refinement_cache = RefinementCache(max_bytes) if name == 'on' else None
+            report_latencies(f'refinement {name}: {label} ({len(texts)})', latencies(fn, texts))
+
+        if PostcodePool.refinement_cache != None:
+            info = PostcodePool.refinement_cache.info()
+            print(f"refinement cache: {info['hits']} hits, {info['refinements']} refinements, "
+                  f"{info['misses']} misses, {info['size']} entries, {info['bytes']} bytes")
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,56 @@
+"""
+Batch lookup against one request per locality.
+
+Resolves the same localities through ``POST /api/v0/aust-postcode/batch`` in
+batches, and through ``GET /api/v0/aust-postcode/<locality>`` one at a time, 
+in a single process with caches disabled, and reports localities per second::
+
+    python -m benchmarks.batch_lookup [localities] [batch size]
+"""
+
+import sys
+import random
+
+from benchmarks import (
+    disable_caches,
+    create_benchmark_app,
+    best_of,
+    report,
+)
+
+def sample_localities(count: int) -> list:
+    """Random search texts: leading 3 to 8 letters of random localities.
+    """
+    from src.bh_aust_postcode.api.postcode_pool import postcode_pool
+
+    rng = random.Random(0)
+    postcodes = postcode_pool.postcodes
+    samples = []
+    while len(samples) < count:
+        locality = postcodes[rng.randrange(len(postcodes))]['locality']
+        if len(locality) >= 3: samples.append(locality[:rng.randint(3, 8)].lower())
+
+    return samples
+
+def main(count: int=1000, batch_size: int=100):
+    disable_caches()
+    app = create_benchmark_app()
+    client = app.test_client()
+
+    localities = sample_localities(count)
+    batches = [[{'locality': locality} for locality in localities[pos:pos + batch_size]]
+               for pos in range(0, count, batch_size)]
+
+    def one_by_one():
+        for locality in localities:
+            client.get(f'/api/v0/aust-postcode/{locality}')
+
+    def batched():
+        for batch in batches:
+            client.post('/api/v0/aust-postcode/batch', json={'localities': batch})
+
+    report(f'GET one by one ({count})', best_of(one_by_one, 3), count)
+    report(f'POST batch of {batch_size} ({count})', best_of(batched, 3), count)
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
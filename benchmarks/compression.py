@@ -0,0 +1,67 @@
+"""
+Response compression: bytes on the wire and CPU per request.
+
+Requests broad partial searches, whose results are large, through
+``GET /api/v0/aust-postcode/<locality>`` with each ``Accept-Encoding``, and reports
+the bytes sent and the CPU time per request, once with the response cache disabled,
+so every request is searched, serialised and compressed, and once with hot
+responses served from the response cache, already compressed::
+
+    python -m benchmarks.compression [rounds]
+"""
+
+import os
+import sys
+import time
+
+from benchmarks import create_benchmark_app
+
+#: Partial searches with hundreds to thousands of matches.
+LOCALITIES = ['spring', 'mount', 'ton', 'ale', 'vale', 'ing', 'ville', 'creek', 'hill', 'bay']
+
+ENCODINGS = ['identity', 'gzip', 'br']
+
+def measure(client, encoding: str, rounds: int) -> tuple:
+    """Request every locality ``rounds`` times with an ``Accept-Encoding``.
+
+    :return: bytes sent per request, and CPU seconds per request.
+    :rtype: tuple.
+    """
+    headers = {'Accept-Encoding': encoding}
+
+    sent = 0
+    started = time.process_time()
+    for _ in range(rounds):
+        for locality in LOCALITIES:
+            sent += len(client.get(f'/api/v0/aust-postcode/{locality}', headers=headers).get_data())
+    cpu = time.process_time() - started
+
+    requests = rounds * len(LOCALITIES)
+    return sent / requests, cpu / requests
+
+def main(rounds: int=20):
+    # Searches are cached either way: only serialisation and compression differ.
+    os.environ['REFINEMENT_CACHE_MAX_BYTES'] = '0'
+    app = create_benchmark_app()
+    client = app.test_client()
+
+    from src.bh_aust_postcode.api.compression import available_encodings
+
+    supported = ['identity'] + available_encodings()
+    for cache_size in [0, app.config['RESPONSE_CACHE_MAX_SIZE']]:
+        app.config['RESPONSE_CACHE_MAX_SIZE'] = cache_size
+        label = 'cached' if cache_size > 0 else 'uncached'
+
+        for encoding in ENCODINGS:
+            if encoding not in supported:
+                print(f'{label}: {encoding:<8} not available')
+                continue
+
+            # Fill the cache first, hits are measured.
+            if cache_size > 0: measure(client, encoding, 1)
+
+            sent, cpu = measure(client, encoding, rounds)
+            print(f'{label}: {encoding:<8} {sent / 1024:10.1f} KB/request {cpu * 1000:8.3f} ms CPU/request')
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,60 @@
+"""
+Fuzzy search latency.
+
+Searches misspelt localities, made by applying one or two random typos to random
+localities, through :meth:`PostcodePool.search_fuzzy` and through
+``GET /api/v0/aust-postcode/fuzzy/<locality>``, caches disabled, and reports 
+latency percentiles::
+
+    python -m benchmarks.fuzzy_search [searches]
+"""
+
+import sys
+import random
+import string
+
+from benchmarks import (
+    disable_caches,
+    create_benchmark_app,
+    latencies,
+    report_latencies,
+)
+
+def misspell(rng: random.Random, word: str) -> str:
+    """Apply one or two random deletions, insertions, substitutions or transpositions.
+    """
+    chars = list(word)
+    for _ in range(rng.randint(1, 2)):
+        pos = rng.randrange(len(chars))
+        typo = rng.randrange(4)
+        if typo == 0 and len(chars) > 1: del chars[pos]
+        elif typo == 1: chars.insert(pos, rng.choice(string.ascii_lowercase))
+        elif typo == 2: chars[pos] = rng.choice(string.ascii_lowercase)
+        elif pos + 1 < len(chars): chars[pos], chars[pos + 1] = chars[pos + 1], chars[pos]
+
+    return ''.join(chars)
+
+def main(count: int=2000):
+    disable_caches()
+    app = create_benchmark_app()
+    client = app.test_client()
+
+    from src.bh_aust_postcode.api.postcode_pool import postcode_pool, PostcodePool
+
+    if PostcodePool.fuzzy_index == None:
+        print('Fuzzy search is disabled: FUZZY_MAX_DISTANCE is 0.')
+        return
+
+    rng = random.Random(0)
+    postcodes = PostcodePool.postcodes
+    localities = [misspell(rng, postcodes[rng.randrange(len(postcodes))]['locality'].lower())
+                  for _ in range(count)]
+
+    report_latencies(f'PostcodePool.search_fuzzy ({count})', 
+                     latencies(postcode_pool.search_fuzzy, localities))
+    report_latencies(f'GET /fuzzy/<locality> ({count})', 
+                     latencies(lambda locality: client.get(f'/api/v0/aust-postcode/fuzzy/{locality}'),
+                               localities))
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
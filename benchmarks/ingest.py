@@ -0,0 +1,76 @@
+"""
+Postcode ingest into PostgreSQL.
+
+Loads the same records, downloaded from ``SOURCE_POSTCODE_URL``, into a temporary
+table three ways: one ``INSERT`` per row as ``update-postcode`` used to, batched
+``execute_values``, and ``COPY ... FROM STDIN`` as it does now. Each run is rolled
+back, so neither the postcode table nor the database keeps anything::
+
+    python -m benchmarks.ingest
+"""
+
+import time
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from benchmarks import (
+    create_benchmark_app,
+    report,
+)
+
+TABLE_NAME = 'ingest_benchmark'
+
+def insert_rows(cursor, records):
+    for itm in records:
+        locality = itm['locality'].replace("'", "''")
+        cursor.execute(f"INSERT INTO {TABLE_NAME} (locality, state, postcode) "
+                       f"VALUES ('{locality}', '{itm['state']}', '{itm['postcode']}')")
+
+def insert_values(cursor, records):
+    execute_values(cursor, f'INSERT INTO {TABLE_NAME} (locality, state, postcode) VALUES %s',
+                   [(itm['locality'], itm['state'], str(itm['postcode'])) for itm in records],
+                   page_size=1000)
+
+def main():
+    app = create_benchmark_app()
+
+    from src.bh_aust_postcode.config import get_database_connection
+    from src.bh_aust_postcode.commands.update_postcode import (
+        get_json_content,
+        copy_postcodes,
+    )
+
+    result, records, _ = get_json_content()
+    if not result:
+        print(records)
+        return
+
+    # Every loader is timed on the same records.
+    records = list(records)
+
+    def copy_rows(cursor, records):
+        copy_postcodes(cursor, records, TABLE_NAME)
+
+    connection = psycopg2.connect(**get_database_connection())
+    try:
+        for name, load in [('INSERT per row', insert_rows), 
+                           ('execute_values', insert_values), 
+                           ('COPY FROM STDIN', copy_rows)]:
+            cursor = connection.cursor()
+            cursor.execute(f'CREATE TEMP TABLE {TABLE_NAME} ('
+                           'locality varchar(128), state varchar(3), postcode varchar(4))')
+
+            start = time.perf_counter()
+            load(cursor, records)
+            seconds = time.perf_counter() - start
+
+            cursor.close()
+            connection.rollback()
+
+            report(f'{name} ({len(records)})', seconds, len(records))
+    finally:
+        connection.close()
+
+if __name__ == '__main__':
+    main()
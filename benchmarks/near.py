@@ -0,0 +1,87 @@
+"""
+Nearest postcode lookups: KD-tree spatial index against a brute force scan.
+
+Picks random points over Australia, and finds the 10 nearest postcodes, and the
+postcodes within 25 km, of each, via
+:meth:`~src.bh_aust_postcode.api.postcode_index.SpatialIndex.nearest` and by
+measuring the haversine distance to every postcode. Both must find the same
+postcodes. Latency percentiles are reported, together with those of
+``GET /api/v0/aust-postcode/near``, for trees of several leaf sizes::
+
+    python -m benchmarks.near [points]
+"""
+
+import sys
+import random
+
+from benchmarks import (
+    create_benchmark_app,
+    latencies,
+    report_latencies,
+)
+
+#: Latitude and longitude bounds of the random points.
+BOUNDS = ((-43.5, -10.5), (113.5, 153.5))
+K = 10
+RADIUS = 25.0
+LEAF_SIZES = [4, 8, 16, 32]
+
+def scan(coordinates, latitude: float, longitude: float, k: int=None, radius: float=None) -> list:
+    """The nearest positions, by measuring the distance to every postcode.
+
+    :return: ``(distance, position)`` tuples, nearest first.
+    :rtype: list.
+    """
+    from src.bh_aust_postcode.api.postcode_index import haversine_km
+
+    ranked = []
+    for pos in range(len(coordinates) // 2):
+        pos_latitude = coordinates[2 * pos]
+        # Unknown coordinates are NaN.
+        if pos_latitude != pos_latitude: continue
+
+        distance = haversine_km(latitude, longitude, pos_latitude, coordinates[2 * pos + 1])
+        if radius == None or distance <= radius: ranked.append((distance, pos))
+
+    ranked.sort()
+    return ranked if k == None else ranked[:k]
+
+def main(points: int=200):
+    app = create_benchmark_app()
+    client = app.test_client()
+
+    from src.bh_aust_postcode.api.postcode_pool import PostcodePool
+    from src.bh_aust_postcode.api.postcode_index import SpatialIndex
+
+    coordinates = PostcodePool.coordinates
+    if PostcodePool.spatial_index == None or PostcodePool.spatial_index.count == 0:
+        print('Postcodes have no coordinates: run flask update-postcode --force.')
+        return
+
+    rng = random.Random(0)
+    (south, north), (west, east) = BOUNDS
+    queries = [(rng.uniform(south, north), rng.uniform(west, east)) for _ in range(points)]
+
+    print(f'{PostcodePool.spatial_index.count} postcodes with coordinates, {points} points')
+
+    for label, k, radius in [(f'k={K}', K, None), (f'radius={RADIUS:g} km', None, RADIUS)]:
+        expected = [scan(coordinates, latitude, longitude, k, radius) for latitude, longitude in queries]
+        report_latencies(f'{label}: brute force haversine', 
+                         latencies(lambda query: scan(coordinates, *query, k, radius), queries))
+
+        for leaf_size in LEAF_SIZES:
+            index = SpatialIndex(coordinates, leaf_size)
+            found = [index.nearest(latitude, longitude, k, radius) for latitude, longitude in queries]
+            assert ([[pos for _, pos in result] for result in found] 
+                    == [[pos for _, pos in result] for result in expected])
+
+            report_latencies(f'{label}: KD-tree, leaves of {leaf_size}', 
+                             latencies(lambda query: index.nearest(*query, k, radius), queries))
+
+    def get(query):
+        return client.get(f'/api/v0/aust-postcode/near?lat={query[0]}&lon={query[1]}&k={K}')
+
+    report_latencies(f'GET /near k={K}', latencies(get, queries))
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
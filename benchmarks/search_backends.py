@@ -0,0 +1,99 @@
+"""
+Search backend latency and memory.
+
+Runs the same partial, prefix and postcode searches against each search backend,
+each in a fresh process so that memory is measured separately, caches disabled,
+and reports latency percentiles and the process's peak resident memory::
+
+    python -m benchmarks.search_backends [searches]
+
+Peak resident memory is reported before the application is created, once the
+backend is loaded and after all searches. It is read via :mod:`resource`, so only
+on Unix. Settings such as ``POSTCODE_SNAPSHOT_FILE`` and ``POSTCODE_POOL_COMPACT`` 
+are passed on from the environment, e.g. to compare loading the memory backend from
+the database rather than the snapshot::
+
+    POSTCODE_SNAPSHOT_FILE= python -m benchmarks.search_backends
+"""
+
+import os
+import random
+import resource
+import subprocess
+import sys
+
+from benchmarks import (
+    disable_caches,
+    create_benchmark_app,
+    latencies,
+    report_latencies,
+)
+
+BACKENDS = ['memory', 'postgres', 'sqlite']
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process, in MB. Linux reports KB, macOS bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def queries(count: int) -> tuple:
+    """The same searches for every backend: substrings and starts of random
+    localities, and their postcodes, queried straight from the database.
+
+    :return: partial search texts, prefix search texts and postcodes.
+    :rtype: tuple.
+    """
+    from src.bh_aust_postcode.utils import format_sql_statement
+    from src.bh_aust_postcode.utils.db_pool import get_connection_pool
+
+    with get_connection_pool().connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(format_sql_statement('SELECT locality, postcode FROM {0}.{1} ORDER BY id'))
+        rows = cursor.fetchall()
+        cursor.close()
+
+    rng = random.Random(0)
+    sample = [rows[rng.randrange(len(rows))] for _ in range(count)]
+    del rows
+
+    partial, prefix = [], []
+    for locality, _ in sample:
+        start = rng.randrange(max(1, len(locality) - 3))
+        partial.append(locality[start:start + rng.randint(3, 6)].lower())
+        prefix.append(locality[:rng.randint(3, 6)].lower())
+
+    return partial, prefix, [postcode for _, postcode in sample]
+
+def run(name: str, count: int):
+    """Benchmark one backend, in this process."""
+    os.environ['SEARCH_BACKEND'] = name
+    disable_caches()
+
+    started = peak_rss_mb()
+    app = create_benchmark_app()
+    loaded = peak_rss_mb()
+
+    from src.bh_aust_postcode.api.search_backend import get_search_backend
+
+    backend = get_search_backend()
+
+    partial, prefix, postcodes = queries(count)
+    client = app.test_client()
+
+    report_latencies(f'{name}: search ({count})', latencies(backend.search, partial))
+    report_latencies(f'{name}: search_prefix ({count})', latencies(backend.search_prefix, prefix))
+    report_latencies(f'{name}: search_postcode ({count})', latencies(backend.search_postcode, postcodes))
+    report_latencies(f'{name}: GET /<locality> ({count})', 
+                     latencies(lambda locality: client.get(f'/api/v0/aust-postcode/{locality}'), partial))
+
+    print(f'{name}: peak RSS {started:.1f} MB started, {loaded:.1f} MB loaded, '
+          f'{peak_rss_mb():.1f} MB searched')
+
+def main(count: int=2000):
+    for name in BACKENDS:
+        subprocess.run([sys.executable, '-m', 'benchmarks.search_backends', str(count), name], check=True)
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    if len(sys.argv) > 2: run(sys.argv[2], count)
+    else: main(count)
@@ -18,13 +18,23 @@
  *                  http://www.gnu.org/licenses/gpl.html
  *
  * @github          https://github.com/behai-nguyen/bh-aust-postcode/jquery-bhaustpostcode
- * @version         1.0.0
+ * @version         1.1.0
  *
  ******************************************/
  
 (function($) {
     'use strict';
 
+    // Layout of the postcode bundle this plugin can search.
+    const BUNDLE_FORMAT = 1;
+
+    // Postcode bundle downloads by URL, shared by all instances on the page.
+    var bundles = {};
+
+    // Last 200 OK result of each search URL, shared by all instances on the page
+    // as jQuery's ETags are, see option reuseETags.
+    var results = {};
+
     $.bhAustPostcode = {
 		defaults: {
             // Postcode server URL.
@@ -83,6 +93,21 @@
             // Feedback message when in error and no error message.
             errorMsg: 'Something has happened. Please check server.',
 
+            // Revalidate repeated searches with the ETag of their last response:
+            // the server answers 304 Not Modified without a body, and the result
+            // kept from that last response gets displayed. jQuery keeps ETags by
+            // URL for the whole page, so results are kept by URL for all instances
+            // on the page too.
+            reuseETags: true,
+
+            // Search in the browser: download the bundle of all postcodes once,
+            // then search it locally. Until it has downloaded, or if it cannot be,
+            // searches go to url as usual.
+            clientSide: false,
+
+            // URL of the postcode bundle. Default is bundle.json under url.
+            bundleUrl: null,
+
             // CSS theme -- see bhAustPostcode.css.
             theme: 'safe'
 		}
@@ -107,10 +132,15 @@
 		// DOM: this.$resultPanel main display area.
 		this.$resultArea = null;
 
+        // Downloaded postcode bundle, see option clientSide.
+        this.bundle = null;
+
         this.options = options;
 		this.options.url += this.options.url.endsWith( '/' ) ? '' : '/';
 
         this._generate();
+
+        if ( this.options.clientSide ) this._loadBundle();
     }
 
     AustPostcode.prototype = {
@@ -168,44 +198,129 @@
 			});
 		},
 
-        _doSearch: function( val ) {
-			let searchURL = this.options.url + val;
+        _renderResult: function( status ) {
+			if ( status.status.code != OK ) return;
 
 			let _this = this;
 
-			runAjaxEx( 'get', searchURL, {}, X_WWW_FORM_URLENCODED_UTF8, '' )
-			    .then( function( data ) {
-					let { status } = data;
+			this.$resultArea.empty();
+
+			status.data.localities.forEach( ( r ) => {
+				var html = `<div class="row mt-1 selector-item-entry"
+				                data-item-locality="${r.locality}"
+								data-item-state="${r.state}"
+								data-item-postcode="${r.postcode}">
+								<div class="col-8">${r.locality}</div>
+								<div class="col">${r.state}</div>
+								<div class="col">${r.postcode}</div>
+							</div>`;
+				_this.$resultArea.append( $(html) );
+			});
 
-					if ( status.status.code != OK ) return;
+			this._bindItemsEvent();
 
-					_this.$resultArea.empty();
+			this._showResultPanel();
+		},
 
-					status.data.localities.forEach( ( r ) => {
-						var html = `<div class="row mt-1 selector-item-entry"
-						                data-item-locality="${r.locality}"
-										data-item-state="${r.state}"
-										data-item-postcode="${r.postcode}">
-										<div class="col-8">${r.locality}</div>
-										<div class="col">${r.state}</div>
-										<div class="col">${r.postcode}</div>
-									</div>`;
-						_this.$resultArea.append( $(html) );
-					});
+		_showError: function( xhr, error, errorThrown ) {
+			let msg = errorThrown ? ( errorThrown.length > 0 )
+			    : this.options.errorMsg;
+
+			new GenericDialog({ dialogId: '#errDlg',
+			    title: 'For your info...', buttonClass: 'btn-danger',
+			    bodyText: `<span><strong>${msg}</strong></span>`}).open();
+		},
+
+        _loadBundle: function() {
+			let bundleURL = this.options.bundleUrl || ( this.options.url + 'bundle.json' );
+
+			// Downloaded once per page. The server revalidates it with its ETag.
+			if ( !bundles[ bundleURL ] )
+			    bundles[ bundleURL ] = $.ajax({ type: 'get', url: bundleURL, dataType: 'json' });
+
+			let _this = this;
+
+			bundles[ bundleURL ].done( function( status ) {
+				if ( status.status.code == OK && status.data.bundle.format == BUNDLE_FORMAT )
+				    _this.bundle = status.data.bundle;
+			});
+		},
+
+        // The same result as the server's partial search, from the bundle.
+        _searchBundle: function( val ) {
+			let text = val.toUpperCase();
+			let { localities, states, postcodes } = this.bundle;
+
+			let matched = localities.map( ( locality ) => locality.includes( text ) );
+
+			let result = [];
+			postcodes.forEach( ( [ locality, state, postcode ] ) => {
+				if ( matched[ locality ] )
+				    result.push({ locality: localities[ locality ], state: states[ state ],
+					              postcode: postcode });
+			});
+
+			if ( result.length == 0 )
+			    return { status: { code: 404, text: `No localities matched '${val}'` } };
+
+			return { status: { code: OK, text: '' }, data: { localities: result } };
+		},
+
+        _doSearch: function( val ) {
+			if ( this.bundle ) {
+				this._renderResult( this._searchBundle( val ) );
+				return;
+			}
+
+			let searchURL = this.options.url + val;
+
+			let _this = this;
 
-					_this._bindItemsEvent();
+			if ( !this.options.reuseETags ) {
+				runAjaxEx( 'get', searchURL, {}, X_WWW_FORM_URLENCODED_UTF8, '' )
+				    .then( function( data ) {
+						let { status } = data;
+						_this._renderResult( status );
+					}).
+					catch( function( data ) {
+					    let { xhr, error, errorThrown } = data;
+						_this._showError( xhr, error, errorThrown );
+					});
 
-					_this._showResultPanel();
+				return;
+			}
+
+			// jQuery remembers the ETag of each URL and sends it in If-None-Match.
+			// On 304 Not Modified, there is no body: reuse the result kept from
+			// the last 200 OK of the same URL, by whichever instance.
+			$.ajax({ type: 'get', url: searchURL, dataType: 'json', ifModified: true })
+			    .done( function( status, textStatus, xhr ) {
+					if ( textStatus != 'notmodified' ) {
+						results[ searchURL ] = status;
+						_this._renderResult( status );
+					}
+					else if ( results[ searchURL ] ) _this._renderResult( results[ searchURL ] );
+					// The ETag came from a response which was not kept, e.g. one
+					// of another $.ajax() call on the page: ask for the body again.
+					else _this._searchUnconditionally( searchURL );
 				}).
-				catch( function( data ) {
-				    let { xhr, error, errorThrown } = data;
+				fail( function( xhr, error, errorThrown ) {
+					_this._showError( xhr, error, errorThrown );
+				});
+		},
 
-                    let msg = errorThrown ? ( errorThrown.length > 0 )
-					    : _this.options.errorMsg;
+		// Search without ifModified, so without If-None-Match, keeping the result
+		// for option reuseETags.
+		_searchUnconditionally: function( searchURL ) {
+			let _this = this;
 
-					new GenericDialog({ dialogId: '#errDlg',
-					    title: 'For your info...', buttonClass: 'btn-danger',
-					    bodyText: `<span><strong>${msg}</strong></span>`}).open();
+			$.ajax({ type: 'get', url: searchURL, dataType: 'json' })
+			    .done( function( status ) {
+					results[ searchURL ] = status;
+					_this._renderResult( status );
+				}).
+				fail( function( xhr, error, errorThrown ) {
+					_this._showError( xhr, error, errorThrown );
 				});
 		},
 
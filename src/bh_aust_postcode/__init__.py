@@ -26,8 +26,15 @@ def create_app(config=None):
 
     register_loggers()
 
-    from src.bh_aust_postcode.api import api_bp
+    from src.bh_aust_postcode.api import api_bp, health_bp
+    from src.bh_aust_postcode.api.generation_stamp import check_generation_stamp
+    from src.bh_aust_postcode.api.metrics import register_metrics
+    from src.bh_aust_postcode.api.profiling import register_profiling
     app.register_blueprint(api_bp)
+    app.register_blueprint(health_bp)
+    app.before_request(check_generation_stamp)
+    register_metrics(app)
+    register_profiling(app)
 	
     cors.init_app(app)
     
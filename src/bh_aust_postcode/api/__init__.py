@@ -4,8 +4,19 @@ from flask import Blueprint
 from flask_restx import Api
 
 from src.bh_aust_postcode.api.routes import tree_ns
+from src.bh_aust_postcode.api.compression import compress_response
+from src.bh_aust_postcode.api.health import health_bp
+from src.bh_aust_postcode.api.metrics import (
+    metrics_bp,
+    start_request_timer,
+    observe_request,
+)
 
 api_bp = Blueprint( 'api', __name__, url_prefix='/api/v0' )
+api_bp.before_request( start_request_timer )
+# After request handlers run last registered first: time compression too.
+api_bp.after_request( observe_request )
+api_bp.after_request( compress_response )
 
 api = Api(
     api_bp,
@@ -5,13 +5,22 @@ Relevant test modules:
     * ./tests/test_bro.py
 """
 
+import hmac
 import re
+import time
 
 from http import HTTPStatus
 
+from flask import current_app as app
+
 from bh_apistatus.result_status import make_status
 
-from src.bh_aust_postcode.api.postcode_pool import postcode_pool
+from src.bh_aust_postcode.api.search_backend import get_search_backend
+from src.bh_aust_postcode.utils.cache import LRUCache
+from src.bh_aust_postcode.api.metrics import (
+    observe_search,
+    timed_backend_search,
+)
 
 MIN_LOCALITY_LENGTH = 3
 
@@ -19,13 +28,212 @@ INFO_INVALID_TOO_SHORT_MSG = "Must have at least {!r} characters: {!r}"
 INFO_INVALID_CHARACTERS_MSG = ("{!r} is invalid. Accept only letters, space, hyphen and "
                                "single quote characters." )
 INFO_NO_MATCHED_MSG = 'No localities matched {!r}'
+INFO_INVALID_PAGE_MSG = ("Offset must be 0 or more, and limit from 1 to {!r}: "
+                         "offset {!r}, limit {!r}")
+INFO_INVALID_STATE_MSG = "{!r} is invalid. State must be 2 or 3 letters."
+INFO_INVALID_POSTCODE_MSG = "{!r} is invalid. Postcode must be 4 digits."
+INFO_NO_POSTCODE_MSG = 'No localities have postcode {!r}'
+INFO_INVALID_DISTANCE_MSG = "Distance must be from 1 to {!r}: {!r}"
+INFO_FUZZY_DISABLED_MSG = 'Fuzzy search is not enabled.'
+INFO_BATCH_TOO_LARGE_MSG = "Batch must have from 1 to {!r} localities: {!r}"
+INFO_ADMIN_DISABLED_MSG = 'Admin endpoints are not enabled.'
+INFO_ADMIN_UNAUTHORIZED_MSG = 'Missing or invalid admin token.'
+INFO_RELOAD_FAILED_MSG = 'Reloading postcodes failed: {!r}'
+INFO_BUNDLE_UNAVAILABLE_MSG = 'The postcode bundle is only available from the memory search backend.'
+INFO_BUNDLE_VERSION_MSG = 'No postcode bundle has version {!r}'
+INFO_NEAR_UNAVAILABLE_MSG = 'Nearest localities are not available: postcodes have no coordinates.'
+INFO_INVALID_COORDINATES_MSG = ("Latitude must be from -90 to 90, and longitude from -180 to 180: "
+                                "latitude {!r}, longitude {!r}")
+INFO_INVALID_NEAR_MSG = "k must be from 1 to {!r}, and radius above 0: k {!r}, radius {!r}"
+INFO_NO_NEAR_MSG = 'No localities within {!r} km of latitude {!r}, longitude {!r}'
+
+#: Number of nearest localities :func:`search_near` returns when neither k nor radius is given.
+NEAR_DEFAULT_COUNT = 10
+
+#: Layout of :func:`postcode_bundle`, bumped whenever it changes.
+BUNDLE_FORMAT = 1
+
+LOCALITY_PATTERN = re.compile(r"^[A-Za-z, ' ', -, ']+$")
+STATE_PATTERN = re.compile(r"^[A-Za-z]{2,3}$")
+POSTCODE_PATTERN = re.compile(r"^[0-9]{4}$")
+
+#: Search modes, part of the search results and response cache keys.
+SEARCH_MODE_PARTIAL = 'partial'
+SEARCH_MODE_PREFIX = 'prefix'
+SEARCH_MODE_POSTCODE = 'postcode'
+SEARCH_MODE_FUZZY = 'fuzzy'
+SEARCH_MODE_BUNDLE = 'bundle'
+#: Search mode of :func:`search_near`, only part of its metrics.
+SEARCH_MODE_NEAR = 'near'
+
+#: Search results cache. Created on first use, see :func:`search_cache_info`.
+__search_cache = None
+
+def __validate_locality(locality: str) -> dict:
+    """Validate a locality search text.
+
+    :param str locality: the locality / suburb search text.
+
+    :return: None if valid. Otherwise, dictionary representation of a 
+        `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_ 
+        with code HTTPStatus.BAD_REQUEST.
+    """
+
+    if (len(locality) < MIN_LOCALITY_LENGTH):
+        return make_status(HTTPStatus.BAD_REQUEST, 
+                           INFO_INVALID_TOO_SHORT_MSG.format(MIN_LOCALITY_LENGTH, locality)).as_dict()
+
+    # Locality / suburb contains only letters, space, - and '.
+    if not LOCALITY_PATTERN.match(locality):
+        return make_status(HTTPStatus.BAD_REQUEST, 
+                           INFO_INVALID_CHARACTERS_MSG.format(locality)).as_dict()
+
+    return None
+
+def __localities_status(localities: list, locality: str) -> dict:
+    """Wrap matched localities in a dictionary.
+
+    :param list localities: the matched localities.
+    :param str locality: the locality / suburb search text.
+
+    :return: dictionary representation of 
+        `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_.
+    """
+
+    if len(localities) > 0: return make_status().add_data(localities, 'localities').as_dict()
+
+    return make_status(HTTPStatus.NOT_FOUND, INFO_NO_MATCHED_MSG.format(locality)).as_dict()
+
+def __get_search_cache() -> LRUCache:
+    """Get the search results cache, creating it from configuration on first use.
+
+    :return: the cache, or None when ``SEARCH_CACHE_MAX_SIZE`` is 0.
+    :rtype: :class:`~src.bh_aust_postcode.utils.cache.LRUCache`.
+    """
+    global __search_cache
+
+    if __search_cache == None and app.config['SEARCH_CACHE_MAX_SIZE'] > 0:
+        __search_cache = LRUCache(app.config['SEARCH_CACHE_MAX_SIZE'], 
+                                  app.config['SEARCH_CACHE_TTL'])
+
+    return __search_cache
+
+def __validate_state(state: str) -> dict:
+    """Validate a state filter.
+
+    :param str state: the state, e.g. ``vic``. Case insensitive.
 
-def search_by_locality(locality: str) -> dict:
+    :return: None if valid. Otherwise, dictionary representation of a 
+        `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_ 
+        with code HTTPStatus.BAD_REQUEST.
+    """
+
+    if not STATE_PATTERN.match(state):
+        return make_status(HTTPStatus.BAD_REQUEST, INFO_INVALID_STATE_MSG.format(state)).as_dict()
+
+    return None
+
+def __validate_page(offset: int, limit: int) -> dict:
+    """Validate a page of search results.
+
+    :param int offset: number of matched localities to skip.
+    :param int limit: maximum number of matched localities. None for all.
+
+    :return: None if valid. Otherwise, dictionary representation of a 
+        `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_ 
+        with code HTTPStatus.BAD_REQUEST.
+    """
+
+    max_limit = app.config['SEARCH_MAX_PAGE_LIMIT']
+
+    if offset < 0 or (limit != None and not 1 <= limit <= max_limit):
+        return make_status(HTTPStatus.BAD_REQUEST, 
+                           INFO_INVALID_PAGE_MSG.format(max_limit, offset, limit)).as_dict()
+
+    return None
+
+def __search(locality: str, search, *params) -> dict:
+    """Validate a locality search text, search and wrap the result in a dictionary.
+
+    :param str locality: the locality / suburb search text.
+    :param search: the pool search method to call with ``locality``.
+    :param params: further arguments to ``search``.
+
+    :return: dictionary representation of 
+        `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_.
+    """
+
+    invalid = __validate_locality(locality)
+    if invalid != None: return invalid
+
+    return __localities_status(timed_backend_search(search, locality, *params), locality)
+
+def __cached_status(entry: tuple, locality: str) -> dict:
+    """The status of a search results cache entry, for the search text as spelt.
+
+    :param tuple entry: the search text the entry was cached for, and its status.
+    :param str locality: the locality / suburb search text.
+
+    :return: dictionary representation of 
+        `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_.
+    """
+
+    spelling, status = entry
+    code = status['status']['code']
+    if spelling == locality or code == HTTPStatus.OK.value: return status
+
+    # Same outcome, but errors and no matches echo the search text as spelt.
+    if code == HTTPStatus.NOT_FOUND.value: return __localities_status([], locality)
+    return __validate_locality(locality)
+
+def __cached_search(mode: str, locality: str, search, *params) -> dict:
+    """:func:`__search` through the search results cache.
+
+    Entries are keyed by the search mode, the further search arguments and the 
+    uppercased search text. Validation
+    only accepts ASCII, and is case insensitive, so all spellings of a text share the
+    same outcome. Other texts are invalid anyway, they are keyed as they are.
+
+    Results belong to the pool generation they were computed from, and are dropped 
+    when postcodes are reloaded. Validation errors and no matches are cached too.
+    Callers must not modify the returned dictionary.
+
+    :param str mode: the search mode, SEARCH_MODE_PARTIAL or SEARCH_MODE_PREFIX.
+    :param str locality: the locality / suburb search text.
+    :param search: the pool search method to call with ``locality``.
+    :param params: further arguments to ``search``.
+
+    :return: dictionary representation of 
+        `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_.
+    """
+
+    cache = __get_search_cache()
+    if cache == None: return __search(locality, search, *params)
+
+    key = (mode, *params, locality.upper() if locality.isascii() else locality)
+    generation = get_search_backend().generation
+
+    entry = cache.get(key, generation)
+    if entry != None: return __cached_status(entry, locality)
+
+    status = __search(locality, search, *params)
+    cache.put(key, (locality, status), generation)
+
+    return status
+
+@observe_search(SEARCH_MODE_PARTIAL)
+def search_by_locality(locality: str, offset: int=0, limit: int=None, state: str=None) -> dict:
     """Partial search postcodes based on locality and return matched localities
     wrapped in a dictionary.
 
     :param str locality: the locality / suburb to match on. It always assumes this 
         is a partial name of a locality / suburb. The match is always partial.
+    :param int offset: number of matched localities to skip.
+    :param int limit: maximum number of matched localities to return, at most 
+        configuration ``SEARCH_MAX_PAGE_LIMIT``. None for all. An offset past the last 
+        matched locality returns nothing found.
+    :param str state: only match localities in this state, e.g. ``vic``, case insensitive.
+        None for all states.
 
     :return: dictionary representation of 
         `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_.
@@ -83,17 +291,470 @@ def search_by_locality(locality: str) -> dict:
     proceeding any further with the result.
     """
 
-    if (len(locality) < MIN_LOCALITY_LENGTH):
+    invalid = __validate_page(offset, limit)
+    if invalid == None and state != None: invalid = __validate_state(state)
+    if invalid != None: return invalid
+
+    if state != None: state = state.upper()
+
+    return __cached_search(SEARCH_MODE_PARTIAL, locality, get_search_backend().search, 
+                           offset, limit, state)
+
+def count_by_locality(locality: str, state: str=None) -> int:
+    """Count the localities :func:`search_by_locality` matches, over all pages.
+
+    :param str locality: the locality / suburb to match on.
+    :param str state: only count localities in this state. None for all states.
+
+    :return: number of matched localities. 0 when ``locality`` or ``state`` is invalid.
+    :rtype: int.
+    """
+
+    if __validate_locality(locality) != None: return 0
+    if state != None and __validate_state(state) != None: return 0
+
+    return get_search_backend().count_matches(locality, state)
+
+def stream_by_locality(locality: str, offset: int=0, limit: int=None, state: str=None):
+    """Partial search postcodes based on locality, generating matched localities 
+    one by one as they are found.
+
+    :param str locality: the locality / suburb to match on.
+    :param int offset: number of matched localities to skip.
+    :param int limit: maximum number of matched localities, see :func:`search_by_locality`.
+    :param str state: only match localities in this state. None for all states.
+
+    :return: a generator of matched locality dictionaries. When the search is invalid, 
+        or matches nothing, it generates a single dictionary representation of 
+        `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_
+        instead, the same as :func:`search_by_locality`.
+    """
+
+    invalid = __validate_page(offset, limit)
+    if invalid == None and state != None: invalid = __validate_state(state)
+    if invalid == None: invalid = __validate_locality(locality)
+    if invalid != None:
+        yield invalid
+        return
+
+    found = False
+    for postcode in get_search_backend().iter_search(locality, offset, limit, state):
+        found = True
+        yield postcode
+
+    if not found: yield __localities_status([], locality)
+
+@observe_search(SEARCH_MODE_PREFIX)
+def search_by_locality_prefix(locality: str) -> dict:
+    """Search postcodes whose locality starts with a text and return matched localities
+    wrapped in a dictionary.
+
+    :param str locality: the start of the locality / suburb to match on. It is validated
+        the same way as :func:`search_by_locality`.
+
+    :return: dictionary representation of 
+        `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_.
+        Same structure as :func:`search_by_locality`.
+    """
+
+    return __cached_search(SEARCH_MODE_PREFIX, locality, get_search_backend().search_prefix)
+
+@observe_search(SEARCH_MODE_FUZZY)
+def search_by_locality_fuzzy(locality: str, distance: int=None) -> dict:
+    """Search postcodes whose locality is within an edit distance of a text, so that
+    misspelt localities, e.g. ``springvail``, are still found. Return matched localities,
+    nearest first, wrapped in a dictionary.
+
+    :param str locality: the whole locality / suburb, possibly misspelt. It is validated
+        the same way as :func:`search_by_locality`.
+    :param int distance: the greatest number of insertions, deletions, substitutions and
+        transpositions of adjacent characters, at most configuration ``FUZZY_MAX_DISTANCE``.
+        None for ``FUZZY_MAX_DISTANCE``. Only the ``memory`` search backend supports 
+        fuzzy search.
+
+    :return: dictionary representation of 
+        `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_.
+        Same structure as :func:`search_by_locality`.
+
+    Fuzzy search disabled, or invalid distance::
+        {
+            "status": {
+                "code": 400,
+                "text": "Distance must be from 1 to 2: 3"
+            }
+        }
+    """
+
+    max_distance = get_search_backend().fuzzy_max_distance
+    if max_distance == 0:
+        return make_status(HTTPStatus.BAD_REQUEST, INFO_FUZZY_DISABLED_MSG).as_dict()
+
+    if distance == None: distance = max_distance
+    if not 1 <= distance <= max_distance:
         return make_status(HTTPStatus.BAD_REQUEST, 
-                           INFO_INVALID_TOO_SHORT_MSG.format(MIN_LOCALITY_LENGTH, locality)).as_dict()
+                           INFO_INVALID_DISTANCE_MSG.format(max_distance, distance)).as_dict()
 
-    # Locality / suburb contains only letters, space, - and '.
-    if not re.compile(r"^[A-Za-z, ' ', -, ']+$").match(locality):
+    return __cached_search(SEARCH_MODE_FUZZY, locality, get_search_backend().search_fuzzy, distance)
+
+@observe_search(SEARCH_MODE_POSTCODE)
+def search_by_postcode(postcode: str) -> dict:
+    """Search localities which have a postcode and return them wrapped in a dictionary.
+
+    :param str postcode: the postcode to match on exactly, e.g. ``3171``.
+
+    :return: dictionary representation of 
+        `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_.
+        Same structure as :func:`search_by_locality`.
+
+    Nothing found::
+        {
+            "status": {
+                "code": 404,
+                "text": "No localities have postcode '0001'"
+            }
+        }
+
+    Invalid searches::
+        {
+            "status": {
+                "code": 400,
+                "text": "'317' is invalid. Postcode must be 4 digits."
+            }
+        }
+    """
+
+    if not POSTCODE_PATTERN.match(postcode):
         return make_status(HTTPStatus.BAD_REQUEST, 
-                           INFO_INVALID_CHARACTERS_MSG.format(locality)).as_dict()
-            
-    localities = postcode_pool.search(locality)
+                           INFO_INVALID_POSTCODE_MSG.format(postcode)).as_dict()
+
+    localities = timed_backend_search(get_search_backend().search_postcode, postcode)
+
+    if len(localities) > 0: return make_status().add_data(localities, 'localities').as_dict()
+
+    return make_status(HTTPStatus.NOT_FOUND, INFO_NO_POSTCODE_MSG.format(postcode)).as_dict()
+
+@observe_search(SEARCH_MODE_NEAR)
+def search_near(latitude: float, longitude: float, k: int=None, radius: float=None) -> dict:
+    """Search the localities nearest to a point and return them, nearest first, wrapped 
+    in a dictionary.
+
+    :param float latitude: latitude of the point, in degrees, from -90 to 90.
+    :param float longitude: longitude of the point, in degrees, from -180 to 180.
+    :param int k: the greatest number of localities, from 1 to configuration 
+        ``SEARCH_MAX_PAGE_LIMIT``. None for :data:`NEAR_DEFAULT_COUNT` without ``radius``,
+        and ``SEARCH_MAX_PAGE_LIMIT`` with it.
+    :param float radius: only localities within this many kilometres. None for the 
+        ``k`` nearest, however far.
+
+    Only the ``memory`` search backend, with postcodes loaded with their coordinates, 
+    supports searching by distance.
+
+    :return: dictionary representation of 
+        `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_.
+
+    On successful::
+        {
+            "status": {
+                "code": 200,
+                "text": ""
+            },
+            "data": {
+                "localities": [
+                    {
+                        "locality": "SPRINGVALE",
+                        "state": "VIC",
+                        "postcode": "3171",
+                        "latitude": -37.949,
+                        "longitude": 145.152,
+                        "distance": 0.412
+                    },
+                    ...
+                ]
+            }
+        }
+
+    Nothing within radius::
+        {
+            "status": {
+                "code": 404,
+                "text": "No localities within 1.0 km of latitude -30.0, longitude 135.0"
+            }
+        }
+
+    Invalid searches, or no coordinates::
+        {
+            "status": {
+                "code": 400,
+                "text": "Latitude must be from -90 to 90, and longitude from -180 to 180: latitude 95.0, longitude 145.0"
+            }
+        }
+    """
+
+    backend = get_search_backend()
+    if not backend.has_coordinates:
+        return make_status(HTTPStatus.BAD_REQUEST, INFO_NEAR_UNAVAILABLE_MSG).as_dict()
+
+    if (latitude == None or longitude == None 
+        or not -90 <= latitude <= 90 or not -180 <= longitude <= 180):
+        return make_status(HTTPStatus.BAD_REQUEST, 
+                           INFO_INVALID_COORDINATES_MSG.format(latitude, longitude)).as_dict()
+
+    max_limit = app.config['SEARCH_MAX_PAGE_LIMIT']
+    if (k != None and not 1 <= k <= max_limit) or (radius != None and not radius > 0):
+        return make_status(HTTPStatus.BAD_REQUEST, 
+                           INFO_INVALID_NEAR_MSG.format(max_limit, k, radius)).as_dict()
+
+    if k == None: k = NEAR_DEFAULT_COUNT if radius == None else max_limit
+
+    localities = timed_backend_search(backend.search_near, latitude, longitude, k, radius)
+    for locality in localities: locality['distance'] = round(locality['distance'], 3)
 
     if len(localities) > 0: return make_status().add_data(localities, 'localities').as_dict()
 
-    return make_status(HTTPStatus.NOT_FOUND, INFO_NO_MATCHED_MSG.format(locality)).as_dict()
\ No newline at end of file
+    return make_status(HTTPStatus.NOT_FOUND, 
+                       INFO_NO_NEAR_MSG.format(radius, latitude, longitude)).as_dict()
+
+def search_by_localities(items: list) -> dict:
+    """Partial search postcodes for many localities at once.
+
+    Every item is validated as :func:`search_by_locality` does, and gets the same result.
+    The batch is resolved in a single pass: the distinct searches, uppercased locality 
+    and state, are looked up in the search results cache, and those not cached are
+    searched together, see 
+    :meth:`~src.bh_aust_postcode.api.search_backend.SearchBackend.search_many`.
+
+    :param list items: dictionaries with a ``locality`` to match on, and an optional 
+        ``state`` to keep only localities in that state. At most configuration 
+        ``BATCH_MAX_SIZE`` items.
+
+    :return: dictionary representation of 
+        `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_.
+
+    On successful, ``['data']['results']`` has one result per item, in the same order::
+        {
+            "status": {
+                "code": 200,
+                "text": ""
+            },
+            "data": {
+                "results": [
+                    {
+                        "status": {
+                            "code": 200,
+                            "text": ""
+                        },
+                        "data": {
+                            "localities": [
+                                {
+                                    "locality": "SPRINGVALE",
+                                    "state": "VIC",
+                                    "postcode": "3171"
+                                },
+                                ...
+                            ]
+                        }
+                    },
+                    {
+                        "status": {
+                            "code": 404,
+                            "text": "No localities matched 'xyz'"
+                        }
+                    }
+                ]
+            }
+        }
+
+    A batch which is empty or too large::
+        {
+            "status": {
+                "code": 400,
+                "text": "Batch must have from 1 to 1000 localities: 1001"
+            }
+        }
+    """
+
+    max_size = app.config['BATCH_MAX_SIZE']
+    if not 1 <= len(items) <= max_size:
+        return make_status(HTTPStatus.BAD_REQUEST, 
+                           INFO_BATCH_TOO_LARGE_MSG.format(max_size, len(items))).as_dict()
+
+    # Positions of the valid items, by search: spellings of a locality or state share one.
+    results = []
+    searches = {}
+    for item in items:
+        locality, state = item['locality'], item.get('state')
+
+        invalid = __validate_state(state) if state != None else None
+        if invalid == None: invalid = __validate_locality(locality)
+        results.append(invalid)
+        if invalid != None: continue
+
+        search = (locality.upper(), state.upper() if state != None else None)
+        searches.setdefault(search, []).append(len(results) - 1)
+
+    def cache_key(search: tuple) -> tuple:
+        # As search_by_locality() keys them: mode, offset, limit, state, locality.
+        return (SEARCH_MODE_PARTIAL, 0, None, search[1], search[0])
+
+    backend = get_search_backend()
+    generation = backend.generation
+    cache = __get_search_cache()
+
+    entries = {}
+    if cache != None:
+        for search in searches:
+            entry = cache.get(cache_key(search), generation)
+            if entry != None: entries[search] = entry
+
+    missed = [search for search in searches if search not in entries]
+    found = timed_backend_search(backend.search_many, missed) if len(missed) > 0 else []
+
+    for search, postcodes in zip(missed, found):
+        spelling = items[searches[search][0]]['locality']
+        entry = entries[search] = (spelling, __localities_status(postcodes, spelling))
+        if cache != None: cache.put(cache_key(search), entry, generation)
+
+    for search, positions in searches.items():
+        for pos in positions:
+            results[pos] = __cached_status(entries[search], items[pos]['locality'])
+
+    return make_status().add_data(results, 'results').as_dict()
+
+def search_cache_info() -> dict:
+    """Search results cache counters, for monitoring.
+
+    :return: see :meth:`~src.bh_aust_postcode.utils.cache.LRUCache.info`. An empty 
+        dictionary when the cache is disabled via ``SEARCH_CACHE_MAX_SIZE``.
+    :rtype: dict.
+    """
+    cache = __get_search_cache()
+    return cache.info() if cache != None else {}
+
+def authorize_admin(authorization: str) -> dict:
+    """Check the credentials of an admin request against configuration ``ADMIN_TOKEN``.
+
+    :param str authorization: value of the ``Authorization`` header, expected to be 
+        ``Bearer <ADMIN_TOKEN>``. None when absent.
+
+    :return: None if authorized. Otherwise, dictionary representation of a 
+        `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_ 
+        with code HTTPStatus.FORBIDDEN when ``ADMIN_TOKEN`` is blank, or 
+        HTTPStatus.UNAUTHORIZED.
+    """
+
+    token = app.config['ADMIN_TOKEN']
+    if not token: 
+        return make_status(HTTPStatus.FORBIDDEN, INFO_ADMIN_DISABLED_MSG).as_dict()
+
+    scheme, _, credentials = (authorization or '').partition(' ')
+    if scheme.lower() != 'bearer' or \
+        not hmac.compare_digest(credentials.strip().encode(), token.encode()):
+        return make_status(HTTPStatus.UNAUTHORIZED, INFO_ADMIN_UNAUTHORIZED_MSG).as_dict()
+
+    return None
+
+def reload_postcodes() -> dict:
+    """Reload postcodes into a new pool generation, which replaces the current one 
+    only once complete. Searches keep being served meanwhile.
+
+    :return: dictionary representation of 
+        `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_.
+        On success, ``['data']['reload']`` has the new ``generation``, its number of 
+        ``postcodes``, the ``delta`` from the previous generation and the ``seconds`` 
+        taken.
+    """
+
+    backend = get_search_backend()
+    previous = backend.count
+    started = time.perf_counter()
+
+    result, message = backend.load(force_reload=True)
+    if not result: 
+        return make_status(HTTPStatus.INTERNAL_SERVER_ERROR, 
+                           INFO_RELOAD_FAILED_MSG.format(message)).as_dict()
+
+    count = backend.count
+    reload = {
+        'generation': backend.generation,
+        'postcodes': count,
+        'delta': count - previous,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+    return make_status().add_data(reload, 'reload').as_dict()
+
+def bundle_version() -> str:
+    """The version of the postcode bundle :func:`postcode_bundle` returns.
+
+    :return: the dataset version of the postcode pool, or None when there is no 
+        bundle, i.e. the search backend is not the in-memory postcode pool, or it has 
+        no postcodes.
+    :rtype: str.
+    """
+
+    backend = get_search_backend()
+    if backend.name != 'memory' or backend.count == 0: return None
+
+    return backend.version
+
+def postcode_bundle() -> dict:
+    """All postcodes of the postcode pool in a compact layout, for clients to search 
+    on their own.
+
+    Localities and states are listed once each, every postcode refers to them by 
+    index. Postcodes are in the same order as the pool, i.e. the order searches 
+    return them in.
+
+    :return: dictionary representation of 
+        `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_.
+
+    On successful::
+        {
+            "status": {
+                "code": 200,
+                "text": ""
+            },
+            "data": {
+                "bundle": {
+                    "format": 1,
+                    "version": "5f0c...",
+                    "count": 18495,
+                    "localities": ["AARONS PASS", ..., "SPRINGVALE", ...],
+                    "states": ["NSW", ..., "VIC", ...],
+                    "postcodes": [[0, 0, "2850"], ..., [10982, 7, "3171"], ...]
+                }
+            }
+        }
+
+    Without a bundle, see :func:`bundle_version`::
+        {
+            "status": {
+                "code": 404,
+                "text": "The postcode bundle is only available from the memory search backend."
+            }
+        }
+    """
+
+    backend = get_search_backend()
+    if bundle_version() == None:
+        return make_status(HTTPStatus.NOT_FOUND, INFO_BUNDLE_UNAVAILABLE_MSG).as_dict()
+
+    # One generation throughout, even if postcodes are reloaded meanwhile.
+    current = backend.current
+
+    localities, states, postcodes = {}, {}, []
+    for pc in current.postcodes:
+        locality = localities.setdefault(pc['locality'], len(localities))
+        state = states.setdefault(pc['state'], len(states))
+        postcodes.append([locality, state, pc['postcode']])
+
+    bundle = {
+        'format': BUNDLE_FORMAT,
+        'version': current.version,
+        'count': len(postcodes),
+        'localities': list(localities),
+        'states': list(states),
+        'postcodes': postcodes,
+    }
+
+    return make_status().add_data(bundle, 'bundle').as_dict()
@@ -0,0 +1,250 @@
+"""
+Compact, array-backed storage for postcodes.
+
+A list of one dictionary per postcode costs several hundred bytes per row, and
+every ``search`` writes reference counts into those objects, which defeats
+copy-on-write sharing of a ``--preload``-ed pool between gunicorn workers.
+:class:`CompactPostcodes` keeps the same rows in a handful of flat buffers:
+
+    * ``locality`` text, UTF-8 encoded, in one contiguous buffer with offsets.
+    * ``state`` as a one byte index into a small table of interned state codes.
+    * ``postcode`` packed as an unsigned 16-bit integer.
+
+Postcode dictionaries are only built when a row is actually read.
+
+Relevant test modules:
+
+    * ./tests/test_postcode_pool.py
+"""
+
+from array import array
+from sys import intern
+
+#: Width of a postcode when unpacked back into text.
+POSTCODE_LENGTH = 4
+
+def pack_postcode(postcode: str) -> int:
+    """Pack a postcode text into a small integer.
+
+    :param str postcode: the postcode, e.g. ``0870``.
+
+    :return: the postcode as an integer, e.g. ``870``.
+    :rtype: int.
+
+    :raises ValueError: ``postcode`` is not made of exactly 4 digits.
+    """
+    if len(postcode) != POSTCODE_LENGTH or not postcode.isdigit():
+        raise ValueError(f'Postcode {postcode!r} cannot be packed.')
+
+    return int(postcode)
+
+def unpack_postcode(value: int) -> str:
+    """Reverse of :func:`pack_postcode`.
+
+    :param int value: the packed postcode.
+
+    :return: the postcode text, zero padded to 4 digits.
+    :rtype: str.
+    """
+    return f'{value:04d}'
+
+def pack_texts(texts) -> tuple:
+    """UTF-8 encode texts back to back, as :class:`LocalityKeys` reads them from a buffer.
+
+    :param texts: an iterable of ``str``.
+
+    :return: the encoded texts, and their ``len(texts) + 1`` byte offsets.
+    :rtype: tuple.
+    """
+    buffer = bytearray()
+    offsets = array('I', [0])
+    for text in texts:
+        buffer += text.encode('utf-8')
+        offsets.append(len(buffer))
+
+    return bytes(buffer), offsets
+
+class LocalityKeys(object):
+    """Read only sequence of the uppercased localities in a :class:`CompactPostcodes`, 
+    suitable as keys for an index, or of any other texts held the same way.
+
+    Keys are held in one contiguous uppercased text with offsets, so reading a key 
+    costs a single slice. When that text is a UTF-8 encoded buffer, e.g. a snapshot
+    section, each key is also decoded as it is read: nothing is copied up front.
+    """
+
+    def __init__(self, text, offsets: array):
+        """
+        :param text: all keys, back to back. A ``str``, or a UTF-8 encoded buffer such
+            as ``bytes`` or ``memoryview``, see :func:`pack_texts`.
+        :param array offsets: ``len(keys) + 1`` offsets into ``text``, in characters of a
+            ``str``, in bytes of a buffer. An unsigned integer array, or a ``memoryview``
+            cast to one.
+        """
+        self.__text = text
+        self.__offsets = offsets
+        self.__encoded = not isinstance(text, str)
+
+    @property
+    def text(self):
+        """Read only property. All keys, back to back, as given.
+        """
+        return self.__text
+
+    @property
+    def offsets(self) -> array:
+        """Read only property. Offsets of the keys in :attr:`text`.
+        """
+        return self.__offsets
+
+    def __len__(self) -> int:
+        return len(self.__offsets) - 1
+
+    def __getitem__(self, pos: int) -> str:
+        offsets = self.__offsets
+        key = self.__text[offsets[pos]:offsets[pos + 1]]
+        return str(key, 'utf-8') if self.__encoded else key
+
+    def __iter__(self):
+        for pos in range(len(self)):
+            yield self[pos]
+
+def coordinate_rows(rows, coordinates: array):
+    """Split the coordinates off ``(locality, state, postcode, latitude, longitude)`` 
+    rows, as they are read.
+
+    :param rows: an iterable of ``(locality, state, postcode, latitude, longitude)`` 
+        tuples, latitude and longitude in degrees, or None when unknown.
+    :param array coordinates: float array which every row's latitude and longitude 
+        are appended to, NaN when unknown.
+
+    :return: a generator of ``(locality, state, postcode)`` tuples, e.g. for 
+        :meth:`CompactPostcodes.from_rows`.
+    """
+    nan = float('nan')
+    for row in rows:
+        latitude, longitude = row[3], row[4]
+        if latitude == None or longitude == None: coordinates.extend((nan, nan))
+        else: coordinates.extend((latitude, longitude))
+        yield row[:3]
+
+class CompactPostcodes(object):
+    """Read only sequence of postcode dictionaries, stored column by column.
+
+    Each item is a freshly built dictionary with the text fields ``locality``,
+    ``state`` and ``postcode``, the same as the items of a plain list of
+    postcodes.
+    """
+
+    def __init__(self, localities: bytes, offsets: array,
+                 state_table: tuple, states: bytes, postcodes: array):
+        """
+        :param bytes localities: UTF-8 encoded localities, back to back. Any buffer
+            supporting slicing, e.g. ``bytes`` or ``memoryview``.
+        :param array offsets: ``len(postcodes) + 1`` offsets into ``localities``.
+        :param tuple state_table: the distinct state codes.
+        :param bytes states: for each row, the index of its state in ``state_table``.
+        :param array postcodes: for each row, its packed postcode.
+        """
+        self.__localities = localities
+        self.__offsets = offsets
+        self.__state_table = state_table
+        self.__states = states
+        self.__postcodes = postcodes
+
+    @classmethod
+    def from_rows(cls, rows) -> 'CompactPostcodes':
+        """Build from ``(locality, state, postcode)`` text tuples.
+
+        :param rows: an iterable of ``(locality, state, postcode)`` tuples.
+
+        :return: the compact postcodes, in the same order as ``rows``.
+        :rtype: :class:`CompactPostcodes`.
+
+        :raises ValueError: a postcode cannot be packed, or there are more than
+            256 distinct states.
+        """
+        localities = bytearray()
+        offsets = array('I', [0])
+        state_table = {}
+        states = bytearray()
+        postcodes = array('H')
+
+        for locality, state, postcode in rows:
+            localities += locality.encode('utf-8')
+            offsets.append(len(localities))
+            states.append(state_table.setdefault(intern(state), len(state_table)))
+            postcodes.append(pack_postcode(postcode))
+
+        return cls(bytes(localities), offsets, tuple(state_table), bytes(states), postcodes)
+
+    def locality(self, pos: int) -> str:
+        """The ``locality`` of a row, without building the whole row.
+
+        :param int pos: the row position.
+
+        :return: the row's locality.
+        :rtype: str.
+        """
+        offsets = self.__offsets
+        return str(self.__localities[offsets[pos]:offsets[pos + 1]], 'utf-8')
+
+    def field(self, name: str) -> list:
+        """One text field of every row, without building the rows.
+
+        :param str name: ``locality``, ``state`` or ``postcode``.
+
+        :return: the field of each row, in row order.
+        :rtype: list.
+
+        :raises KeyError: ``name`` is not a field.
+        """
+        if name == 'state':
+            state_table = self.__state_table
+            return [state_table[state] for state in self.__states]
+
+        if name == 'postcode':
+            return [unpack_postcode(postcode) for postcode in self.__postcodes]
+
+        if name == 'locality':
+            return [self.locality(pos) for pos in range(len(self))]
+
+        raise KeyError(name)
+
+    def locality_keys(self) -> LocalityKeys:
+        """Uppercased localities, for indexing.
+
+        :return: a read only sequence of uppercased localities.
+        :rtype: :class:`LocalityKeys`.
+        """
+        keys = [self.locality(pos).upper() for pos in range(len(self))]
+
+        offsets = array('I', [0])
+        for key in keys:
+            offsets.append(offsets[-1] + len(key))
+
+        return LocalityKeys(''.join(keys), offsets)
+
+    def columns(self) -> tuple:
+        """The column buffers, in the order :class:`CompactPostcodes` takes them.
+
+        :return: localities, their offsets, state table, states and postcodes.
+        :rtype: tuple.
+        """
+        return (self.__localities, self.__offsets, self.__state_table, 
+                self.__states, self.__postcodes)
+
+    def __len__(self) -> int:
+        return len(self.__postcodes)
+
+    def __getitem__(self, pos: int) -> dict:
+        if pos < 0: pos += len(self)
+        if not 0 <= pos < len(self): raise IndexError('Postcode index out of range.')
+
+        return {'locality': self.locality(pos),
+                'state': self.__state_table[self.__states[pos]],
+                'postcode': unpack_postcode(self.__postcodes[pos])}
+
+    def __iter__(self):
+        for pos in range(len(self)):
+            yield self[pos]
@@ -0,0 +1,144 @@
+"""
+Negotiated compression of JSON responses of the API blueprint.
+
+Search results are repetitive JSON which compresses several times over. A response
+is compressed with the first of configuration ``COMPRESSION_ENCODINGS`` which the
+client accepts, per ``Accept-Encoding``, once it is at least ``COMPRESSION_MIN_SIZE``
+bytes. ``br`` needs the optional ``brotli`` package, and is skipped without it.
+
+Responses of :func:`~src.bh_aust_postcode.api.response_cache.cached_response` are
+cached already compressed, so repeated hits cost no compression. Other JSON
+responses are compressed on the way out by :func:`compress_response`. Streamed
+responses are sent as they are.
+
+Every representation has its own strong ETag: the ETag of the uncompressed
+response, suffixed with the content coding.
+
+Relevant test modules:
+
+    * ./tests/test_api_endpoints.py
+"""
+
+import gzip
+
+from flask import (
+    current_app as app,
+    request,
+    Response,
+)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#: zlib compression level of ``gzip``: most of the size reduction for a fraction of the CPU of 9.
+GZIP_LEVEL = 6
+#: Quality of ``br``, 0 to 11.
+BROTLI_QUALITY = 5
+
+def available_encodings() -> list:
+    """Content codings responses can be compressed with.
+
+    :return: configuration ``COMPRESSION_ENCODINGS`` which this process supports, in
+        order of preference. Empty when compression is disabled.
+    :rtype: list.
+    """
+    encodings = []
+    for encoding in app.config['COMPRESSION_ENCODINGS'].split(','):
+        encoding = encoding.strip().lower()
+        if encoding == 'gzip' or (encoding == 'br' and brotli != None): encodings.append(encoding)
+
+    return encodings
+
+def negotiate_encoding() -> str:
+    """The content coding to compress the response to the current request with.
+
+    :return: the most preferred of :func:`available_encodings` the request's
+        ``Accept-Encoding`` accepts with the highest quality, or None for none.
+    :rtype: str.
+    """
+    encodings = available_encodings()
+    if len(encodings) == 0: return None
+
+    return request.accept_encodings.best_match(encodings)
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a response body.
+
+    :param bytes body: the uncompressed body.
+    :param str encoding: ``gzip`` or ``br``.
+
+    :return: the compressed body.
+    :rtype: bytes.
+    """
+    if encoding == 'br': return brotli.compress(body, quality=BROTLI_QUALITY)
+
+    # mtime is fixed so that the same body always compresses to the same bytes.
+    return gzip.compress(body, GZIP_LEVEL, mtime=0)
+
+def encode_body(body: bytes, encoding: str) -> tuple:
+    """Compress a response body, if it is worth it.
+
+    :param bytes body: the uncompressed body.
+    :param str encoding: the negotiated content coding, see :func:`negotiate_encoding`.
+        None to leave the body uncompressed.
+
+    :return: the body to send, and its content coding, None when sent uncompressed
+        because ``body`` is smaller than ``COMPRESSION_MIN_SIZE`` or does not shrink.
+    :rtype: tuple.
+    """
+    if encoding == None or len(body) < app.config['COMPRESSION_MIN_SIZE']: return body, None
+
+    compressed = compress(body, encoding)
+    if len(compressed) >= len(body): return body, None
+
+    return compressed, encoding
+
+def encoding_etag(etag: str, encoding: str) -> str:
+    """The entity tag of a representation compressed with a content coding.
+
+    :param str etag: unquoted entity tag of the uncompressed representation.
+    :param str encoding: the negotiated content coding, None for none.
+
+    :return: unquoted entity tag.
+    :rtype: str.
+    """
+    return etag if encoding == None else f'{etag}-{encoding}'
+
+def vary_accept_encoding(response: Response) -> Response:
+    """Mark a response as depending on ``Accept-Encoding``, when compression is on.
+
+    :param Response response: the response.
+
+    :return: the same response.
+    :rtype: Response.
+    """
+    if len(available_encodings()) > 0: response.vary.add('Accept-Encoding')
+
+    return response
+
+def compress_response(response: Response) -> Response:
+    """``after_request`` handler of the API blueprint: compress JSON responses whose
+    compression has not already been negotiated.
+
+    :param Response response: the response.
+
+    :return: the same response, possibly with a compressed body.
+    :rtype: Response.
+    """
+    if (response.direct_passthrough or response.is_streamed or not response.is_json
+        or 'Content-Encoding' in response.headers or 'Accept-Encoding' in response.vary):
+        return response
+
+    vary_accept_encoding(response)
+    body, encoding = encode_body(response.get_data(), negotiate_encoding())
+    if encoding == None: return response
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+
+    etag, weak = response.get_etag()
+    if etag != None: response.set_etag(encoding_etag(etag, encoding), weak)
+
+    return response
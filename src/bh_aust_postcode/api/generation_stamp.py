@@ -0,0 +1,215 @@
+"""
+Propagation of postcode updates to every worker process, through a generation stamp
+file.
+
+``flask update-postcode`` writes a new stamp to configuration ``GENERATION_STAMP_FILE``,
+in the instance folder, whenever it has changed postcodes. Every worker remembers the
+stamp its postcodes were loaded under. At most every ``GENERATION_CHECK_INTERVAL``
+seconds, a request checks the file's modification time and size, a single ``stat``,
+and only reads the file when either has changed. A stamp other than the loaded one
+reloads the search backend in a background thread: requests carry on against the
+current generation until the new one is published, all at once.
+
+A worker which has not warmed up through
+:class:`~src.bh_aust_postcode.api.warm_up.WarmUp` takes the first stamp it sees as the
+one it was loaded under.
+
+Relevant test modules:
+
+    * ./tests/test_generation_stamp.py
+"""
+
+import os
+import json
+import logging
+import threading
+import time
+
+from datetime import datetime
+
+from flask import current_app as app
+
+from src.bh_aust_postcode.utils import print_log
+from src.bh_aust_postcode.api.search_backend import get_search_backend
+
+logger = logging.getLogger('admin')
+
+#: The stamp postcodes were loaded under, or the stamp file, is not known yet.
+UNKNOWN_STAMP = object()
+
+def stamp_filename() -> str:
+    """Get the full path of the generation stamp file.
+
+    :return: full path of the stamp file, or None if stamps are not configured.
+    :rtype: str.
+    """
+    file_name = app.config['GENERATION_STAMP_FILE']
+
+    return os.path.join(app.instance_path, '', file_name) if file_name else None
+
+def write_stamp(file_name: str, info: dict=None) -> str:
+    """Write a new generation stamp, atomically, so that readers never see a partial one.
+
+    :param str file_name: full path of the stamp file.
+    :param dict info: what changed, written along with the stamp for inspection, e.g.
+        the counts of the update.
+
+    :return: the new stamp.
+    :rtype: str.
+    """
+    stamp = f'{time.time_ns():x}-{os.getpid()}'
+    content = {'stamp': stamp, 'written': datetime.now().isoformat(timespec='seconds')}
+    content.update(info or {})
+
+    temp_name = f'{file_name}.{os.getpid()}.tmp'
+    with open(temp_name, 'w') as file:
+        json.dump(content, file)
+    os.replace(temp_name, file_name)
+
+    return stamp
+
+def read_stamp(file_name: str) -> str:
+    """Read the generation stamp.
+
+    :param str file_name: full path of the stamp file. None for none.
+
+    :return: the stamp, or None if there is no stamp file, or it is not valid.
+    :rtype: str.
+    """
+    if file_name == None: return None
+
+    try:
+        with open(file_name) as file:
+            return json.load(file).get('stamp')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class GenerationWatcher(object):
+    """Reloads the search backend of this process when the generation stamp changes."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__next_check = 0.0
+        self.__file_key = UNKNOWN_STAMP
+        self.__loaded = UNKNOWN_STAMP
+        self.__reloading = False
+
+        self.__checks = 0
+        self.__reloads = 0
+        self.__failures = 0
+        self.__error = ''
+        self.__seconds = None
+        self.__reloaded = None
+
+    def loaded(self, stamp: str) -> None:
+        """Record the stamp postcodes were loaded under.
+
+        :param str stamp: the stamp read before loading. None when there was no stamp.
+        """
+        with self.__lock:
+            self.__loaded = stamp
+
+    def check(self, app: object) -> bool:
+        """Check the stamp, if ``GENERATION_CHECK_INTERVAL`` seconds have passed since the
+        last check, and start reloading when it has changed. Cheap enough for every request.
+
+        :param object app: the Flask application.
+
+        :return: whether a reload was started.
+        :rtype: bool.
+        """
+        if time.monotonic() < self.__next_check: return False
+
+        interval = app.config['GENERATION_CHECK_INTERVAL']
+        file_name = stamp_filename()
+        if interval <= 0 or file_name == None: return False
+
+        # Another request is checking already.
+        if not self.__lock.acquire(blocking=False): return False
+        try:
+            self.__next_check = time.monotonic() + interval
+            if self.__reloading: return False
+
+            self.__checks += 1
+            try:
+                stat = os.stat(file_name)
+                file_key = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                file_key = None
+
+            if file_key == self.__file_key: return False
+            self.__file_key = file_key
+
+            stamp = read_stamp(file_name) if file_key != None else None
+            if self.__loaded is UNKNOWN_STAMP: self.__loaded = stamp
+            if stamp == None or stamp == self.__loaded: return False
+
+            self.__reloading = True
+        finally:
+            self.__lock.release()
+
+        threading.Thread(target=self.__reload, args=(app, stamp), name='generation-reload',
+                         daemon=True).start()
+        return True
+
+    def __reload(self, app: object, stamp: str) -> None:
+        """Body of the reload thread."""
+        print_log(logger, f'Generation stamp changed to {stamp!r}, reloading.', 'info')
+
+        started = time.perf_counter()
+        with app.app_context():
+            backend = get_search_backend()
+            try:
+                result, message = backend.load(force_reload=True)
+            except Exception as error:
+                result, message = False, str(error)
+                logger.exception(message)
+            generation = backend.generation
+
+        seconds = round(time.perf_counter() - started, 3)
+        with self.__lock:
+            self.__reloading = False
+            self.__seconds = seconds
+            if result:
+                self.__loaded = stamp
+                self.__reloads += 1
+                self.__error = ''
+                self.__reloaded = datetime.now().isoformat(timespec='seconds')
+            else:
+                # Read the stamp again at the next check, to try again.
+                self.__file_key = None
+                self.__failures += 1
+                self.__error = message
+
+        if result:
+            print_log(logger, f'Reloaded generation {generation} for stamp {stamp!r} in '
+                              f'{seconds:.3f} seconds.', 'info')
+        else:
+            print_log(logger, f'Reloading for stamp {stamp!r} failed: {message}', 'warning')
+
+    def info(self) -> dict:
+        """The state of the watcher, for monitoring.
+
+        :return: the ``stamp`` postcodes were loaded under, None for none, whether
+            ``reloading``, the number of ``checks`` which looked at the file,
+            ``reloads`` and ``failures``, the ``error`` of the last failure, the
+            ``seconds`` the last reload took and when it ``reloaded``.
+        :rtype: dict.
+        """
+        with self.__lock:
+            return {
+                'stamp': None if self.__loaded is UNKNOWN_STAMP else self.__loaded,
+                'reloading': self.__reloading,
+                'checks': self.__checks,
+                'reloads': self.__reloads,
+                'failures': self.__failures,
+                'error': self.__error,
+                'seconds': self.__seconds,
+                'reloaded': self.__reloaded,
+            }
+
+generation_watcher = GenerationWatcher()
+
+def check_generation_stamp() -> None:
+    """``before_request`` handler of the application, see :meth:`GenerationWatcher.check`."""
+    generation_watcher.check(app._get_current_object())
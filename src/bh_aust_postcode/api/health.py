@@ -0,0 +1,106 @@
+"""
+Liveness and readiness probes, outside of the versioned API and its Swagger UI:
+
+    * ``/health/live``: the worker is up and serving requests.
+    * ``/health/ready``: the worker has postcodes to search, i.e. the search backend is
+      loaded. ``503 Service Unavailable`` while it warms up, or when loading failed.
+
+Unlike searches, the HTTP status is the same as ``['status']['code']``, which is all
+load balancers and orchestrators look at.
+
+Relevant test modules:
+
+    * ./tests/test_health.py
+"""
+
+import os
+import time
+
+from http import HTTPStatus
+
+from flask import Blueprint, Response
+
+from bh_apistatus.result_status import make_status
+
+from src.bh_aust_postcode.api.search_backend import get_search_backend
+from src.bh_aust_postcode.api.response_cache import (
+    JSON_MIMETYPE,
+    json_bytes,
+)
+from src.bh_aust_postcode.api.warm_up import warm_up
+from src.bh_aust_postcode.api.generation_stamp import generation_watcher
+
+INFO_NOT_READY_MSG = 'Postcodes are not loaded: warm-up {!r}. {}'
+
+#: Time this module was imported, near enough the start of the process.
+STARTED = time.monotonic()
+
+health_bp = Blueprint('health', __name__, url_prefix='/health')
+
+def live_status() -> dict:
+    """Liveness of this worker.
+
+    :return: dictionary representation of
+        `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_,
+        always HTTPStatus.OK. ``['data']['live']`` has the worker's ``pid`` and its
+        ``uptime`` in seconds.
+    """
+
+    live = {
+        'pid': os.getpid(),
+        'uptime': round(time.monotonic() - STARTED, 3),
+    }
+
+    return make_status().add_data(live, 'live').as_dict()
+
+def ready_status() -> dict:
+    """Readiness of this worker: whether the search backend has postcodes.
+
+    :return: dictionary representation of
+        `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_,
+        with code HTTPStatus.SERVICE_UNAVAILABLE when there are no postcodes to search.
+        Either way, ``['data']['ready']`` has the search ``backend``, its ``generation``,
+        dataset ``version``, number of ``postcodes``, the ``seconds`` its last load took,
+        the state of the ``warm_up``, see
+        :meth:`~src.bh_aust_postcode.api.warm_up.WarmUp.info`, and of the generation
+        ``stamp``, see
+        :meth:`~src.bh_aust_postcode.api.generation_stamp.GenerationWatcher.info`.
+    """
+
+    backend = get_search_backend()
+    version, generation = backend.generation_info()
+    info = warm_up.info()
+
+    ready = {
+        'backend': backend.name,
+        'generation': generation,
+        'version': version,
+        'postcodes': backend.count,
+        'seconds': backend.load_seconds,
+        'warm_up': info,
+        'stamp': generation_watcher.info(),
+    }
+
+    status = (make_status() if ready['postcodes'] > 0 else
+              make_status(HTTPStatus.SERVICE_UNAVAILABLE,
+                          INFO_NOT_READY_MSG.format(info['state'], info['error'])))
+
+    return status.add_data(ready, 'ready').as_dict()
+
+def probe_response(status: dict) -> Response:
+    """Respond with a probe's status, never cached.
+
+    :rtype: Response.
+    """
+    response = Response(json_bytes(status), status=status['status']['code'], mimetype=JSON_MIMETYPE)
+    response.headers['Cache-Control'] = 'no-store'
+
+    return response
+
+@health_bp.route('/live')
+def live():
+    return probe_response(live_status())
+
+@health_bp.route('/ready')
+def ready():
+    return probe_response(ready_status())
@@ -0,0 +1,207 @@
+"""
+Metrics of the application, served at ``/metrics`` in the Prometheus text exposition
+format, outside of the versioned API and its Swagger UI:
+
+    * ``postcode_request_duration_seconds``: API requests by ``endpoint`` and ``code``,
+      the outcome of a search, ``['status']['code']``, or else the HTTP status.
+    * ``postcode_search_duration_seconds``: searches by ``mode`` and ``code``,
+      validation and the search results cache included.
+    * ``postcode_backend_search_duration_seconds``: the search backend's part of them,
+      by ``backend`` and ``method``, e.g. the scan of ``PostcodePool.search``.
+    * ``postcode_search_results``: number of localities searches found, by ``mode``.
+    * ``postcode_backend_postcodes``, ``postcode_backend_generation`` and
+      ``postcode_backend_load_seconds``: the search backend's postcodes.
+    * ``postcode_cache_*``: counters of the search results, response and refinement
+      caches, by ``cache``.
+
+Configuration ``METRICS_ENABLED`` turns all of it on or off. Under Gunicorn, set
+``METRICS_MULTIPROCESS_DIR`` so that every worker reports the requests of all, see
+:mod:`~src.bh_aust_postcode.utils.metrics`.
+
+Relevant test modules:
+
+    * ./tests/test_metrics.py
+"""
+
+import os
+import time
+
+from functools import wraps
+from http import HTTPStatus
+
+from flask import (
+    Blueprint,
+    Response,
+    current_app as app,
+    g,
+    request,
+)
+
+from src.bh_aust_postcode.api.search_backend import get_search_backend
+from src.bh_aust_postcode.utils.metrics import (
+    registry,
+    EXPOSITION_CONTENT_TYPE,
+)
+
+#: Histogram buckets of the number of localities a search found.
+RESULT_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+request_duration = registry.histogram('postcode_request_duration_seconds',
+    'Duration of API requests, by endpoint and outcome.', ('endpoint', 'code'))
+search_duration = registry.histogram('postcode_search_duration_seconds',
+    'Duration of searches, validation and search results cache included, by mode and outcome.',
+    ('mode', 'code'))
+backend_search_duration = registry.histogram('postcode_backend_search_duration_seconds',
+    'Duration of search backend calls, by backend and method.', ('backend', 'method'))
+search_results = registry.histogram('postcode_search_results',
+    'Number of localities searches found, by mode.', ('mode',), RESULT_COUNT_BUCKETS)
+
+backend_postcodes = registry.gauge('postcode_backend_postcodes',
+    'Number of postcodes of the search backend.', ('backend',))
+backend_generation = registry.gauge('postcode_backend_generation',
+    'Generation of the search backend, incremented by every load.', ('backend',))
+backend_load_seconds = registry.gauge('postcode_backend_load_seconds',
+    'Seconds the last load of the search backend took.', ('backend',))
+
+cache_hits = registry.counter('postcode_cache_hits_total', 'Cache hits, by cache.', ('cache',))
+cache_refinements = registry.counter('postcode_cache_refinements_total',
+    'Partial searches refined from the positions of a shorter search text.', ('cache',))
+cache_misses = registry.counter('postcode_cache_misses_total', 'Cache misses, by cache.', ('cache',))
+cache_evictions = registry.counter('postcode_cache_evictions_total',
+    'Entries evicted to make room, by cache.', ('cache',))
+cache_invalidations = registry.counter('postcode_cache_invalidations_total',
+    'Times all entries were dropped because postcodes were reloaded, by cache.', ('cache',))
+cache_entries = registry.gauge('postcode_cache_entries', 'Number of cached entries, by cache.',
+                               ('cache',))
+
+metrics_bp = Blueprint('metrics', __name__)
+
+def observe_search(mode: str):
+    """Decorator of search functions which return a dictionary representation of
+    `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_:
+    records their duration, outcome and number of localities found.
+
+    :param str mode: the search mode, e.g. ``partial``.
+    """
+    def decorator(search):
+        @wraps(search)
+        def observed(*args, **kwargs):
+            if not registry.enabled: return search(*args, **kwargs)
+
+            started = time.perf_counter()
+            status = search(*args, **kwargs)
+            seconds = time.perf_counter() - started
+
+            code = status['status']['code']
+            search_duration.observe(seconds, (mode, str(code)))
+            if code != HTTPStatus.BAD_REQUEST.value:
+                search_results.observe(len(status.get('data', {}).get('localities', ())), (mode,))
+
+            return status
+
+        return observed
+
+    return decorator
+
+def timed_backend_search(search, *params) -> list:
+    """Call a search backend method, recording its duration.
+
+    :param search: the bound search backend method, e.g. ``PostcodePool.search``.
+    :param params: the arguments to call it with.
+
+    :return: what ``search`` returns.
+    """
+    if not registry.enabled: return search(*params)
+
+    started = time.perf_counter()
+    result = search(*params)
+    backend_search_duration.observe(time.perf_counter() - started,
+                                    (getattr(search.__self__, 'name', ''), search.__name__))
+
+    return result
+
+def record_outcome(code: int) -> None:
+    """Record the outcome of the search a request responds with, reported by
+    ``postcode_request_duration_seconds`` instead of the HTTP status.
+
+    :param int code: ``['status']['code']`` of the response.
+    """
+    if registry.enabled: g.metrics_outcome = code
+
+def start_request_timer() -> None:
+    """``before_request`` handler of the API blueprint."""
+    if registry.enabled: g.metrics_started = time.perf_counter()
+
+def observe_request(response: Response) -> Response:
+    """``after_request`` handler of the API blueprint: records the request duration,
+    and writes this process's metrics when due in multiprocess mode."""
+    started = g.get('metrics_started')
+    if started != None:
+        code = g.get('metrics_outcome', response.status_code)
+        request_duration.observe(time.perf_counter() - started,
+                                 (request.endpoint or '', str(code)))
+    registry.flush()
+
+    return response
+
+@registry.collector
+def collect_backend() -> None:
+    """Gauges of the search backend."""
+    backend = get_search_backend()
+    labels = (backend.name,)
+
+    backend_postcodes.set(labels, backend.count)
+    backend_generation.set(labels, backend.generation)
+    if backend.load_seconds != None: backend_load_seconds.set(labels, backend.load_seconds)
+
+@registry.collector
+def collect_caches() -> None:
+    """Counters of the caches, those not created yet or disabled left out."""
+    # Imported here: both modules record their searches and responses here.
+    from src.bh_aust_postcode.api.bro import search_cache_info
+    from src.bh_aust_postcode.api.response_cache import response_cache_info
+    from src.bh_aust_postcode.api.postcode_pool import PostcodePool
+
+    refinement = PostcodePool.refinement_cache
+    caches = (('search', search_cache_info()), ('response', response_cache_info()),
+              ('refinement', refinement.info() if refinement != None else {}))
+
+    for cache, info in caches:
+        if not info: continue
+
+        labels = (cache,)
+        cache_hits.set(labels, info['hits'])
+        cache_misses.set(labels, info['misses'])
+        cache_evictions.set(labels, info['evictions'])
+        cache_invalidations.set(labels, info['invalidations'])
+        cache_entries.set(labels, info['size'])
+        if 'refinements' in info: cache_refinements.set(labels, info['refinements'])
+
+def metrics_directory() -> str:
+    """Get the full path of the multiprocess metrics directory.
+
+    :return: full path of the directory, or None if not in multiprocess mode.
+    :rtype: str.
+    """
+    directory = app.config['METRICS_MULTIPROCESS_DIR']
+
+    return os.path.join(app.instance_path, '', directory) if directory else None
+
+def register_metrics(app: object) -> None:
+    """Turn on metrics, as configured, and serve ``/metrics``.
+
+    :param object app: the Flask application.
+    """
+    if not app.config['METRICS_ENABLED']: return
+
+    with app.app_context():
+        registry.configure(metrics_directory(), app.config['METRICS_FLUSH_INTERVAL'])
+
+    app.register_blueprint(metrics_bp)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    response = Response(registry.render(), content_type=EXPOSITION_CONTENT_TYPE)
+    response.headers['Cache-Control'] = 'no-store'
+
+    return response
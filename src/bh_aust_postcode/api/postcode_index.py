@@ -0,0 +1,792 @@
+"""
+Index structures built over the postcodes held by
+:class:`~src.bh_aust_postcode.api.postcode_pool.PostcodePool`.
+
+Indexes refer to postcodes by their position in the pool, and positions are
+always returned in ascending order, so that results keep the
+``ORDER BY locality, state, postcode`` order postcodes were loaded in. That 
+order follows the database collation, so it is not relied upon for anything
+else.
+
+Relevant test modules:
+
+    * ./tests/test_postcode_pool.py
+"""
+
+from array import array
+from bisect import bisect_left
+from heapq import heappush, heapreplace
+from math import asin, cos, inf, pi, radians, sin, sqrt
+
+#: Default n-gram length used by :class:`NgramIndex`.
+NGRAM_LENGTH = 3
+
+#: Default maximum edit distance of :class:`FuzzyIndex`.
+FUZZY_MAX_DISTANCE = 2
+#: Only this many leading characters of a key are indexed by :class:`FuzzyIndex`.
+FUZZY_PREFIX_LENGTH = 7
+
+#: Mean radius of the earth, in kilometres.
+EARTH_RADIUS_KM = 6371.0088
+#: Default most points in a leaf of :class:`SpatialIndex`.
+SPATIAL_LEAF_SIZE = 8
+
+def ngrams(text: str, n: int=NGRAM_LENGTH) -> set:
+    """Split a text into its distinct, overlapping n-grams.
+
+    :param str text: the text to split.
+    :param int n: the n-gram length.
+
+    :return: distinct n-grams of ``text``. Empty when ``text`` is shorter than ``n``.
+    :rtype: set.
+    """
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+def intersect(positions: list, posting: list) -> list:
+    """Intersect two ascending lists of positions.
+
+    Each element of the shorter ``positions`` is binary searched in ``posting``,
+    resuming from where the previous element was found.
+
+    :param list positions: ascending positions, ideally the shorter list.
+    :param list posting: ascending positions.
+
+    :return: ascending positions present in both lists.
+    :rtype: list.
+    """
+    result = []
+    lo, hi = 0, len(posting)
+    for pos in positions:
+        lo = bisect_left(posting, pos, lo, hi)
+        if lo == hi: break
+        if posting[lo] == pos: result.append(pos)
+
+    return result
+
+def iter_intersect(positions, posting: list):
+    """Lazily intersect ascending positions with an ascending list, see :func:`intersect`.
+
+    :param positions: an iterable of ascending positions, e.g. a generator.
+    :param list posting: ascending positions.
+
+    :return: a generator of ascending positions present in both.
+    """
+    lo, hi = 0, len(posting)
+    for pos in positions:
+        lo = bisect_left(posting, pos, lo, hi)
+        if lo == hi: return
+        if posting[lo] == pos: yield pos
+
+def haversine_km(latitude1: float, longitude1: float, latitude2: float, longitude2: float) -> float:
+    """Great circle distance between two points.
+
+    :param float latitude1: latitude of the first point, in degrees.
+    :param float longitude1: longitude of the first point, in degrees.
+    :param float latitude2: latitude of the second point, in degrees.
+    :param float longitude2: longitude of the second point, in degrees.
+
+    :return: the distance in kilometres, on a sphere of radius :data:`EARTH_RADIUS_KM`.
+    :rtype: float.
+    """
+    phi1, phi2 = radians(latitude1), radians(latitude2)
+    a = (sin((phi2 - phi1) / 2) ** 2 
+         + cos(phi1) * cos(phi2) * sin(radians(longitude2 - longitude1) / 2) ** 2)
+
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+def deletes(text: str, max_distance: int) -> set:
+    """All texts made by deleting up to a number of characters from a text.
+
+    :param str text: the text to delete from.
+    :param int max_distance: maximum number of characters to delete.
+
+    :return: distinct texts, ``text`` itself included.
+    :rtype: set.
+    """
+    result = frontier = {text}
+    for _ in range(max_distance):
+        frontier = {part[:i] + part[i + 1:] for part in frontier for i in range(len(part))}
+        result = result | frontier
+
+    return result
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Optimal string alignment distance between two texts: the number of single
+    character insertions, deletions, substitutions and transpositions of adjacent 
+    characters which turn one into the other.
+
+    :param str a: a text.
+    :param str b: another text.
+    :param int max_distance: stop as soon as the distance is known to be greater.
+
+    :return: the distance, or ``max_distance + 1`` when it is greater than ``max_distance``.
+    :rtype: int.
+    """
+    too_far = max_distance + 1
+    if abs(len(a) - len(b)) > max_distance: return too_far
+
+    # A common prefix and suffix cost nothing.
+    start, end_a, end_b = 0, len(a), len(b)
+    while start < end_a and start < end_b and a[start] == b[start]:
+        start += 1
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+
+    # Only cells within max_distance of the diagonal can be within max_distance.
+    before, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [too_far] * (len(b) + 1)
+        if i <= max_distance: current[0] = i
+
+        char, last = a[i - 1], a[i - 2] if i > 1 else None
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            distance = previous[j - 1] if char == b[j - 1] else previous[j - 1] + 1
+            if previous[j] < distance: distance = previous[j] + 1
+            if current[j - 1] < distance: distance = current[j - 1] + 1
+            if j > 1 and char == b[j - 2] and last == b[j - 1] and before[j - 2] < distance:
+                distance = before[j - 2] + 1
+            current[j] = distance
+
+        if min(current) > max_distance: return too_far
+        before, previous = previous, current
+
+    return min(previous[-1], too_far)
+
+class SortedSlots(object):
+    """Slots of distinct values held in ascending order, in place of a ``{value: slot}``
+    dictionary: a value's slot is its position, found by binary search. Nothing is
+    copied, so the values may be read lazily, e.g. from a memory mapped snapshot by a
+    :class:`~src.bh_aust_postcode.api.compact_postcodes.LocalityKeys`.
+    """
+
+    def __init__(self, values):
+        """
+        :param values: distinct values in ascending order. Any read only sequence.
+        """
+        self.__values = values
+
+    def get(self, value: object, default: int=None) -> int:
+        """The slot of a value, as ``dict.get``.
+
+        :param object value: the value to look up.
+        :param int default: returned when ``value`` is not held.
+
+        :return: the position of ``value``, or ``default``.
+        :rtype: int.
+        """
+        values = self.__values
+        i = bisect_left(values, value)
+
+        return i if i < len(values) and values[i] == value else default
+
+    def __len__(self) -> int:
+        return len(self.__values)
+
+    def __iter__(self):
+        return iter(self.__values)
+
+class NgramIndex(object):
+    """Inverted index which maps every n-gram of a list of keys to the ascending
+    positions of the keys containing it.
+
+    A substring query is answered by intersecting the posting lists of the query's
+    n-grams, then confirming each remaining candidate with a plain substring test.
+    Queries shorter than the n-gram length fall back to scanning all keys.
+
+    Keys are expected to be normalised already, e.g. uppercased, and queries must
+    be normalised the same way. Any read only sequence of keys will do. 
+    
+    All posting lists are stored back to back in one unsigned integer array, in
+    ascending n-gram order, see :meth:`tables` and :meth:`restore`.
+    """
+
+    #: Stop intersecting once the candidates are this few: a substring test is cheaper.
+    VERIFY_THRESHOLD = 32
+
+    def __init__(self, keys: list, n: int=NGRAM_LENGTH):
+        """Build the index.
+
+        :param list keys: normalised keys, in pool order. A list or any read only sequence.
+        :param int n: the n-gram length.
+        """
+        postings = {}
+        for pos, key in enumerate(keys):
+            for gram in ngrams(key, n):
+                postings.setdefault(gram, []).append(pos)
+
+        slots = {}
+        starts = array('I', [0])
+        flat = array('I')
+        for slot, gram in enumerate(sorted(postings)):
+            slots[gram] = slot
+            flat.extend(postings[gram])
+            starts.append(len(flat))
+
+        self.__set(keys, n, slots, starts, flat)
+
+    def __set(self, keys: list, n: int, slots: dict, starts: array, postings: array):
+        self.__keys = keys
+        self.__n = n
+        self.__slots = slots
+        self.__starts = starts
+        self.__postings = postings
+
+    @classmethod
+    def restore(cls, keys: list, n: int, grams: list, starts, postings) -> 'NgramIndex':
+        """Recreate an index from the tables returned by :meth:`tables`, without
+        rebuilding it.
+
+        :param list keys: the normalised keys the index was built from.
+        :param int n: the n-gram length the index was built with.
+        :param list grams: n-grams, in slot order, which is ascending. Any read only 
+            sequence: n-grams are looked up by binary search, see :class:`SortedSlots`.
+        :param starts: ``len(grams) + 1`` offsets of each posting list in ``postings``.
+            An unsigned integer array, or a ``memoryview`` cast to one.
+        :param postings: all posting lists, back to back. Same types as ``starts``.
+
+        :return: the index.
+        :rtype: :class:`NgramIndex`.
+        """
+        index = cls.__new__(cls)
+        index.__set(keys, n, SortedSlots(grams), starts, postings)
+        return index
+
+    def tables(self) -> tuple:
+        """The tables which make up the index, for :meth:`restore`.
+
+        :return: n-grams in slot order, which is ascending, posting list offsets and 
+            all posting lists.
+        :rtype: tuple.
+        """
+        return list(self.__slots), self.__starts, self.__postings
+
+    @property
+    def n(self) -> int:
+        """Read only property. The n-gram length.
+        """
+        return self.__n
+
+    @property
+    def keys(self) -> list:
+        """Read only property. The normalised keys this index was built from.
+        """
+        return self.__keys
+
+    def __candidates(self, text: str):
+        """Positions of the keys which may contain a text: those whose posting lists
+        have all n-grams of ``text``. All positions when ``text`` is too short.
+        """
+        if len(text) < self.__n:
+            return range(len(self.__keys))
+
+        slots, starts, flat = self.__slots, self.__starts, self.__postings
+
+        postings = []
+        for gram in ngrams(text, self.__n):
+            slot = slots.get(gram)
+            if slot is None: return ()
+            postings.append(flat[starts[slot]:starts[slot + 1]])
+
+        postings.sort(key=len)
+
+        candidates = postings[0]
+        for posting in postings[1:]:
+            if len(candidates) <= NgramIndex.VERIFY_THRESHOLD: break
+            candidates = intersect(candidates, posting)
+
+        return candidates
+
+    def iter_search(self, text: str):
+        """Lazily find the keys which contain a text. Candidates are only confirmed as
+        the caller asks for them, so a caller which stops early saves the rest.
+
+        :param str text: normalised text to look for.
+
+        :return: a generator of ascending positions of the keys which contain ``text``.
+        """
+        keys = self.__keys
+        return (pos for pos in self.__candidates(text) if text in keys[pos])
+
+    def search(self, text: str) -> list:
+        """Find all keys which contain a text.
+
+        :param str text: normalised text to look for.
+
+        :return: ascending positions of the keys which contain ``text``.
+        :rtype: list.
+        """
+        keys = self.__keys
+        return [pos for pos in self.__candidates(text) if text in keys[pos]]
+
+    def count(self, text: str) -> int:
+        """Count the keys which contain a text.
+
+        :param str text: normalised text to look for.
+
+        :return: number of keys which contain ``text``.
+        :rtype: int.
+        """
+        keys = self.__keys
+        return sum(1 for pos in self.__candidates(text) if text in keys[pos])
+
+class PrefixIndex(object):
+    """Positions of a list of keys sorted by key, so that keys starting with a text
+    are found by binary search in O(log n + k).
+
+    Keys are expected to be normalised already, e.g. uppercased, and queries must
+    be normalised the same way. Any read only sequence of keys will do.
+    """
+
+    def __init__(self, keys: list):
+        """Build the index.
+
+        :param list keys: normalised keys, in pool order. A list or any read only sequence.
+        """
+        self.__keys = keys
+        self.__order = array('I', sorted(range(len(keys)), key=keys.__getitem__))
+
+    @classmethod
+    def restore(cls, keys: list, order) -> 'PrefixIndex':
+        """Recreate an index from :attr:`order`, without sorting again.
+
+        :param list keys: the normalised keys the index was built from.
+        :param order: positions of ``keys`` sorted by key. An unsigned integer array, 
+            or a ``memoryview`` cast to one.
+
+        :return: the index.
+        :rtype: :class:`PrefixIndex`.
+        """
+        index = cls.__new__(cls)
+        index.__keys = keys
+        index.__order = order
+        return index
+
+    @property
+    def order(self) -> array:
+        """Read only property. Positions of the keys, sorted by key.
+        """
+        return self.__order
+
+    def search(self, text: str) -> list:
+        """Find all keys which start with a text.
+
+        :param str text: normalised text to look for.
+
+        :return: ascending positions of the keys which start with ``text``.
+        :rtype: list.
+        """
+        keys, order = self.__keys, self.__order
+
+        result = []
+        for i in range(bisect_left(order, text, key=keys.__getitem__), len(order)):
+            pos = order[i]
+            if not keys[pos].startswith(text): break
+            result.append(pos)
+
+        result.sort()
+        return result
+
+
+class ValueIndex(object):
+    """Hash index which maps every distinct value of a list to the ascending positions 
+    holding it, so that an exact match is answered in O(1 + k).
+
+    Values are expected to be normalised already, and queries must be normalised the 
+    same way. As with :class:`NgramIndex`, all posting lists are stored back to back 
+    in one unsigned integer array, in ascending value order, see :meth:`tables` and 
+    :meth:`restore`.
+    """
+
+    def __init__(self, values):
+        """Build the index.
+
+        :param values: normalised values, in pool order, all of one ordered type. 
+            Any iterable.
+        """
+        postings = {}
+        for pos, value in enumerate(values):
+            postings.setdefault(value, []).append(pos)
+
+        ordered = sorted(postings)
+        slots = {}
+        starts = array('I', [0])
+        flat = array('I')
+        for slot, value in enumerate(ordered):
+            slots[value] = slot
+            flat.extend(postings[value])
+            starts.append(len(flat))
+
+        self.__set(ordered, slots, starts, flat)
+
+    def __set(self, values: list, slots: dict, starts: array, postings: array):
+        self.__values = values
+        self.__slots = slots
+        self.__starts = starts
+        self.__postings = postings
+
+    @classmethod
+    def restore(cls, values: list, starts, postings) -> 'ValueIndex':
+        """Recreate an index from the tables returned by :meth:`tables`, without
+        rebuilding it.
+
+        :param list values: distinct values, in slot order, which is ascending. Any read 
+            only sequence: values are looked up by binary search, see :class:`SortedSlots`.
+        :param starts: ``len(values) + 1`` offsets of each posting list in ``postings``.
+            An unsigned integer array, or a ``memoryview`` cast to one.
+        :param postings: all posting lists, back to back. Same types as ``starts``.
+
+        :return: the index.
+        :rtype: :class:`ValueIndex`.
+        """
+        index = cls.__new__(cls)
+        index.__set(values, SortedSlots(values), starts, postings)
+        return index
+
+    def tables(self) -> tuple:
+        """The tables which make up the index, for :meth:`restore`.
+
+        :return: distinct values in slot order, which is ascending, posting list offsets 
+            and all posting lists.
+        :rtype: tuple.
+        """
+        return self.__values, self.__starts, self.__postings
+
+    def search(self, value: object):
+        """Find all positions holding a value.
+
+        :param object value: normalised value to look for.
+
+        :return: ascending positions holding ``value``. Empty when there is none.
+            An unsigned integer array, or a ``memoryview`` cast to one.
+        """
+        slot = self.__slots.get(value)
+        if slot is None: return ()
+
+        starts = self.__starts
+        return self.__postings[starts[slot]:starts[slot + 1]]
+
+class FuzzyIndex(object):
+    """Symmetric delete index, as used by SymSpell, which finds the keys within an edit
+    distance of a text without comparing the text with every key.
+
+    Every distinct key's leading :data:`FUZZY_PREFIX_LENGTH` characters, with up to 
+    ``max_distance`` characters deleted, are indexed. A query generates the same deletes 
+    of its own leading characters, looks each up by binary search, and only the keys 
+    found are compared with :func:`edit_distance`.
+
+    Keys are expected to be normalised already, and queries must be normalised the 
+    same way. Deletes are held sorted, back to back, with their posting lists of 
+    distinct key slots in one unsigned integer array, see :meth:`tables` and 
+    :meth:`restore`.
+    """
+
+    def __init__(self, keys: list, max_distance: int=FUZZY_MAX_DISTANCE,
+                 prefix_length: int=FUZZY_PREFIX_LENGTH):
+        """Build the index.
+
+        :param list keys: normalised keys, in pool order. A list or any read only sequence.
+        :param int max_distance: the greatest edit distance a query can ask for.
+        :param int prefix_length: number of leading characters of a key to index.
+        """
+        words = ValueIndex(keys)
+        values = words.tables()[0]
+
+        postings = {}
+        for slot, word in enumerate(values):
+            for delete in deletes(word[:prefix_length], max_distance):
+                postings.setdefault(delete, []).append(slot)
+
+        ordered = sorted(postings)
+        starts = array('I', [0])
+        flat = array('I')
+        for delete in ordered:
+            flat.extend(postings[delete])
+            starts.append(len(flat))
+
+        self.__set(words, values, max_distance, prefix_length, ordered, starts, flat)
+
+    def __set(self, words: ValueIndex, values: list, max_distance: int, prefix_length: int,
+              ordered: list, starts: array, postings: array):
+        self.__words = words
+        self.__values = values
+        self.__max_distance = max_distance
+        self.__prefix_length = prefix_length
+        self.__deletes = ordered
+        self.__starts = starts
+        self.__postings = postings
+
+    @classmethod
+    def restore(cls, words: ValueIndex, max_distance: int, prefix_length: int,
+                ordered: list, starts, postings) -> 'FuzzyIndex':
+        """Recreate an index from the tables returned by :meth:`tables`, without
+        rebuilding it.
+
+        :param ValueIndex words: :class:`ValueIndex` over the keys the index was built from.
+        :param int max_distance: the maximum edit distance the index was built with.
+        :param int prefix_length: the prefix length the index was built with.
+        :param list ordered: the sorted deletes. A list or any read only sequence.
+        :param starts: ``len(ordered) + 1`` offsets of each posting list in ``postings``.
+            An unsigned integer array, or a ``memoryview`` cast to one.
+        :param postings: all posting lists, back to back. Same types as ``starts``.
+
+        :return: the index.
+        :rtype: :class:`FuzzyIndex`.
+        """
+        index = cls.__new__(cls)
+        index.__set(words, words.tables()[0], max_distance, prefix_length, 
+                    ordered, starts, postings)
+        return index
+
+    def tables(self) -> tuple:
+        """The tables which make up the index, for :meth:`restore`.
+
+        :return: the :class:`ValueIndex` over the keys, sorted deletes, posting list 
+            offsets and all posting lists.
+        :rtype: tuple.
+        """
+        return self.__words, self.__deletes, self.__starts, self.__postings
+
+    @property
+    def max_distance(self) -> int:
+        """Read only property. The greatest edit distance a query can ask for.
+        """
+        return self.__max_distance
+
+    @property
+    def prefix_length(self) -> int:
+        """Read only property. Number of leading characters of a key indexed.
+        """
+        return self.__prefix_length
+
+    def search(self, text: str, max_distance: int=None) -> list:
+        """Find all keys within an edit distance of a text, nearest first.
+
+        :param str text: normalised text to look for.
+        :param int max_distance: the greatest edit distance, at most :attr:`max_distance`. 
+            None for :attr:`max_distance`.
+
+        :return: positions of the keys within ``max_distance`` of ``text``, by ascending 
+            distance, then ascending position.
+        :rtype: list.
+        """
+        if max_distance == None or max_distance > self.__max_distance:
+            max_distance = self.__max_distance
+
+        ordered, starts, flat = self.__deletes, self.__starts, self.__postings
+
+        slots = set()
+        for delete in deletes(text[:self.__prefix_length], max_distance):
+            i = bisect_left(ordered, delete)
+            if i < len(ordered) and ordered[i] == delete:
+                slots.update(flat[starts[i]:starts[i + 1]])
+
+        values, words = self.__values, self.__words
+
+        ranked = []
+        for slot in slots:
+            word = values[slot]
+            distance = edit_distance(text, word, max_distance)
+            if distance <= max_distance:
+                ranked.extend((distance, pos) for pos in words.search(word))
+
+        ranked.sort()
+        return [pos for _, pos in ranked]
+
+class SpatialIndex(object):
+    """KD-tree over the coordinates of postcodes, which finds the postcodes nearest to
+    a point without measuring the distance to every postcode.
+
+    Coordinates are indexed as points on the unit sphere, ``(x, y, z)``, whose straight
+    line distances rank the same as great circle distances, whatever the latitude and
+    across the antimeridian. The tree is implicit: points are ordered so that every 
+    node's points are a range, split in half at its median along the axis stored for
+    the node, the children of node ``i`` being ``2i + 1`` and ``2i + 2``. Ranges of at
+    most ``leaf_size`` points are leaves. A query descends to the nearest leaf first, 
+    and skips every node which cannot hold a point nearer than those already found, or
+    within the radius asked for. Distances returned are great circle distances, see 
+    :func:`haversine_km`.
+
+    A node is skipped by the distance from the query to the box its splits bound it
+    by, which is kept up to date along the way as in Arya and Mount's incremental 
+    distance calculation.
+
+    The points in tree order, their positions and the split axes are held in flat 
+    arrays, see :meth:`tables` and :meth:`restore`.
+    """
+
+    def __init__(self, coordinates, leaf_size: int=SPATIAL_LEAF_SIZE):
+        """Build the index.
+
+        :param coordinates: latitude and longitude, in degrees, of each postcode, back 
+            to back, in pool order. NaN for a postcode without coordinates. A float 
+            array, or a ``memoryview`` cast to one.
+        :param int leaf_size: most points in a leaf.
+        """
+        points = []
+        for pos in range(len(coordinates) // 2):
+            latitude, longitude = coordinates[2 * pos], coordinates[2 * pos + 1]
+            # NaN is the only value not equal to itself.
+            if latitude != latitude or longitude != longitude: continue
+
+            phi, lam = radians(latitude), radians(longitude)
+            points.append((cos(phi) * cos(lam), cos(phi) * sin(lam), sin(phi), pos))
+
+        nodes = {}
+        def build(node: int, lo: int, hi: int):
+            if hi - lo <= leaf_size: return
+
+            spreads = [max(point[axis] for point in points[lo:hi]) 
+                       - min(point[axis] for point in points[lo:hi]) for axis in range(3)]
+            axis = spreads.index(max(spreads))
+            points[lo:hi] = sorted(points[lo:hi], key=lambda point: (point[axis], point[3]))
+
+            mid = (lo + hi) // 2
+            nodes[node] = (axis, points[mid][axis])
+            build(2 * node + 1, lo, mid)
+            build(2 * node + 2, mid, hi)
+
+        build(0, 0, len(points))
+
+        flat = array('d')
+        for x, y, z, _ in points: flat.extend((x, y, z))
+
+        axes = bytearray(max(nodes) + 1 if nodes else 0)
+        splits = array('d', bytes(8 * len(axes)))
+        for node, (axis, split) in nodes.items(): axes[node], splits[node] = axis, split
+
+        self.__set(coordinates, leaf_size, flat, array('I', (point[3] for point in points)),
+                   bytes(axes), splits)
+
+    def __set(self, coordinates, leaf_size: int, points, order, axes, splits):
+        self.__coordinates = coordinates
+        self.__leaf_size = leaf_size
+        self.__points = points
+        self.__order = order
+        self.__axes = axes
+        self.__splits = splits
+
+    @classmethod
+    def restore(cls, coordinates, leaf_size: int, points, order, axes, splits) -> 'SpatialIndex':
+        """Recreate an index from the tables returned by :meth:`tables`, without
+        rebuilding it.
+
+        :param coordinates: the coordinates the index was built from.
+        :param int leaf_size: the leaf size the index was built with.
+        :param points: ``x``, ``y`` and ``z`` of every point, back to back, in tree order.
+            A float array, or a ``memoryview`` cast to one.
+        :param order: the position of every point, in tree order. An unsigned integer 
+            array, or a ``memoryview`` cast to one.
+        :param axes: the split axis of every node, 0 to 2, by node number. ``bytes``, or 
+            any buffer of unsigned bytes.
+        :param splits: the split value of every node, by node number. Same types as 
+            ``points``.
+
+        :return: the index.
+        :rtype: :class:`SpatialIndex`.
+        """
+        index = cls.__new__(cls)
+        index.__set(coordinates, leaf_size, points, order, axes, splits)
+        return index
+
+    def tables(self) -> tuple:
+        """The tables which make up the index, for :meth:`restore`.
+
+        :return: points and their positions in tree order, split axes and split values.
+        :rtype: tuple.
+        """
+        return self.__points, self.__order, self.__axes, self.__splits
+
+    @property
+    def leaf_size(self) -> int:
+        """Read only property. Most points in a leaf.
+        """
+        return self.__leaf_size
+
+    @property
+    def count(self) -> int:
+        """Read only property. Number of postcodes which have coordinates.
+        """
+        return len(self.__order)
+
+    def nearest(self, latitude: float, longitude: float, k: int=None, 
+                radius: float=None) -> list:
+        """Find the postcodes nearest to a point.
+
+        :param float latitude: latitude of the point, in degrees.
+        :param float longitude: longitude of the point, in degrees.
+        :param int k: the greatest number of postcodes to find. None for all within 
+            ``radius``.
+        :param float radius: only find postcodes within this distance, in kilometres. 
+            None for the ``k`` nearest, however far.
+
+        :return: ``(distance, position)`` tuples, distances in kilometres, by ascending 
+            distance, then ascending position. Empty when both ``k`` and ``radius`` are 
+            None.
+        :rtype: list.
+        """
+        if (k == None and radius == None) or k == 0 or self.count == 0: return []
+
+        points, order, leaf_size = self.__points, self.__order, self.__leaf_size
+        axes, splits = self.__axes, self.__splits
+
+        phi, lam = radians(latitude), radians(longitude)
+        query = (cos(phi) * cos(lam), cos(phi) * sin(lam), sin(phi))
+        qx, qy, qz = query
+
+        # Squared straight line distances throughout. A little slack on the radius: 
+        # great circle distances decide in the end.
+        limit = inf
+        if radius != None: limit = (2 * sin(min(radius / EARTH_RADIUS_KM, pi) / 2)) ** 2 * (1 + 1e-9)
+
+        # Within radius: all found. k nearest: a heap of the k nearest so far, the 
+        # farthest on top.
+        found = []
+        worst = limit
+        # Squared distance to the node's box, and the distance to it along each axis.
+        stack = [(0.0, 0, 0, len(order), (0.0, 0.0, 0.0))]
+        while stack:
+            bound, node, lo, hi, offsets = stack.pop()
+            if bound > worst: continue
+
+            if hi - lo <= leaf_size:
+                for i in range(lo, hi):
+                    dx, dy, dz = points[3 * i] - qx, points[3 * i + 1] - qy, points[3 * i + 2] - qz
+                    squared = dx * dx + dy * dy + dz * dz
+                    if squared > worst: continue
+
+                    if k == None: 
+                        found.append(order[i])
+                    elif len(found) < k:
+                        heappush(found, (-squared, -order[i]))
+                        if len(found) == k: worst = min(limit, -found[0][0])
+                    elif (squared, order[i]) < (-found[0][0], -found[0][1]):
+                        heapreplace(found, (-squared, -order[i]))
+                        worst = -found[0][0]
+                continue
+
+            mid = (lo + hi) // 2
+            axis = axes[node]
+            difference = query[axis] - splits[node]
+
+            far_offsets = list(offsets)
+            far_offsets[axis] = difference
+            far = bound - offsets[axis] * offsets[axis] + difference * difference
+
+            # The far side is pushed first, so the near side is searched first.
+            if difference < 0:
+                stack.append((far, 2 * node + 2, mid, hi, far_offsets))
+                stack.append((bound, 2 * node + 1, lo, mid, offsets))
+            else:
+                stack.append((far, 2 * node + 1, lo, mid, far_offsets))
+                stack.append((bound, 2 * node + 2, mid, hi, offsets))
+
+        if k != None: found = [-pos for _, pos in found]
+
+        coordinates = self.__coordinates
+        ranked = sorted((haversine_km(latitude, longitude, coordinates[2 * pos], 
+                                      coordinates[2 * pos + 1]), pos) for pos in found)
+        if radius != None: ranked = [(distance, pos) for distance, pos in ranked if distance <= radius]
+
+        return ranked
@@ -12,8 +12,12 @@ Relevant test modules:
 """
 
 import logging
+import threading
+import time
 
-import psycopg2
+from abc import ABCMeta
+from array import array
+from itertools import islice
 
 from flask import current_app as app
 
@@ -21,12 +25,38 @@ from src.bh_aust_postcode.utils import (
     print_log,
     format_sql_statement,
 )
-from src.bh_aust_postcode.config import get_database_connection
+from src.bh_aust_postcode.api.postcode_index import (
+    NgramIndex,
+    PrefixIndex,
+    ValueIndex,
+    FuzzyIndex,
+    SpatialIndex,
+    intersect,
+    iter_intersect,
+)
+from src.bh_aust_postcode.api.compact_postcodes import (
+    CompactPostcodes,
+    coordinate_rows,
+)
+from src.bh_aust_postcode.api.refinement_cache import RefinementCache
+from src.bh_aust_postcode.api.search_backend import SearchBackend
+from src.bh_aust_postcode.api.sqlite_backend import (
+    SqliteError,
+    sqlite_filename,
+    read_sqlite,
+)
+from src.bh_aust_postcode.api.postcode_snapshot import (
+    SnapshotError,
+    snapshot_filename,
+    read_snapshot,
+    dataset_version,
+)
 
 logger = logging.getLogger('admin')
 
-class PostcodePoolMeta(type):
-    """Singleton pattern metaclass."""
+class PostcodePoolMeta(ABCMeta):
+    """Singleton pattern metaclass. An ``ABCMeta``, as that of 
+    :class:`~src.bh_aust_postcode.api.search_backend.SearchBackend`."""
     singletons = {}
 
     def __call__(cls, *args, **kwargs):
@@ -39,141 +69,689 @@ class PostcodePoolMeta(type):
         PostcodePoolMeta.singletons[cls] = instance
         return instance
 
-class PostcodePool(object, metaclass=PostcodePoolMeta):
+class PoolGeneration(object):
+    """One generation of postcodes and all their indexes, as loaded together. 
+
+    A generation is never modified once published to :attr:`~.PostcodePool.current`: 
+    reloading builds a new generation instead, so searches which hold on to a 
+    generation always see complete, consistent postcodes and indexes.
+
+    :param postcodes: list of postcode dictionaries, or a
+        :class:`~src.bh_aust_postcode.api.compact_postcodes.CompactPostcodes`.
+    :param NgramIndex locality_index: trigram index over uppercased ``locality``.
+    :param PrefixIndex prefix_index: sorted index over uppercased ``locality``.
+    :param ValueIndex postcode_index: hash index over ``postcode``.
+    :param ValueIndex state_index: hash index over ``state``.
+    :param FuzzyIndex fuzzy_index: edit distance index over uppercased ``locality``. 
+        None when fuzzy search is disabled.
+    :param str version: content digest of ``postcodes``.
+    :param int generation: sequence number of this generation.
+    :param array coordinates: latitude and longitude of each postcode, back to back, 
+        NaN when unknown. None when postcodes have no coordinates.
+    :param SpatialIndex spatial_index: KD-tree index over ``coordinates``. None when 
+        postcodes have no coordinates.
+
+    ``load_seconds`` is the time it took to load postcodes and build the indexes, set
+    before the generation is published.
+    """
+
+    def __init__(self, postcodes=None, locality_index=None, prefix_index=None, 
+                 postcode_index=None, state_index=None, fuzzy_index=None, 
+                 version: str='', generation: int=0, coordinates=None, spatial_index=None):
+        self.postcodes = postcodes or []
+        self.locality_index = locality_index
+        self.prefix_index = prefix_index
+        self.postcode_index = postcode_index
+        self.state_index = state_index
+        self.fuzzy_index = fuzzy_index
+        self.version = version
+        self.generation = generation
+        self.coordinates = coordinates
+        self.spatial_index = spatial_index
+        self.load_seconds = None
+
+class CurrentGeneration(object):
+    """Read only class and instance attribute of :class:`PostcodePool`, which reads
+    the same name from :attr:`~.PostcodePool.current`.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        return getattr(owner.current, self.name)
+
+class PostcodePool(SearchBackend, metaclass=PostcodePoolMeta):
     """Hold all Australian postcodes and provide a locality / suburb search method. 
 
     Class attributes:
+        | current = PoolGeneration(). The published generation of postcodes and indexes.
+            Replaced as a whole, in a single assignment, whenever postcodes are 
+            (re)loaded. The attributes below read the same name from it.
         | postcodes = []. List of postcodes. Each postcode dictionary has the following 
-            text fields: ``locality``, ``state`` and ``postcode``.
+            text fields: ``locality``, ``state`` and ``postcode``. When configuration
+            ``POSTCODE_POOL_COMPACT`` is True, it is a read only 
+            :class:`~src.bh_aust_postcode.api.compact_postcodes.CompactPostcodes` sequence 
+            of the same dictionaries instead.
+        | locality_index = None. Trigram index over the uppercased ``locality`` of
+            :attr:`~.PostcodePool.postcodes`.
+        | prefix_index = None. Sorted index over the uppercased ``locality`` of
+            :attr:`~.PostcodePool.postcodes`.
+        | postcode_index = None. Hash index over the ``postcode`` of 
+            :attr:`~.PostcodePool.postcodes`.
+        | state_index = None. Hash index over the ``state`` of 
+            :attr:`~.PostcodePool.postcodes`.
+        | fuzzy_index = None. Edit distance index over the uppercased ``locality`` of
+            :attr:`~.PostcodePool.postcodes`. None when fuzzy search is disabled.
+        | generation = 0. Incremented every time postcodes are (re)loaded.
+        | version = ''. Content digest of :attr:`~.PostcodePool.postcodes`.
+        | coordinates = None. Latitude and longitude of each of 
+            :attr:`~.PostcodePool.postcodes`, back to back, NaN when unknown.
+        | spatial_index = None. KD-tree index over :attr:`~.PostcodePool.coordinates`.
+
+    Each search reads :attr:`~.PostcodePool.current` once, and finishes against that
+    generation even if a reload publishes a new one meanwhile.
+
+    The ``memory`` :class:`~src.bh_aust_postcode.api.search_backend.SearchBackend`.
     """    
 
-    #: Class attribute. List of postcodes. Each postcode dictionary has the following text fields: ``locality``, ``state`` and ``postcode``.
-    postcodes = []
-
-    def __entity_exists(self, connection: object, sql_statement: str) -> bool:
-        """Check if a PostgreSQL database schema or table exists.
+    name = 'memory'
+
+    #: Class attribute. The published :class:`PoolGeneration`. Built off to the side and swapped in by :meth:`~.PostcodePool.load`.
+    current = PoolGeneration()
+
+    #: Class attribute. List of postcodes. Each postcode dictionary has the following text fields: ``locality``, ``state`` and ``postcode``. Or a :class:`~src.bh_aust_postcode.api.compact_postcodes.CompactPostcodes`.
+    postcodes = CurrentGeneration()
+    #: Class attribute. :class:`~src.bh_aust_postcode.api.postcode_index.NgramIndex` over the uppercased ``locality`` of :attr:`~.PostcodePool.postcodes`. Built by :meth:`~.PostcodePool.load`.
+    locality_index = CurrentGeneration()
+    #: Class attribute. :class:`~src.bh_aust_postcode.api.postcode_index.PrefixIndex` over the uppercased ``locality`` of :attr:`~.PostcodePool.postcodes`. Built by :meth:`~.PostcodePool.load`.
+    prefix_index = CurrentGeneration()
+    #: Class attribute. :class:`~src.bh_aust_postcode.api.postcode_index.ValueIndex` over the ``postcode`` of :attr:`~.PostcodePool.postcodes`. Built by :meth:`~.PostcodePool.load`.
+    postcode_index = CurrentGeneration()
+    #: Class attribute. :class:`~src.bh_aust_postcode.api.postcode_index.ValueIndex` over the ``state`` of :attr:`~.PostcodePool.postcodes`. Built by :meth:`~.PostcodePool.load`.
+    state_index = CurrentGeneration()
+    #: Class attribute. :class:`~src.bh_aust_postcode.api.postcode_index.FuzzyIndex` over the uppercased ``locality`` of :attr:`~.PostcodePool.postcodes`. Built by :meth:`~.PostcodePool.load` unless configuration ``FUZZY_MAX_DISTANCE`` is 0.
+    fuzzy_index = CurrentGeneration()
+    #: Class attribute. Incremented every time postcodes are (re)loaded, so that anything derived from :attr:`~.PostcodePool.postcodes` can tell when it is out of date.
+    generation = CurrentGeneration()
+    #: Class attribute. Content digest of :attr:`~.PostcodePool.postcodes`, the same in every process which holds the same postcodes. See :func:`~src.bh_aust_postcode.api.postcode_snapshot.dataset_version`.
+    version = CurrentGeneration()
+    #: Class attribute. Float array of the latitude and longitude of each of :attr:`~.PostcodePool.postcodes`, back to back, NaN when unknown. None when postcodes have no coordinates.
+    coordinates = CurrentGeneration()
+    #: Class attribute. :class:`~src.bh_aust_postcode.api.postcode_index.SpatialIndex` over :attr:`~.PostcodePool.coordinates`. Built by :meth:`~.PostcodePool.load`, None when postcodes have no coordinates.
+    spatial_index = CurrentGeneration()
+
+    #: Class attribute. Held while a generation is being built, so concurrent reloads take turns.
+    reload_lock = threading.Lock()
+
+    #: Class attribute. :class:`~src.bh_aust_postcode.api.refinement_cache.RefinementCache` of the positions partial searches matched. Created on first use, None when configuration ``REFINEMENT_CACHE_MAX_BYTES`` is 0.
+    refinement_cache = None
+
+    def __database_objects_exist(self, connection: object) -> tuple:
+        """Check, in a single query, whether the database has a schema and a table whose
+        names match the configured schema and table names.
 
         :param object connection: an already established PostgreSQL connection.
-        :param sql_statement str: the complete SQL entity selection.
 
-        :return: a Boolean value which indicates whether an entity exists.
-        :rtype: bool.
+        :return: a Boolean value which indicates if the schema exists, another 
+            which indicates if the table exists within it, and another which indicates
+            if the table has coordinates, i.e. was created or updated since they were
+            added.
+        :rtype: tuple.
         """
+        schema_name, postcode_table_name = self.__get_database_info()
+
+        cursor = connection.cursor()
         try:
-            cursor = connection.cursor()
-            cursor.execute(sql_statement)
-            exists = cursor.fetchone()[0]
+            cursor.execute("SELECT EXISTS(SELECT 1 FROM pg_namespace WHERE nspname = %(schema)s), "
+                           "EXISTS(SELECT 1 FROM information_schema.tables "
+                           "WHERE table_schema = %(schema)s AND table_name = %(table)s), "
+                           "EXISTS(SELECT 1 FROM information_schema.columns WHERE table_schema = "
+                           "%(schema)s AND table_name = %(table)s AND column_name = 'latitude')",
+                           {'schema': schema_name, 'table': postcode_table_name})
+            return cursor.fetchone()
         finally:
             cursor.close()
-            return exists
-        
-    def __schema_exists(self, connection: object) -> bool:
-        """Check if the database has a schema whose name matches configured schema name.
+    
+    def __get_database_info(self) -> tuple:
+        return app.config['SCHEMA_NAME'], app.config['POSTCODE_TABLE_NAME']
 
-        :param object connection: an already established PostgreSQL connection.
+    def __build_generation(self, postcodes, keys: list, coordinates: array=None) -> PoolGeneration:
+        """Build all indexes over postcodes, into a new generation.
 
-        :return: a Boolean value which indicates if the schema exists.
-        :rtype: bool.
+        :param postcodes: list of postcode dictionaries, or a CompactPostcodes.
+        :param list keys: uppercased ``locality`` of each postcode, in pool order.
+        :param array coordinates: latitude and longitude of each postcode, back to back,
+            NaN when unknown. None for none.
+
+        :return: the generation following :attr:`~.PostcodePool.current`.
+        :rtype: PoolGeneration.
         """
+        max_distance = app.config['FUZZY_MAX_DISTANCE']
 
-        sql = "SELECT EXISTS(SELECT 1 FROM pg_namespace WHERE nspname = '{0}')"
-        return self.__entity_exists(connection, format_sql_statement(sql))
-    
-    def __table_exists(self, connection: object) -> bool:
-        """Check if the database and schema has a table whose name matches configured 
-        table name.
+        return PoolGeneration(postcodes, NgramIndex(keys), PrefixIndex(keys),
+                              ValueIndex(self.__field(postcodes, 'postcode')),
+                              ValueIndex(self.__field(postcodes, 'state')),
+                              FuzzyIndex(keys, max_distance) if max_distance > 0 else None,
+                              dataset_version(postcodes), PostcodePool.current.generation + 1,
+                              coordinates, SpatialIndex(coordinates) if coordinates != None else None)
 
-        :param object connection: an already established PostgreSQL connection.
+    def __field(self, postcodes, name: str) -> list:
+        """One text field of every postcode in postcodes.
+        """
+        if isinstance(postcodes, CompactPostcodes): return postcodes.field(name)
+
+        return [pc[name] for pc in postcodes]
+
+    def __load_compact(self, cursor: object) -> PoolGeneration:
+        """Load postcodes from an executed cursor into a 
+        :class:`~src.bh_aust_postcode.api.compact_postcodes.CompactPostcodes`.
 
-        :return: a Boolean value which indicates if the table exists.
-        :rtype: bool.
+        :param object cursor: cursor which has executed the postcode selection.
+
+        :return: the new generation. None if the postcodes cannot be stored compactly.
+        :rtype: PoolGeneration.
         """
+        coordinates = array('d')
+        try:
+            postcodes = CompactPostcodes.from_rows(coordinate_rows(cursor, coordinates))
+        except ValueError as error:
+            print_log(logger, f'Cannot store postcodes compactly: {error}', 'warning')
+            return None
 
-        sql = ("SELECT EXISTS( "
-                "SELECT 1 FROM information_schema.tables "
-                "WHERE table_schema = '{0}' AND table_name = '{1}')")
-        return self.__entity_exists(connection, format_sql_statement(sql))
-    
-    def __get_database_info(self) -> tuple:
-        return app.config['SCHEMA_NAME'], app.config['POSTCODE_TABLE_NAME']
+        return self.__build_generation(postcodes, postcodes.locality_keys(), coordinates)
+
+    def __load_snapshot(self, file_name: str) -> PoolGeneration:
+        """Memory map postcodes and their indexes from the binary snapshot.
+
+        :param str file_name: full path of the snapshot file.
+
+        :return: the new generation. None if the snapshot is missing, invalid or stale, 
+            and postcodes must be loaded from the database instead.
+        :rtype: PoolGeneration.
+        """
+        try:
+            (postcodes, index, prefix_index, postcode_index, state_index, 
+             fuzzy_index, version, coordinates, spatial_index) = read_snapshot(
+                file_name, app.config['POSTCODE_SNAPSHOT_MAX_AGE'])
+        except (OSError, SnapshotError) as error:
+            print_log(logger, f'Snapshot not used, loading from database: {error}', 'info')
+            return None
+
+        max_distance = app.config['FUZZY_MAX_DISTANCE']
+        if max_distance == 0:
+            fuzzy_index = None
+        elif fuzzy_index == None or fuzzy_index.max_distance < max_distance:
+            logger.info(f'Snapshot has no fuzzy index for distance {max_distance}, building it.')
+            fuzzy_index = FuzzyIndex(index.keys, max_distance)
+
+        logger.info(f'Loaded {len(postcodes)} postcodes from snapshot {file_name!r}.')
+
+        return PoolGeneration(postcodes, index, prefix_index, postcode_index, state_index,
+                              fuzzy_index, version, PostcodePool.current.generation + 1,
+                              coordinates, spatial_index)
+
+    def __load_sqlite(self, file_name: str) -> PoolGeneration:
+        """Load postcodes from the embedded SQLite database, without PostgreSQL.
+
+        :param str file_name: full path of the SQLite database file.
+
+        :return: the new generation. None if the database is missing or invalid, and
+            postcodes must be loaded from PostgreSQL instead.
+        :rtype: PoolGeneration.
+        """
+        try:
+            rows, version, coordinates = read_sqlite(file_name)
+        except SqliteError as error:
+            print_log(logger, f'SQLite database not used, loading from PostgreSQL: {error}', 'info')
+            return None
+
+        postcodes = None
+        if app.config['POSTCODE_POOL_COMPACT']:
+            try:
+                postcodes = CompactPostcodes.from_rows(rows)
+                keys = postcodes.locality_keys()
+            except ValueError as error:
+                print_log(logger, f'Cannot store postcodes compactly: {error}', 'warning')
+
+        if postcodes == None:
+            postcodes = [{'locality': row[0], 'state': row[1], 'postcode': row[2]} for row in rows]
+            keys = [pc['locality'].upper() for pc in postcodes]
+
+        logger.info(f'Loaded {len(postcodes)} postcodes from SQLite database {file_name!r}.')
+
+        return self.__build_generation(postcodes, keys, coordinates)
+
+    def __load_database(self) -> tuple:
+        """Load postcodes from the database into a new generation, over a connection 
+        from the connection pool.
+
+        :return: the new generation, None on failure, and a possible error message.
+        :rtype: tuple.
+        """
+        # Imported here: psycopg2 is only needed when there is neither a snapshot nor 
+        # a SQLite database to load from.
+        from src.bh_aust_postcode.utils.db_pool import get_connection_pool
+
+        generation = None
+        message = ''
+        try:
+            with get_connection_pool().connection() as connection:
+                schema_name, postcode_table_name = self.__get_database_info()
+                schema_exists, table_exists, has_coordinates = self.__database_objects_exist(connection)
+
+                if (not schema_exists):
+                    message = "Database schema {!r} does not yet exist.".format(schema_name)
+                    print_log(logger, message, 'info')
+                    return None, message
+                
+                if (not table_exists):
+                    message = "Database table {!r} does not yet exist.".format(postcode_table_name)
+                    print_log(logger, message, 'info')
+                    return None, message
+
+                # Until update-postcode adds them, the table has no coordinates.
+                columns = 'latitude, longitude' if has_coordinates else 'NULL, NULL'
+                sql = format_sql_statement(f'SELECT locality, state, postcode, {columns} FROM {{0}}.{{1}} '
+                                           'ORDER BY locality, state, postcode')
+
+                cursor = connection.cursor()
+
+                cursor.execute(sql)
+
+                if app.config['POSTCODE_POOL_COMPACT']:
+                    generation = self.__load_compact(cursor)
+                    if generation != None:
+                        cursor.close()
+                        logger.info(f'Loaded {len(generation.postcodes)} postcodes into compact pool.')
+                        return generation, message
+
+                    # Failed part way through: start over with dictionaries.
+                    cursor.execute(sql)
+
+                postcodes = []
+                coordinates = array('d')
+                for row in coordinate_rows(cursor, coordinates):
+                    postcode = {'locality': row[0], 'state': row[1], 'postcode': row[2]}
+                    postcodes.append(postcode)
+                cursor.close()
+
+            generation = self.__build_generation(postcodes, [pc['locality'].upper() for pc in postcodes],
+                                                 coordinates)
+
+            logger.info(f'Loaded {len(postcodes)} postcodes into pool.')
+
+        except Exception as error:
+            generation = None
+            message = str(error)
+            logger.exception(message)
+
+        return generation, message
 
     def load(self, force_reload=False) -> tuple:
-        """Load all postcodes from the database into :attr:`~.PostcodePool.postcodes`.
+        """Load all postcodes into :attr:`~.PostcodePool.postcodes`.
+
+        Postcodes are memory mapped from the binary snapshot written by the 
+        ``update-postcode`` command when it is available, otherwise they are loaded 
+        from the embedded SQLite database the command also writes, and failing that
+        from PostgreSQL.
+
+        Postcodes and indexes are built into a new :class:`PoolGeneration`, then 
+        published with a single assignment to :attr:`~.PostcodePool.current`. Until
+        then, and for searches already under way, the previous generation is used. 
+        On failure the previous generation stays.
 
         :param bool force_reload: force reloading postcodes the database.
 
         :return: a Boolean result and a possible error message. 
         :rtype: tuple.
         """
-        try:
-            db_conn_params = get_database_connection()            
-            connection = psycopg2.connect(**db_conn_params)
+        if not force_reload and len(PostcodePool.current.postcodes) > 0:
+            logger.info('Postcodes have already been loaded.')
+            return True, ''
+
+        with PostcodePool.reload_lock:
+            previous = PostcodePool.current
+            # Loaded by another thread while waiting.
+            if not force_reload and len(previous.postcodes) > 0: return True, ''
+
+            if force_reload: logger.info('Force reloading.')
+            started = time.perf_counter()
+
+            file_name = snapshot_filename()
+            generation = self.__load_snapshot(file_name) if file_name else None
+            if generation == None:
+                file_name = sqlite_filename()
+                generation = self.__load_sqlite(file_name) if file_name else None
 
-            result = False
             message = ''
+            if generation == None: generation, message = self.__load_database()
 
-            schema_name, postcode_table_name = self.__get_database_info()
-
-            if (not self.__schema_exists(connection)):
-                message = "Database schema {!r} does not yet exist.".format(schema_name)
-                print_log(logger, message, 'info')
-                return
-            
-            if (not self.__table_exists(connection)):
-                message = "Database table {!r} does not yet exist.".format(postcode_table_name)
-                print_log(logger, message, 'info')
-                return
-
-            result = True
-
-            if force_reload:
-                logger.info('Force reloading.')
-                PostcodePool.postcodes.clear()
-            else:
-                if len(PostcodePool.postcodes) > 0:
-                    logger.info('Postcodes have already been loaded.')
-                    return
-
-            cursor = connection.cursor()
-
-            cursor.execute(format_sql_statement('SELECT * FROM {0}.{1} ORDER BY locality, state, postcode'))
-            for row in cursor:
-                postcode = {'locality': row[1], 'state': row[2], 'postcode': row[3]}
-                PostcodePool.postcodes.append(postcode)
-            cursor.close()
+            if generation == None: return False, message
 
-            logger.info(f'Loaded {len(PostcodePool.postcodes)} postcodes into pool.')
+            generation.load_seconds = round(time.perf_counter() - started, 3)
+            PostcodePool.current = generation
 
-        except Exception as error:
-            result = False
-            message = str(error)
-            logger.exception(message)
+        count, delta = len(generation.postcodes), len(generation.postcodes) - len(previous.postcodes)
+        print_log(logger, f'Published postcode generation {generation.generation}: {count} postcodes '
+                          f'({delta:+d}) in {generation.load_seconds:.3f} seconds.', 'info')
 
-        finally:
-            if connection:
-                connection.close()
-            return result, message
+        return True, ''
+
+    def __get_refinement_cache(self) -> RefinementCache:
+        """Get :attr:`~.PostcodePool.refinement_cache`, creating it from configuration 
+        on first use.
+
+        :return: the cache, or None when ``REFINEMENT_CACHE_MAX_BYTES`` is 0.
+        :rtype: :class:`~src.bh_aust_postcode.api.refinement_cache.RefinementCache`.
+        """
+        if PostcodePool.refinement_cache == None and app.config['REFINEMENT_CACHE_MAX_BYTES'] > 0:
+            PostcodePool.refinement_cache = RefinementCache(app.config['REFINEMENT_CACHE_MAX_BYTES'])
+
+        return PostcodePool.refinement_cache
+
+    def __locality_positions(self, current: PoolGeneration, key: str):
+        """Ascending positions of the postcodes whose uppercased locality contains a 
+        text, in a generation.
+
+        Positions are looked up in :attr:`~.PostcodePool.refinement_cache` first. When 
+        only a text which ``key`` starts or ends with is cached, just its positions are 
+        checked, rather than searching :attr:`~.PostcodePool.locality_index`. Either
+        way the positions are cached for the next, longer, text.
+
+        :param PoolGeneration current: the generation to search.
+        :param str key: the uppercased locality / suburb text.
+
+        :return: ascending positions. A list, or an unsigned integer array.
+        """
+        index = current.locality_index
+        cache = self.__get_refinement_cache()
+        if cache == None or key == '': return index.search(key)
+
+        candidates, found = cache.lookup(key, current.generation)
+        if found == key: return candidates
+
+        if candidates == None:
+            positions = index.search(key)
+        else:
+            keys = index.keys
+            positions = [pos for pos in candidates if key in keys[pos]]
+
+        cache.put(key, positions, current.generation)
+        return positions
+
+    def __iter_locality_positions(self, current: PoolGeneration, key: str):
+        """Lazily generate :meth:`__locality_positions`. Nothing is cached, so that a 
+        caller which stops early saves the rest: only cached positions are used, when 
+        there are any.
+        """
+        index = current.locality_index
+        cache = self.__get_refinement_cache()
+        if cache == None or key == '': return index.iter_search(key)
+
+        candidates, found = cache.lookup(key, current.generation)
+        if candidates == None: return index.iter_search(key)
+        if found == key: return iter(candidates)
+
+        keys = index.keys
+        return (pos for pos in candidates if key in keys[pos])
+
+    def __state_positions(self, current: PoolGeneration, state: str) -> list:
+        """Ascending positions of the postcodes in a state, via 
+        :attr:`~.PostcodePool.state_index` of a generation.
+        """
+        index = current.state_index
+        return index.search(state.upper()) if index != None else []
 
-    def search(self, locality: str) -> list:
+    def search(self, locality: str, offset: int=0, limit: int=None, state: str=None) -> list:
         """Match postcodes based on locality / suburb. It is a partial match.
 
         :param str locality: the locality / suburb to match on. It always assumes this 
             is a partial name of a locality / suburb. The match is always partial.
+        :param int offset: number of matching postcodes to skip.
+        :param int limit: maximum number of matching postcodes to return. None for all.
+        :param str state: only match postcodes in this state, case insensitive. None for 
+            all states.
+
+        Only postcodes found via :attr:`~.PostcodePool.locality_index` get checked,
+        the result is in the same order as :attr:`~.PostcodePool.postcodes`. When a 
+        page is asked for, checking stops as soon as the page is full. Matches are
+        kept to a state via :attr:`~.PostcodePool.state_index`. As a text is typed
+        character by character, only the matches of the text so far get checked,
+        via :attr:`~.PostcodePool.refinement_cache`.
 
         :return: a list matching postcode(s). Each postcode has the following text fields
             : ``locality``, ``state`` and ``postcode``.
         :rtype: tuple.
         """
-        result = [pc for pc in PostcodePool.postcodes 
-                    if locality.upper() in pc['locality'].upper()]
+        if offset > 0 or limit != None:
+            return list(self.iter_search(locality, offset, limit, state))
+
+        current = PostcodePool.current
+        index = current.locality_index
+        if index == None: return []
+
+        positions = self.__locality_positions(current, locality.upper())
+        if state != None: positions = intersect(positions, self.__state_positions(current, state))
+
+        postcodes = current.postcodes
+        result = [postcodes[pos] for pos in positions]
         
         return result
 
+    def search_many(self, queries: list) -> list:
+        """Match postcodes for many locality / suburb texts at once, see :meth:`search`.
+
+        All queries are answered from the same generation, in a single pass: each 
+        distinct uppercased text is looked up via :attr:`~.PostcodePool.locality_index`
+        once, and each distinct state via :attr:`~.PostcodePool.state_index` once,
+        however many queries share them. Their positions are then intersected.
+
+        :param list queries: ``(locality, state)`` tuples, ``state`` None for all states.
+
+        :return: for each query, in the same order, a list of matching postcodes.
+        :rtype: list.
+        """
+        current = PostcodePool.current
+        if current.locality_index == None: return [[] for _ in queries]
+
+        locality_positions = {}
+        state_positions = {}
+        for locality, state in queries:
+            key = locality.upper()
+            if key not in locality_positions:
+                locality_positions[key] = self.__locality_positions(current, key)
+            if state != None and state.upper() not in state_positions:
+                state_positions[state.upper()] = self.__state_positions(current, state)
+
+        postcodes = current.postcodes
+        result = []
+        for locality, state in queries:
+            positions = locality_positions[locality.upper()]
+            if state != None: positions = intersect(positions, state_positions[state.upper()])
+            result.append([postcodes[pos] for pos in positions])
+
+        return result
+
+    def iter_search(self, locality: str, offset: int=0, limit: int=None, state: str=None):
+        """Lazily match postcodes based on locality / suburb, see :meth:`search`.
+
+        :param str locality: the locality / suburb to match on.
+        :param int offset: number of matching postcodes to skip.
+        :param int limit: maximum number of matching postcodes to generate. None for all.
+        :param str state: only match postcodes in this state. None for all states.
+
+        :return: a generator of matching postcodes, in the same order as 
+            :attr:`~.PostcodePool.postcodes`.
+        """
+        current = PostcodePool.current
+        index = current.locality_index
+        if index == None: return iter(())
+
+        positions = self.__iter_locality_positions(current, locality.upper())
+        if state != None: positions = iter_intersect(positions, self.__state_positions(current, state))
+
+        stop = None if limit == None else offset + limit
+        positions = islice(positions, offset, stop)
+
+        postcodes = current.postcodes
+        return (postcodes[pos] for pos in positions)
+
+    def count_matches(self, locality: str, state: str=None) -> int:
+        """Count postcodes :meth:`search` matches, without building them.
+
+        :param str locality: the locality / suburb to match on.
+        :param str state: only count postcodes in this state. None for all states.
+
+        :return: number of matching postcodes.
+        :rtype: int.
+        """
+        current = PostcodePool.current
+        index = current.locality_index
+        if index == None: return 0
+
+        key = locality.upper()
+        if self.__get_refinement_cache() == None or key == '':
+            if state == None: return index.count(key)
+            positions = index.iter_search(key)
+        else:
+            positions = self.__locality_positions(current, key)
+            if state == None: return len(positions)
+
+        return sum(1 for _ in iter_intersect(positions, self.__state_positions(current, state)))
+
+    def search_postcode(self, postcode: str) -> list:
+        """Match postcodes exactly, i.e. localities / suburbs which have a postcode.
+
+        :param str postcode: the postcode to match on, e.g. ``3171``.
+
+        Postcodes are found in O(1) via :attr:`~.PostcodePool.postcode_index`, the 
+        result is in the same order as :attr:`~.PostcodePool.postcodes`.
+
+        :return: a list matching postcode(s). Each postcode has the following text fields
+            : ``locality``, ``state`` and ``postcode``.
+        :rtype: list.
+        """
+        current = PostcodePool.current
+        index = current.postcode_index
+        if index == None: return []
+
+        postcodes = current.postcodes
+        return [postcodes[pos] for pos in index.search(postcode)]
+
+    def search_fuzzy(self, locality: str, max_distance: int=None) -> list:
+        """Match postcodes whose locality / suburb is within an edit distance of a text,
+        nearest first, so that misspelt localities are still found.
+
+        :param str locality: the whole locality / suburb, possibly misspelt.
+        :param int max_distance: the greatest number of insertions, deletions, substitutions 
+            and transpositions of adjacent characters. None for the distance
+            :attr:`~.PostcodePool.fuzzy_index` was built with.
+
+        Postcodes are found via :attr:`~.PostcodePool.fuzzy_index`, the result is ranked
+        by distance, then in the same order as :attr:`~.PostcodePool.postcodes`.
+
+        :return: a list matching postcode(s). Each postcode has the following text fields
+            : ``locality``, ``state`` and ``postcode``.
+        :rtype: list.
+        """
+        current = PostcodePool.current
+        index = current.fuzzy_index
+        if index == None: return []
+
+        postcodes = current.postcodes
+        return [postcodes[pos] for pos in index.search(locality.upper(), max_distance)]
+
+    def search_prefix(self, locality: str) -> list:
+        """Match postcodes whose locality / suburb starts with a text.
+
+        :param str locality: the start of the locality / suburb to match on.
+
+        Postcodes are found by binary search via :attr:`~.PostcodePool.prefix_index`,
+        the result is in the same order as :attr:`~.PostcodePool.postcodes`.
+
+        :return: a list matching postcode(s). Each postcode has the following text fields
+            : ``locality``, ``state`` and ``postcode``.
+        :rtype: list.
+        """
+        current = PostcodePool.current
+        index = current.prefix_index
+        if index == None: return []
+
+        postcodes = current.postcodes
+        return [postcodes[pos] for pos in index.search(locality.upper())]
+
+    def search_near(self, latitude: float, longitude: float, k: int=None, 
+                    radius: float=None) -> list:
+        """Match the postcodes nearest to a point.
+
+        :param float latitude: latitude of the point, in degrees.
+        :param float longitude: longitude of the point, in degrees.
+        :param int k: the greatest number of postcodes to match. None for all within 
+            ``radius``.
+        :param float radius: only match postcodes within this many kilometres. None for 
+            the ``k`` nearest, however far.
+
+        Postcodes are found via :attr:`~.PostcodePool.spatial_index`, without measuring
+        the distance to every postcode. The result is ranked by distance, then in the 
+        same order as :attr:`~.PostcodePool.postcodes`.
+
+        :return: a list matching postcode(s). Each postcode has the following text fields
+            : ``locality``, ``state`` and ``postcode``, and the number fields 
+            ``latitude``, ``longitude`` and ``distance``, in kilometres.
+        :rtype: list.
+        """
+        current = PostcodePool.current
+        index = current.spatial_index
+        if index == None: return []
+
+        postcodes, coordinates = current.postcodes, current.coordinates
+        result = []
+        for distance, pos in index.nearest(latitude, longitude, k, radius):
+            postcode = dict(postcodes[pos])
+            postcode['latitude'] = coordinates[2 * pos]
+            postcode['longitude'] = coordinates[2 * pos + 1]
+            postcode['distance'] = distance
+            result.append(postcode)
+
+        return result
+
+    def generation_info(self) -> tuple:
+        """:attr:`~.PostcodePool.version` and :attr:`~.PostcodePool.generation`, of the 
+        same generation.
+
+        :rtype: tuple.
+        """
+        current = PostcodePool.current
+        return current.version, current.generation
+
     @property
     def count(self) -> str: 
         """Read only property. Total number of postcodes in :attr:`~.PostcodePool.postcodes`.
         """
-        return len(PostcodePool.postcodes)
+        return len(PostcodePool.current.postcodes)
+
+    @property
+    def load_seconds(self) -> float:
+        """Read only property. Seconds it took to load :attr:`~.PostcodePool.postcodes`
+        and build their indexes. None before the first load.
+        """
+        return PostcodePool.current.load_seconds
+
+    @property
+    def has_coordinates(self) -> bool:
+        """Read only property. Whether any of :attr:`~.PostcodePool.postcodes` have 
+        coordinates, for :meth:`search_near`.
+        """
+        index = PostcodePool.current.spatial_index
+        return index != None and index.count > 0
+
+    @property
+    def fuzzy_max_distance(self) -> int:
+        """Read only property. Configuration ``FUZZY_MAX_DISTANCE``, the distance 
+        :attr:`~.PostcodePool.fuzzy_index` is built for.
+        """
+        return app.config['FUZZY_MAX_DISTANCE']
     
 ### TO_DO:
     
@@ -0,0 +1,314 @@
+"""
+Versioned binary snapshot of the postcode pool.
+
+The ``update-postcode`` command writes all postcodes, together with their
+indexes, to a single file in the application instance folder.
+:class:`~src.bh_aust_postcode.api.postcode_pool.PostcodePool` memory maps
+that file instead of querying PostgreSQL: columns and index tables are used
+in place, so every worker shares the same read only pages, and loading costs
+only a few milliseconds. Nothing is copied out of the mapping as it is read: 
+texts are decoded one at a time as searches read them, and the n-grams and
+distinct values of the indexes are looked up by binary search, instead of
+dictionaries built in every worker.
+
+File layout, all integers in native byte order::
+
+    header   : see HEADER, padded to 8 bytes.
+    sections : see SECTIONS, in that order, each padded to 4 bytes. The first three,
+               of 8 byte floats, are 8 byte aligned.
+
+Text sections which hold several strings hold them UTF-8 encoded, back to
+back, followed in :data:`SECTIONS` by a section of their byte offsets, see
+:func:`~src.bh_aust_postcode.api.compact_postcodes.pack_texts`; except the
+state table, a handful of codes, whose codes are separated with NUL, which
+PostgreSQL text never contains.
+
+Relevant test modules:
+
+    * ./tests/test_postcode_pool.py
+"""
+
+import os
+import mmap
+import hashlib
+import time
+import struct
+import zlib
+
+from array import array
+
+from flask import current_app as app
+
+from src.bh_aust_postcode.api.postcode_index import (
+    NgramIndex,
+    PrefixIndex,
+    ValueIndex,
+    FuzzyIndex,
+    SpatialIndex,
+)
+from src.bh_aust_postcode.api.compact_postcodes import (
+    CompactPostcodes,
+    LocalityKeys,
+    pack_texts,
+)
+
+MAGIC = b'BHPC'
+#: Bump whenever the layout changes: older snapshots are then treated as stale.
+FORMAT_VERSION = 7
+#: Written natively, reads back differently on a machine of the other byte order,
+#: whose snapshots are then refused rather than misread.
+BYTE_ORDER_MARK = 0x0102
+
+#: Section names, in file order.
+SECTIONS = ('coordinates', 'spatial_points', 'spatial_splits', 'spatial_order', 'spatial_axes',
+            'offsets', 'postcodes', 'states', 'state_table', 'localities',
+            'keys', 'key_offsets', 'grams', 'gram_offsets', 'gram_starts', 'postings', 'sorted',
+            'postcode_values', 'postcode_value_offsets', 'postcode_starts', 'postcode_postings',
+            'state_values', 'state_value_offsets', 'state_starts', 'state_postings',
+            'word_values', 'word_value_offsets', 'word_starts', 'word_postings',
+            'deletes', 'delete_offsets', 'delete_starts', 'delete_postings', 'version')
+
+#: magic, version, byte order mark, rows, created, n-gram length, crc32, 
+#: fuzzy maximum distance, fuzzy prefix length, spatial index leaf size, section sizes.
+#: Native byte order, as the sections, with standard sizes and no alignment.
+HEADER = struct.Struct(f'=4sHHIdIIHHH{len(SECTIONS)}I')
+
+SEPARATOR = '\0'
+
+class SnapshotError(ValueError):
+    """A snapshot file is invalid or stale, and must not be used."""
+
+def snapshot_filename() -> str:
+    """Get the full path of the snapshot file.
+
+    :return: full path of the snapshot file, or None if snapshots are not configured.
+    :rtype: str.
+    """
+    file_name = app.config['POSTCODE_SNAPSHOT_FILE']
+
+    return os.path.join(app.instance_path, '', file_name) if file_name else None
+
+def dataset_version(postcodes) -> str:
+    """Identify a dataset of postcodes by its content, so that it is the same in 
+    every process, whether postcodes were loaded from the database or a snapshot.
+
+    :param postcodes: postcode dictionaries in pool order. A list or 
+        :class:`~src.bh_aust_postcode.api.compact_postcodes.CompactPostcodes`.
+
+    :return: hexadecimal SHA-1 digest of all postcodes.
+    :rtype: str.
+    """
+    digest = hashlib.sha1()
+    for pc in postcodes:
+        digest.update(f"{pc['locality']}\t{pc['state']}\t{pc['postcode']}\n".encode('utf-8'))
+
+    return digest.hexdigest()
+
+def __padded(size: int, alignment: int) -> int:
+    return (size + alignment - 1) // alignment * alignment
+
+def __section_positions(sizes: tuple) -> list:
+    positions = []
+    pos = __padded(HEADER.size, 8)
+    for size in sizes:
+        positions.append(pos)
+        pos = __padded(pos + size, 4)
+
+    return positions
+
+def write_snapshot(file_name: str, postcodes: CompactPostcodes, fuzzy_distance: int=0, 
+                   coordinates: array=None) -> int:
+    """Write postcodes, their trigram index, prefix index, postcode and state indexes,
+    and optionally their fuzzy index and their coordinates with their spatial index, 
+    to a snapshot file.
+
+    The file is written to a temporary file first, then renamed over ``file_name``,
+    so processes which have mapped the previous snapshot are not affected.
+
+    :param str file_name: full path of the snapshot file.
+    :param CompactPostcodes postcodes: postcodes to write, already in pool order.
+    :param int fuzzy_distance: maximum edit distance of the fuzzy index. 0 to leave
+        the fuzzy index out.
+    :param array coordinates: latitude and longitude of each postcode, back to back,
+        NaN when unknown, see :class:`~src.bh_aust_postcode.api.postcode_index.SpatialIndex`. 
+        None to leave coordinates out.
+
+    :return: the size of the file written.
+    :rtype: int.
+    """
+    keys = postcodes.locality_keys()
+    index = NgramIndex(keys)
+    prefix_index = PrefixIndex(keys)
+    postcode_values, postcode_starts, postcode_postings = \
+        ValueIndex(postcodes.field('postcode')).tables()
+    state_values, state_starts, state_postings = ValueIndex(postcodes.field('state')).tables()
+
+    if fuzzy_distance > 0:
+        fuzzy_index = FuzzyIndex(keys, fuzzy_distance)
+        words, ordered, delete_starts, delete_postings = fuzzy_index.tables()
+        word_values, word_starts, word_postings = words.tables()
+        prefix_length = fuzzy_index.prefix_length
+    else:
+        word_values, word_starts, word_postings = [], [], []
+        ordered, delete_starts, delete_postings = [], [], []
+        prefix_length = 0
+
+    if coordinates != None:
+        spatial_index = SpatialIndex(coordinates)
+        spatial_points, spatial_order, spatial_axes, spatial_splits = spatial_index.tables()
+        leaf_size = spatial_index.leaf_size
+    else:
+        coordinates, spatial_points, spatial_order, spatial_axes, spatial_splits = [], [], [], b'', []
+        leaf_size = 0
+
+    localities, offsets, state_table, states, packed = postcodes.columns()
+    grams, gram_starts, postings = index.tables()
+
+    def texts(values) -> tuple:
+        text, text_offsets = pack_texts(values)
+        return text, text_offsets.tobytes()
+
+    sections = (
+        array('d', coordinates).tobytes(),
+        array('d', spatial_points).tobytes(),
+        array('d', spatial_splits).tobytes(),
+        array('I', spatial_order).tobytes(),
+        bytes(spatial_axes),
+        array('I', offsets).tobytes(),
+        array('H', packed).tobytes(),
+        bytes(states),
+        SEPARATOR.join(state_table).encode('utf-8'),
+        bytes(localities),
+        *texts(keys),
+        *texts(grams),
+        array('I', gram_starts).tobytes(),
+        array('I', postings).tobytes(),
+        array('I', prefix_index.order).tobytes(),
+        *texts(postcode_values),
+        array('I', postcode_starts).tobytes(),
+        array('I', postcode_postings).tobytes(),
+        *texts(state_values),
+        array('I', state_starts).tobytes(),
+        array('I', state_postings).tobytes(),
+        *texts(word_values),
+        array('I', word_starts).tobytes(),
+        array('I', word_postings).tobytes(),
+        *texts(ordered),
+        array('I', delete_starts).tobytes(),
+        array('I', delete_postings).tobytes(),
+        dataset_version(postcodes).encode('ascii'),
+    )
+
+    sizes = tuple(len(section) for section in sections)
+    positions = __section_positions(sizes)
+
+    body = bytearray(positions[-1] + sizes[-1])
+    for pos, section in zip(positions, sections):
+        body[pos:pos + len(section)] = section
+
+    checksum = zlib.crc32(memoryview(body)[HEADER.size:])
+    body[:HEADER.size] = HEADER.pack(MAGIC, FORMAT_VERSION, BYTE_ORDER_MARK, len(postcodes),
+                                     time.time(), index.n, checksum, 
+                                     fuzzy_distance, prefix_length, leaf_size, *sizes)
+
+    temp_file_name = f'{file_name}.{os.getpid()}.tmp'
+    with open(temp_file_name, 'wb') as f:
+        f.write(body)
+
+    os.replace(temp_file_name, file_name)
+
+    return len(body)
+
+def read_snapshot(file_name: str, max_age: int=0) -> tuple:
+    """Memory map a snapshot file.
+
+    :param str file_name: full path of the snapshot file.
+    :param int max_age: maximum age in seconds. 0 means a snapshot never goes stale.
+
+    :return: :class:`~src.bh_aust_postcode.api.compact_postcodes.CompactPostcodes`,
+        :class:`~src.bh_aust_postcode.api.postcode_index.NgramIndex`,
+        :class:`~src.bh_aust_postcode.api.postcode_index.PrefixIndex`, and
+        :class:`~src.bh_aust_postcode.api.postcode_index.ValueIndex` over ``postcode``
+        and over ``state``, :class:`~src.bh_aust_postcode.api.postcode_index.FuzzyIndex`
+        or None when the snapshot has none, all backed by the mapped file, the 
+        :func:`dataset_version` of the postcodes, and their coordinates and
+        :class:`~src.bh_aust_postcode.api.postcode_index.SpatialIndex`, both None when
+        the snapshot has no coordinates. Only the state table and the dataset version
+        are copied out of the mapping.
+    :rtype: tuple.
+
+    :raises OSError: the snapshot file cannot be opened, e.g. it does not exist.
+    :raises SnapshotError: the snapshot file is invalid or stale.
+    """
+    with open(file_name, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(mm) < HEADER.size:
+        raise SnapshotError(f'Snapshot {file_name!r} is truncated.')
+
+    (magic, version, bom, rows, created, n, checksum, 
+     fuzzy_distance, prefix_length, leaf_size, *sizes) = HEADER.unpack_from(mm)
+
+    if magic != MAGIC:
+        raise SnapshotError(f'{file_name!r} is not a postcode snapshot.')
+    if version != FORMAT_VERSION or bom != BYTE_ORDER_MARK:
+        raise SnapshotError(f'Snapshot {file_name!r} has an incompatible format.')
+    if max_age and time.time() - created > max_age:
+        raise SnapshotError(f'Snapshot {file_name!r} is older than {max_age} seconds.')
+
+    positions = __section_positions(sizes)
+    if positions[-1] + sizes[-1] != len(mm):
+        raise SnapshotError(f'Snapshot {file_name!r} is truncated.')
+
+    view = memoryview(mm)
+    if zlib.crc32(view[HEADER.size:]) != checksum:
+        raise SnapshotError(f'Snapshot {file_name!r} is corrupted.')
+
+    section = {name: view[pos:pos + size]
+               for name, pos, size in zip(SECTIONS, positions, sizes)}
+
+    postcodes = CompactPostcodes(section['localities'],
+                                 section['offsets'].cast('I'),
+                                 tuple(str(section['state_table'], 'utf-8').split(SEPARATOR)),
+                                 section['states'],
+                                 section['postcodes'].cast('H'))
+
+    def texts(name: str, offsets_name: str) -> LocalityKeys:
+        return LocalityKeys(section[name], section[offsets_name].cast('I'))
+
+    keys = texts('keys', 'key_offsets')
+
+    index = NgramIndex.restore(keys, n, texts('grams', 'gram_offsets'),
+                               section['gram_starts'].cast('I'), section['postings'].cast('I'))
+
+    prefix_index = PrefixIndex.restore(keys, section['sorted'].cast('I'))
+
+    def value_index(name: str) -> ValueIndex:
+        return ValueIndex.restore(texts(f'{name}_values', f'{name}_value_offsets'),
+                                  section[f'{name}_starts'].cast('I'),
+                                  section[f'{name}_postings'].cast('I'))
+
+    postcode_index, state_index = value_index('postcode'), value_index('state')
+
+    fuzzy_index = None
+    if fuzzy_distance > 0:
+        word_index = value_index('word')
+        ordered = texts('deletes', 'delete_offsets')
+        fuzzy_index = FuzzyIndex.restore(word_index, fuzzy_distance, prefix_length, ordered,
+                                         section['delete_starts'].cast('I'),
+                                         section['delete_postings'].cast('I'))
+
+    coordinates, spatial_index = None, None
+    if sizes[0]:
+        coordinates = section['coordinates'].cast('d')
+        spatial_index = SpatialIndex.restore(coordinates, leaf_size, 
+                                             section['spatial_points'].cast('d'),
+                                             section['spatial_order'].cast('I'),
+                                             section['spatial_axes'],
+                                             section['spatial_splits'].cast('d'))
+
+    if len(postcodes) != rows or (coordinates != None and len(coordinates) != 2 * rows):
+        raise SnapshotError(f'Snapshot {file_name!r} is inconsistent.')
+
+    return (postcodes, index, prefix_index, postcode_index, state_index, fuzzy_index,
+            str(section['version'], 'ascii'), coordinates, spatial_index)
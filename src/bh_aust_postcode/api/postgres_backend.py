@@ -0,0 +1,229 @@
+"""
+Search postcodes in PostgreSQL directly, with one query per search over pooled
+connections, instead of holding them all in every worker.
+
+Partial and prefix searches are ``ILIKE`` queries, which the ``pg_trgm`` GIN index
+``schema.sql`` creates serves when the extension is available. Without it they
+scan the postcode table, which is still quick for the size of the dataset.
+
+Searches see the table as it is, but the search results and response caches are
+kept by generation. So that they follow the table, its change stamp is read at 
+most every ``GENERATION_CHECK_INTERVAL`` seconds, and postcodes are loaded again, 
+into a new generation, when it has changed: whoever changed them.
+
+Relevant test modules:
+
+    * ./tests/test_search_backend.py
+"""
+
+import hashlib
+import logging
+import threading
+import time
+
+from flask import current_app as app
+
+from src.bh_aust_postcode.utils import (
+    print_log,
+    format_sql_statement,
+)
+from src.bh_aust_postcode.utils.db_pool import get_connection_pool
+from src.bh_aust_postcode.api.search_backend import SearchBackend
+
+logger = logging.getLogger('admin')
+
+#: Columns and order of every search, the same order the postcode pool holds.
+SELECT_POSTCODES = 'SELECT locality, state, postcode FROM {0}.{1} WHERE '
+ORDER_BY = ' ORDER BY locality, state, postcode'
+#: Changes whenever rows are inserted, updated or deleted: the number of rows, and the
+#: newest transaction which wrote one of them.
+CHANGE_STAMP = 'SELECT count(*), max(xmin::text::bigint) FROM {0}.{1}'
+
+def like_pattern(text: str) -> str:
+    """Escape ``LIKE`` wildcards and the escape character in a search text.
+
+    :param str text: the search text.
+
+    :return: the text matching only itself in a ``LIKE`` pattern.
+    :rtype: str.
+    """
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+class PostgresBackend(SearchBackend):
+    """The ``postgres`` :class:`~src.bh_aust_postcode.api.search_backend.SearchBackend`.
+
+    Only the number of postcodes, their content digest and the table's change stamp
+    are held, as of the last :meth:`load`. Searches see the table as it is, and
+    :meth:`generation_info` loads again when the change stamp has moved on.
+    """
+
+    name = 'postgres'
+
+    def __init__(self):
+        self.__info = ('', 0)
+        self.__count = 0
+        self.__seconds = None
+        self.__lock = threading.Lock()
+
+        self.__stamp = None
+        self.__check_interval = 0
+        self.__next_check = 0.0
+        self.__check_lock = threading.Lock()
+
+    def __query(self, sql: str, params: tuple) -> list:
+        """Run a postcode selection over a pooled connection.
+
+        :param str sql: the selection, with ``{0}`` and ``{1}`` for the schema and table.
+        :param tuple params: the query parameters.
+
+        :return: postcode dictionaries.
+        :rtype: list.
+        """
+        with get_connection_pool().connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(format_sql_statement(sql), params)
+            rows = cursor.fetchall()
+            cursor.close()
+
+        return [{'locality': row[0], 'state': row[1], 'postcode': row[2]} for row in rows]
+
+    def __partial_condition(self, locality: str, state: str) -> tuple:
+        """``WHERE`` condition and parameters of a partial search.
+        """
+        condition = "locality ILIKE %s"
+        params = ('%' + like_pattern(locality) + '%',)
+        if state != None:
+            condition += " AND state = %s"
+            params += (state.upper(),)
+
+        return condition, params
+
+    def load(self, force_reload: bool=False) -> tuple:
+        """Count postcodes and digest their content, which identifies the dataset in
+        ETags the same as the postcode pool does. Streamed through a server side
+        cursor, so that the table is never held in memory.
+
+        :param bool force_reload: count and digest again even if already done.
+
+        :return: a Boolean result and a possible error message.
+        :rtype: tuple.
+        """
+        with self.__lock:
+            version, generation = self.__info
+            if not force_reload and generation > 0:
+                logger.info('Postcodes have already been loaded.')
+                return True, ''
+
+            started = time.perf_counter()
+            try:
+                with get_connection_pool().connection() as connection:
+                    # Read first: a change during the scan moves it on again.
+                    cursor = connection.cursor()
+                    cursor.execute(format_sql_statement(CHANGE_STAMP))
+                    stamp = cursor.fetchone()
+                    cursor.close()
+
+                    cursor = connection.cursor('postgres_backend_load')
+                    cursor.itersize = 5000
+                    cursor.execute(format_sql_statement('SELECT locality, state, postcode FROM {0}.{1}'
+                                                        + ORDER_BY))
+                    digest = hashlib.sha1()
+                    count = 0
+                    for row in cursor:
+                        digest.update(f"{row[0]}\t{row[1]}\t{row[2]}\n".encode('utf-8'))
+                        count += 1
+                    cursor.close()
+
+            except Exception as error:
+                message = str(error)
+                logger.exception(message)
+                return False, message
+
+            self.__count = count
+            self.__seconds = round(time.perf_counter() - started, 3)
+            self.__stamp = stamp
+            self.__check_interval = app.config['GENERATION_CHECK_INTERVAL']
+            self.__next_check = time.monotonic() + self.__check_interval
+            self.__info = (digest.hexdigest(), generation + 1)
+
+        print_log(logger, f'Postgres search backend generation {generation + 1}: '
+                          f'{count} postcodes.', 'info')
+        return True, ''
+
+    def __check_changes(self) -> None:
+        """Load again when the table's change stamp differs from the one loaded, at most
+        every ``GENERATION_CHECK_INTERVAL`` seconds, 0 for never. Failures are logged,
+        and the current generation kept until the next check.
+        """
+        if self.__check_interval <= 0 or time.monotonic() < self.__next_check: return
+
+        # Another request is checking already.
+        if not self.__check_lock.acquire(blocking=False): return
+        try:
+            self.__next_check = time.monotonic() + self.__check_interval
+
+            try:
+                with get_connection_pool().connection() as connection:
+                    cursor = connection.cursor()
+                    cursor.execute(format_sql_statement(CHANGE_STAMP))
+                    stamp = cursor.fetchone()
+                    cursor.close()
+            except Exception as error:
+                print_log(logger, f'Checking postcodes for changes failed: {error}', 'warning')
+                return
+
+            if stamp != self.__stamp:
+                print_log(logger, 'Postcodes have changed, loading them again.', 'info')
+                self.load(force_reload=True)
+        finally:
+            self.__check_lock.release()
+
+    def generation_info(self) -> tuple:
+        """See :meth:`~src.bh_aust_postcode.api.search_backend.SearchBackend.generation_info`.
+        Postcodes are loaded again first when the table's change stamp has moved on,
+        checked at most every ``GENERATION_CHECK_INTERVAL`` seconds.
+        """
+        self.__check_changes()
+        return self.__info
+
+    @property
+    def load_seconds(self) -> float:
+        """Read only property. Seconds the last successful :meth:`load` took."""
+        return self.__seconds
+
+    @property
+    def count(self) -> int:
+        """Read only property. Number of postcodes as of the last :meth:`load`."""
+        return self.__count
+
+    def search(self, locality: str, offset: int=0, limit: int=None, state: str=None) -> list:
+        condition, params = self.__partial_condition(locality, state)
+
+        sql = SELECT_POSTCODES + condition + ORDER_BY + ' OFFSET %s'
+        params += (offset,)
+        if limit != None:
+            sql += ' LIMIT %s'
+            params += (limit,)
+
+        return self.__query(sql, params)
+
+    def count_matches(self, locality: str, state: str=None) -> int:
+        condition, params = self.__partial_condition(locality, state)
+
+        with get_connection_pool().connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(format_sql_statement('SELECT count(*) FROM {0}.{1} WHERE ' + condition),
+                           params)
+            count = cursor.fetchone()[0]
+            cursor.close()
+
+        return count
+
+    def search_prefix(self, locality: str) -> list:
+        return self.__query(SELECT_POSTCODES + 'locality ILIKE %s' + ORDER_BY,
+                            (like_pattern(locality) + '%',))
+
+    def search_postcode(self, postcode: str) -> list:
+        return self.__query(SELECT_POSTCODES + 'postcode = %s' + ORDER_BY, (postcode,))
+
+postgres_backend = PostgresBackend()
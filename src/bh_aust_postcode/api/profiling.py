@@ -0,0 +1,341 @@
+"""
+Opt-in profiling of requests, to tell where the time of slow searches goes: Flask-RESTX
+dispatch and argument parsing, validation, the search backend, or JSON serialisation.
+
+The view functions of the endpoints in configuration ``PROFILE_ENDPOINTS``, by default
+``Postcode.get``, the partial search, are wrapped by :class:`RequestProfiler` when
+profiling is configured, and left as they are otherwise: disabled, profiling costs
+nothing. Either, or both:
+
+    * ``PROFILE_EVERY``: 1 in so many requests runs under ``cProfile``, and its
+      statistics are written to a ``.prof`` file, which ``pstats`` or ``snakeviz`` read.
+    * ``PROFILE_SLOW_SECONDS``: the stacks of the other requests are sampled every
+      ``PROFILE_SAMPLE_INTERVAL`` seconds by a background thread, and the samples of
+      requests which took longer are written to a ``.folded`` file: one
+      ``frame;frame;frame count`` line per stack, root first, which ``flamegraph.pl``
+      and speedscope turn into flame graphs. Requests shorter than the interval are
+      rarely sampled.
+
+Files are written to ``PROFILE_DIR``, in the instance folder, named after the time, the
+worker's pid and the duration of the request, and only the ``PROFILE_MAX_FILES`` newest
+are kept. ``flask profile-summary`` summarises them. Only the view function is profiled:
+compression, and the lines of streamed responses, come after it returns.
+
+Relevant test modules:
+
+    * ./tests/test_profiling.py
+"""
+
+import io
+import os
+import re
+import sys
+import glob
+import logging
+import threading
+import time
+
+from collections import Counter
+from datetime import datetime
+from functools import wraps
+from itertools import count
+
+from flask import current_app as app
+
+from src.bh_aust_postcode.utils import print_log
+
+# cProfile and pstats are imported by the functions which use them: nothing is
+# imported for profiling unless it is configured.
+
+logger = logging.getLogger('admin')
+
+PROFILE_FILE_PREFIX = 'profile'
+CPROFILE_EXTENSION = '.prof'
+STACKS_EXTENSION = '.folded'
+
+#: E.g. ``profile-20231018-101500-123456-4242-153ms.prof``, in the order written.
+PROFILE_FILE_PATTERN = re.compile(r'^profile-(\d{8}-\d{6}-\d{6})-(\d+)-(\d+)ms\.(prof|folded)$')
+
+#: Orders of the cProfile summary, see ``pstats.Stats.sort_stats``.
+SORT_KEYS = ('cumulative', 'tottime', 'ncalls')
+
+def __frame_name(frame: object) -> str:
+    code = frame.f_code
+    return f'{getattr(code, "co_qualname", code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+def collapse_stack(frame: object) -> str:
+    """A stack in the folded format of flame graphs.
+
+    :param object frame: the innermost frame.
+
+    :return: function names, root first, separated by ``;``.
+    :rtype: str.
+    """
+    names = []
+    while frame != None:
+        names.append(__frame_name(frame))
+        frame = frame.f_back
+
+    return ';'.join(reversed(names))
+
+class StackSampler(object):
+    """Samples the stacks of threads while they are registered, from a daemon thread
+    started on first use."""
+
+    def __init__(self, interval: float):
+        """
+        :param float interval: seconds between samples.
+        """
+        self.__interval = interval
+        self.__stacks = {}
+        self.__lock = threading.Lock()
+        self.__thread = None
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.__after_fork_in_child)
+
+    def start(self) -> None:
+        """Sample the stack of the calling thread, until :meth:`stop`."""
+        with self.__lock:
+            self.__stacks[threading.get_ident()] = Counter()
+
+            if self.__thread == None:
+                self.__thread = threading.Thread(target=self.__run, name='stack-sampler', daemon=True)
+                self.__thread.start()
+
+    def stop(self) -> Counter:
+        """Stop sampling the stack of the calling thread.
+
+        :return: number of samples of each stack, see :func:`collapse_stack`.
+        :rtype: Counter.
+        """
+        with self.__lock:
+            return self.__stacks.pop(threading.get_ident(), Counter())
+
+    def __run(self) -> None:
+        """Body of the sampling thread."""
+        while True:
+            time.sleep(self.__interval)
+
+            with self.__lock:
+                if len(self.__stacks) == 0: continue
+
+                frames = sys._current_frames()
+                for ident, stacks in self.__stacks.items():
+                    frame = frames.get(ident)
+                    if frame != None: stacks[collapse_stack(frame)] += 1
+
+    def __after_fork_in_child(self) -> None:
+        # The parent's thread does not exist in the child.
+        self.__lock = threading.Lock()
+        self.__stacks = {}
+        self.__thread = None
+
+class RequestProfiler(object):
+    """Wraps view functions to profile some of the requests they serve."""
+
+    def __init__(self, directory: str, every: int=0, slow_seconds: float=0,
+                 sample_interval: float=0.005, max_files: int=50):
+        """
+        :param str directory: where profiles are written, created if need be.
+        :param int every: profile 1 in so many requests with cProfile. 0 for none.
+        :param float slow_seconds: write the sampled stacks of requests which take
+            longer than this. 0 for none.
+        :param float sample_interval: seconds between stack samples.
+        :param int max_files: number of profiles kept, the oldest are deleted. 0
+            keeps all.
+        """
+        self.__directory = directory
+        self.__every = every
+        self.__slow_seconds = slow_seconds
+        self.__max_files = max_files
+        self.__requests = count()
+        self.__sampler = StackSampler(sample_interval) if slow_seconds > 0 else None
+
+        os.makedirs(directory, exist_ok=True)
+
+    def wrap(self, view):
+        """Wrap a view function.
+
+        :param view: the view function.
+
+        :return: the wrapped view function.
+        """
+        @wraps(view)
+        def profiled(*args, **kwargs):
+            if self.__every > 0 and next(self.__requests) % self.__every == 0:
+                return self.__profile(view, *args, **kwargs)
+
+            if self.__sampler == None: return view(*args, **kwargs)
+
+            self.__sampler.start()
+            started = time.perf_counter()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - started
+                stacks = self.__sampler.stop()
+                if seconds > self.__slow_seconds and len(stacks) > 0:
+                    self.__write(seconds, STACKS_EXTENSION,
+                                 lambda file_name: self.__write_stacks(file_name, stacks))
+
+        return profiled
+
+    def __profile(self, view, *args, **kwargs):
+        """Call a view function under cProfile."""
+        import cProfile
+
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            return view(*args, **kwargs)
+        finally:
+            profile.disable()
+            self.__write(time.perf_counter() - started, CPROFILE_EXTENSION, profile.dump_stats)
+
+    @staticmethod
+    def __write_stacks(file_name: str, stacks: Counter) -> None:
+        with open(file_name, 'w') as file:
+            for stack, samples in stacks.most_common():
+                file.write(f'{stack} {samples}\n')
+
+    def __write(self, seconds: float, extension: str, write) -> None:
+        """Write a profile, then delete the oldest beyond ``max_files``. Failures are
+        logged: they never fail the request."""
+        name = (f'{PROFILE_FILE_PREFIX}-{datetime.now().strftime("%Y%m%d-%H%M%S-%f")}-'
+                f'{os.getpid()}-{round(seconds * 1000)}ms{extension}')
+        file_name = os.path.join(self.__directory, name)
+
+        try:
+            # Written aside, so that the summary never reads a partial profile.
+            write(file_name + '.tmp')
+            os.replace(file_name + '.tmp', file_name)
+
+            if self.__max_files > 0:
+                for old_file_name in profile_files(self.__directory)[:-self.__max_files]:
+                    try:
+                        os.remove(old_file_name)
+                    except FileNotFoundError:
+                        # Another worker deleted it first.
+                        pass
+        except OSError as error:
+            print_log(logger, f'Writing profile {file_name!r} failed: {error}', 'warning')
+
+def profile_directory() -> str:
+    """Get the full path of the profiles directory.
+
+    :rtype: str.
+    """
+    return os.path.join(app.instance_path, '', app.config['PROFILE_DIR'])
+
+def register_profiling(app: object) -> RequestProfiler:
+    """Wrap the view functions of configuration ``PROFILE_ENDPOINTS`` when profiling
+    is configured. Called once blueprints are registered.
+
+    :param object app: the Flask application.
+
+    :return: the profiler, None when profiling is not configured.
+    :rtype: :class:`RequestProfiler`.
+    """
+    every = app.config['PROFILE_EVERY']
+    slow_seconds = app.config['PROFILE_SLOW_SECONDS']
+    if every <= 0 and slow_seconds <= 0: return None
+
+    with app.app_context():
+        directory = profile_directory()
+
+    profiler = RequestProfiler(directory, every, slow_seconds,
+                               app.config['PROFILE_SAMPLE_INTERVAL'], app.config['PROFILE_MAX_FILES'])
+
+    endpoints = [endpoint.strip() for endpoint in app.config['PROFILE_ENDPOINTS'].split(',')]
+    for endpoint in filter(None, endpoints):
+        view = app.view_functions.get(endpoint)
+        if view == None:
+            print_log(logger, f'Cannot profile {endpoint!r}: no such endpoint.', 'warning')
+            continue
+        app.view_functions[endpoint] = profiler.wrap(view)
+
+    print_log(logger, f'Profiling {endpoints} into {directory!r}: 1 in {every} requests, '
+                      f'stacks of requests over {slow_seconds} seconds.', 'info')
+    return profiler
+
+def profile_files(directory: str, extension: str=None) -> list:
+    """Full paths of the profiles in a directory, oldest first.
+
+    :param str directory: the profiles directory.
+    :param str extension: only profiles with this extension, e.g. ``.prof``. None for all.
+
+    :rtype: list.
+    """
+    file_names = [file_name for file_name in glob.glob(os.path.join(directory, f'{PROFILE_FILE_PREFIX}-*'))
+                  if PROFILE_FILE_PATTERN.match(os.path.basename(file_name))]
+    if extension != None:
+        file_names = [file_name for file_name in file_names if file_name.endswith(extension)]
+
+    return sorted(file_names, key=os.path.basename)
+
+def profile_milliseconds(file_name: str) -> int:
+    """Duration of the profiled request, from a profile's file name.
+
+    :rtype: int.
+    """
+    return int(PROFILE_FILE_PATTERN.match(os.path.basename(file_name)).group(3))
+
+def summarise_cprofile(file_names: list, sort: str='cumulative', limit: int=20) -> str:
+    """Statistics of cProfile profiles, added up.
+
+    :param list file_names: full paths of ``.prof`` profiles.
+    :param str sort: one of :data:`SORT_KEYS`.
+    :param int limit: number of functions listed.
+
+    :return: the ``pstats`` report.
+    :rtype: str.
+    """
+    import pstats
+
+    if len(file_names) == 0: return ''
+
+    stream = io.StringIO()
+    stats = pstats.Stats(*file_names, stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+
+    return stream.getvalue()
+
+def summarise_stacks(file_names: list, limit: int=20) -> str:
+    """Functions which the most samples of folded stack profiles were in, added up.
+
+    :param list file_names: full paths of ``.folded`` profiles.
+    :param int limit: number of functions listed.
+
+    :return: a table of the functions most often running themselves, ``self``, and
+        anywhere on the stack, ``total``, as percentages of all samples.
+    :rtype: str.
+    """
+    own = Counter()
+    total = Counter()
+    samples = 0
+
+    for file_name in file_names:
+        with open(file_name) as file:
+            for line in file:
+                stack, _, number = line.rstrip('\n').rpartition(' ')
+                if not stack: continue
+
+                number = int(number)
+                frames = stack.split(';')
+                samples += number
+                own[frames[-1]] += number
+                for frame in set(frames): total[frame] += number
+
+    if samples == 0: return ''
+
+    lines = [f'{samples} samples.', '', '  self%  total%  function']
+    for frame, number in own.most_common(limit):
+        lines.append(f'{100 * number / samples:7.1f} {100 * total[frame] / samples:7.1f}  {frame}')
+
+    lines += ['', ' total%  function']
+    for frame, number in total.most_common(limit):
+        lines.append(f'{100 * number / samples:7.1f}  {frame}')
+
+    return '\n'.join(lines) + '\n'
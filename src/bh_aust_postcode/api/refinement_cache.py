@@ -0,0 +1,149 @@
+"""
+Query refinement cache for keystroke by keystroke autocomplete.
+
+The jQuery plugin searches ``spr``, then ``spri``, then ``sprin`` and so on. Every
+locality which contains a text also contains any part of it, so the matches of
+``sprin`` are among the matches of ``spri``. :class:`RefinementCache` keeps the
+positions matched by recent search texts, and :meth:`RefinementCache.lookup` finds
+the longest cached text which starts or ends the new one. The pool then only checks
+those few candidates, rather than searching its whole locality index again.
+
+Entries are bounded by the memory their positions take, least recently used first
+out, and belong to a generation of the postcode pool as
+:class:`~src.bh_aust_postcode.utils.cache.LRUCache` entries do: positions are only
+meaningful for the postcodes they were matched against.
+
+Relevant test modules:
+
+    * ./tests/test_postcode_pool.py
+"""
+
+import sys
+import threading
+
+from array import array
+from collections import OrderedDict
+
+class RefinementCache(object):
+    """Positions of the keys matched by search texts, bounded by memory, tied to a
+    generation.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        :param int max_bytes: maximum memory taken by the cached texts and positions,
+            as measured by ``sys.getsizeof``. The least recently used entries are evicted
+            to make room for a new one. An entry larger than this is not cached.
+        """
+        self.__max_bytes = max_bytes
+        self.__entries = OrderedDict()
+        self.__bytes = 0
+        self.__generation = None
+        self.__lock = threading.Lock()
+
+        self.__hits = 0
+        self.__refinements = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__invalidations = 0
+
+    def __check_generation(self, generation: int) -> bool:
+        """Drop all entries if the generation is newer. Caller holds the lock.
+
+        :return: whether entries of ``generation`` can be used.
+        :rtype: bool.
+        """
+        if self.__generation != None and generation < self.__generation: return False
+
+        if generation != self.__generation:
+            if len(self.__entries) > 0: self.__invalidations += 1
+            self.__entries.clear()
+            self.__bytes = 0
+            self.__generation = generation
+
+        return True
+
+    def lookup(self, text: str, generation: int) -> tuple:
+        """Find the cached positions of a text or, failing that, of the longest cached
+        text it starts or ends with, and mark that entry most recently used.
+
+        :param str text: normalised search text.
+        :param int generation: the generation of the postcodes being searched.
+
+        :return: ascending positions and the text they were matched by. Both None when
+            nothing usable is cached. When that text is not ``text`` itself, the
+            positions are only candidates, which still have to be checked.
+        :rtype: tuple.
+        """
+        with self.__lock:
+            if not self.__check_generation(generation):
+                self.__misses += 1
+                return None, None
+
+            entries = self.__entries
+            for length in range(len(text), 0, -1):
+                for part in (text[:length], text[-length:]):
+                    positions = entries.get(part)
+                    if positions is None: continue
+
+                    entries.move_to_end(part)
+                    if length == len(text): self.__hits += 1
+                    else: self.__refinements += 1
+                    return positions, part
+
+            self.__misses += 1
+            return None, None
+
+    def put(self, text: str, positions, generation: int) -> None:
+        """Cache the positions matched by a text.
+
+        :param str text: normalised search text.
+        :param positions: ascending positions of the keys which contain ``text``. Any
+            iterable, stored as an unsigned integer array.
+        :param int generation: the generation ``positions`` were matched against.
+        """
+        positions = array('I', positions)
+        size = sys.getsizeof(text) + sys.getsizeof(positions)
+        if size > self.__max_bytes: return
+
+        with self.__lock:
+            if not self.__check_generation(generation): return
+
+            entries = self.__entries
+            previous = entries.pop(text, None)
+            if previous is not None: self.__bytes -= sys.getsizeof(text) + sys.getsizeof(previous)
+
+            entries[text] = positions
+            self.__bytes += size
+
+            while self.__bytes > self.__max_bytes:
+                evicted, evicted_positions = entries.popitem(last=False)
+                self.__bytes -= sys.getsizeof(evicted) + sys.getsizeof(evicted_positions)
+                self.__evictions += 1
+
+    def clear(self) -> None:
+        """Drop all entries. Counters are kept."""
+        with self.__lock:
+            self.__entries.clear()
+            self.__bytes = 0
+
+    def info(self) -> dict:
+        """Counters for monitoring.
+
+        :return: ``hits`` on the search text itself, ``refinements`` from a shorter
+            text, ``misses``, ``evictions``, ``invalidations``, ``size``, ``bytes``,
+            ``max_bytes`` and ``generation``.
+        :rtype: dict.
+        """
+        with self.__lock:
+            return {
+                'hits': self.__hits,
+                'refinements': self.__refinements,
+                'misses': self.__misses,
+                'evictions': self.__evictions,
+                'invalidations': self.__invalidations,
+                'size': len(self.__entries),
+                'bytes': self.__bytes,
+                'max_bytes': self.__max_bytes,
+                'generation': self.__generation,
+            }
@@ -0,0 +1,141 @@
+"""
+Pre-serialised JSON responses for /aust-postcode API endpoints.
+
+Hot responses are cached as ready-to-send bytes, so a repeated search costs neither
+a search nor a JSON serialisation. Every response carries a strong ETag derived from
+the dataset version and the request, and ``Cache-Control: no-cache``, so clients
+revalidate with ``If-None-Match`` and get a bodyless ``304 Not Modified`` when they
+already hold the response. A 304 is decided before any search takes place.
+
+Responses are negotiated and cached per content coding, see
+:mod:`~src.bh_aust_postcode.api.compression`: a cached response is already
+compressed, and the ETag tells representations apart.
+
+As with the dictionaries Flask-RESTX serialises, the HTTP status is always
+``200 OK``: the outcome of a search is in ``['status']['code']`` of the body.
+
+Relevant test modules:
+
+    * ./tests/test_api_endpoints.py
+"""
+
+import json
+import hashlib
+
+from http import HTTPStatus
+
+from flask import (
+    current_app as app,
+    request,
+    Response,
+)
+
+from src.bh_aust_postcode.api.search_backend import get_search_backend
+from src.bh_aust_postcode.api.compression import (
+    negotiate_encoding,
+    encode_body,
+    encoding_etag,
+    vary_accept_encoding,
+)
+from src.bh_aust_postcode.api.metrics import record_outcome
+from src.bh_aust_postcode.utils.cache import LRUCache
+
+JSON_MIMETYPE = 'application/json'
+
+#: Response bytes cache. Created on first use, see :func:`response_cache_info`.
+__response_cache = None
+
+def __get_response_cache() -> LRUCache:
+    """Get the response bytes cache, creating it from configuration on first use.
+
+    :return: the cache, or None when ``RESPONSE_CACHE_MAX_SIZE`` is 0.
+    :rtype: :class:`~src.bh_aust_postcode.utils.cache.LRUCache`.
+    """
+    global __response_cache
+
+    if __response_cache == None and app.config['RESPONSE_CACHE_MAX_SIZE'] > 0:
+        __response_cache = LRUCache(app.config['RESPONSE_CACHE_MAX_SIZE'],
+                                    app.config['SEARCH_CACHE_TTL'])
+
+    return __response_cache
+
+def make_etag(version: str, key: tuple) -> str:
+    """Strong entity tag of a response.
+
+    :param str version: the dataset version the response is computed from.
+    :param tuple key: everything else which determines the response, e.g. the
+        endpoint and the search text.
+
+    :return: unquoted entity tag.
+    :rtype: str.
+    """
+    digest = hashlib.sha1(version.encode('ascii'))
+    for part in key:
+        digest.update(b'\0' + str(part).encode('utf-8'))
+
+    return digest.hexdigest()
+
+def json_bytes(status: dict) -> bytes:
+    """Serialise a dictionary to compact JSON bytes.
+
+    :param dict status: usually dictionary representation of
+        `ResultStatus <https://bh-apistatus.readthedocs.io/en/latest/result-status.html>`_.
+
+    :return: UTF-8 encoded JSON, new line terminated.
+    :rtype: bytes.
+    """
+    return (json.dumps(status, separators=(',', ':')) + '\n').encode('utf-8')
+
+def __make_response(body: bytes, etag: str, status: HTTPStatus=HTTPStatus.OK,
+                    encoding: str=None) -> Response:
+    response = Response(body, status=status.value, mimetype=JSON_MIMETYPE)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    if encoding != None: response.headers['Content-Encoding'] = encoding
+
+    return vary_accept_encoding(response)
+
+def cached_response(key: tuple, compute) -> Response:
+    """Respond with pre-serialised JSON, honouring ``If-None-Match``.
+
+    :param tuple key: everything which determines the response other than the
+        dataset, e.g. the endpoint and the search text as spelt.
+    :param compute: function without arguments, which returns the dictionary to
+        respond with. Only called when the response is neither not modified, nor
+        cached.
+
+    :return: a ``304 Not Modified`` response, or a ``200 OK`` JSON response, 
+        compressed with the negotiated content coding. Both carry the ETag of that
+        representation.  The outcome of the search is recorded for metrics, see 
+        :func:`~src.bh_aust_postcode.api.metrics.record_outcome`.
+    :rtype: Response.
+    """
+    version, generation = get_search_backend().generation_info()
+    negotiated = negotiate_encoding()
+
+    etag = encoding_etag(make_etag(version, key), negotiated)
+    if request.if_none_match.contains_weak(etag):
+        return __make_response(b'', etag, HTTPStatus.NOT_MODIFIED)
+
+    cache = __get_response_cache()
+    cache_key = key + (negotiated,)
+
+    entry = cache.get(cache_key, generation) if cache != None else None
+    if entry == None:
+        status = compute()
+        entry = encode_body(json_bytes(status), negotiated) + (status['status']['code'],)
+        if cache != None: cache.put(cache_key, entry, generation)
+
+    body, encoding, code = entry
+    record_outcome(code)
+    return __make_response(body, etag, encoding=encoding)
+
+def response_cache_info() -> dict:
+    """Response bytes cache counters, for monitoring.
+
+    :return: see :meth:`~src.bh_aust_postcode.utils.cache.LRUCache.info`. An empty
+        dictionary when the cache is disabled via ``RESPONSE_CACHE_MAX_SIZE``.
+    :rtype: dict.
+    """
+    cache = __get_response_cache()
+    return cache.info() if cache != None else {}
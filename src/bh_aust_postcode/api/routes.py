@@ -6,15 +6,308 @@ Relevant test modules:
     * ./tests/test_bro.py
 """
 
+import json
+
 from http import HTTPStatus
 
-from flask_restx import Namespace, Resource
+from flask import Response, request, stream_with_context
+from flask_restx import Namespace, Resource, inputs, fields
+
+from bh_apistatus.result_status import make_status
+
+from src.bh_aust_postcode.api.bro import (
+    SEARCH_MODE_PARTIAL,
+    SEARCH_MODE_POSTCODE,
+    SEARCH_MODE_PREFIX,
+    SEARCH_MODE_FUZZY,
+    SEARCH_MODE_BUNDLE,
+    INFO_BUNDLE_VERSION_MSG,
+    search_by_locality,
+    search_by_locality_prefix,
+    count_by_locality,
+    stream_by_locality,
+    search_by_localities,
+    search_by_postcode,
+    search_by_locality_fuzzy,
+    authorize_admin,
+    reload_postcodes,
+    bundle_version,
+    postcode_bundle,
+    search_near,
+)
+from src.bh_aust_postcode.api.response_cache import (
+    JSON_MIMETYPE,
+    json_bytes,
+    cached_response,
+)
+from src.bh_aust_postcode.api.metrics import record_outcome
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+TOTAL_COUNT_HEADER = 'X-Total-Count'
 
-from src.bh_aust_postcode.api.bro import search_by_locality
+#: Versioned bundles never change: browsers and proxies may keep them for a year.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
 
 tree_ns = Namespace( name="postcodes", validate=True )
 
+search_parser = tree_ns.parser()
+search_parser.add_argument('offset', type=inputs.natural, default=0, location='args',
+                           help='Number of matched localities to skip.')
+search_parser.add_argument('limit', type=inputs.positive, location='args',
+                           help='Maximum number of matched localities to return. Default is all.')
+search_parser.add_argument('total', type=inputs.boolean, default=False, location='args',
+                           help=f'Whether to return the number of all matched localities in header {TOTAL_COUNT_HEADER}.')
+search_parser.add_argument('stream', type=inputs.boolean, default=False, location='args',
+                           help='Whether to stream matched localities as newline delimited JSON.')
+search_parser.add_argument('state', type=str, location='args',
+                           help='Only return localities in this state, e.g. vic.')
+
+fuzzy_parser = tree_ns.parser()
+fuzzy_parser.add_argument('distance', type=inputs.natural, location='args',
+                          help='Maximum number of typos, default and at most FUZZY_MAX_DISTANCE.')
+
+near_parser = tree_ns.parser()
+near_parser.add_argument('lat', type=float, location='args',
+                         help='Latitude of the point, in degrees, e.g. -37.95.')
+near_parser.add_argument('lon', type=float, location='args',
+                         help='Longitude of the point, in degrees, e.g. 145.15.')
+near_parser.add_argument('k', type=inputs.positive, location='args',
+                         help='Maximum number of localities, 10 by default, or SEARCH_MAX_PAGE_LIMIT with radius.')
+near_parser.add_argument('radius', type=float, location='args',
+                         help='Only return localities within this many kilometres.')
+
+batch_item = tree_ns.model('BatchItem', {
+    'locality': fields.String(required=True, description='The locality search text.'),
+    'state': fields.String(description='Only return localities in this state.'),
+})
+
+batch_request = tree_ns.model('BatchRequest', {
+    'localities': fields.List(fields.Nested(batch_item), required=True,
+                              description='Localities to search for.'),
+})
+
+@tree_ns.route('/batch')
+@tree_ns.response(int(HTTPStatus.BAD_REQUEST), 'Validation error.')
+@tree_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), 'Internal server error.')
+class PostcodeBatch(Resource):
+    """ Handles HTTP requests to URL: /postcodes/batch. """
+
+    @tree_ns.response(int(HTTPStatus.OK), 'One result per locality.')
+    @tree_ns.expect(batch_request)
+    def post(self):
+        """Search postcodes for many localities in one request.
+
+        Each locality is validated and searched the same way as the single search, \
+            optionally keeping only localities in ``state``.
+
+        Request body:
+
+            {
+                "localities": [
+                    { "locality": "springvale", "state": "vic" },
+                    { "locality": "xyz" }
+                ]
+            }
+
+        On successful, ``['data']['results']`` has one result per locality, in the same order, \
+            each has the same structure as the single search result:
+
+            {
+                "status": {
+                    "code": 200,
+                    "text": ""
+                },
+                "data": {
+                    "results": [
+                        {
+                            "status": { "code": 200, "text": "" },
+                            "data": { "localities": [ ... ] }
+                        },
+                        {
+                            "status": { "code": 404, "text": "No localities matched 'xyz'" }
+                        }
+                    ]
+                }
+            }
+        """
+
+        status = search_by_localities(tree_ns.payload['localities'])
+
+        return Response(json_bytes(status), mimetype=JSON_MIMETYPE)
+
+@tree_ns.route('/admin/reload')
+@tree_ns.response(int(HTTPStatus.UNAUTHORIZED), 'Missing or invalid admin token.')
+@tree_ns.response(int(HTTPStatus.FORBIDDEN), 'Admin endpoints are not enabled.')
+@tree_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), 'Reloading failed, previous postcodes kept.')
+class PostcodeReload(Resource):
+    """ Handles HTTP requests to URL: /postcodes/admin/reload. """
+
+    @tree_ns.response(int(HTTPStatus.OK), 'Postcodes reloaded.')
+    def post(self):
+        """Reload postcodes, without interrupting searches.
+
+        Requires header ``Authorization: Bearer <ADMIN_TOKEN>``. Unlike searches, the \
+            HTTP status is the same as ``['status']['code']``.
+
+        Postcodes and indexes are loaded off to the side, then replace the previous \
+            ones all at once. Searches already under way finish against the previous \
+            postcodes. Only the worker which serves this request reloads.
+
+        On successful:
+
+            {
+                "status": {
+                    "code": 200,
+                    "text": ""
+                },
+                "data": {
+                    "reload": {
+                        "generation": 2,
+                        "postcodes": 18495,
+                        "delta": -5,
+                        "seconds": 0.012
+                    }
+                }
+            }
+        """
+
+        status = authorize_admin(request.headers.get('Authorization'))
+        if status == None: status = reload_postcodes()
+
+        return Response(json_bytes(status), status=status['status']['code'], mimetype=JSON_MIMETYPE)
+
+def bundle_response(version: str=None) -> Response:
+    """Respond with the postcode bundle, see :func:`~.bro.postcode_bundle`.
+
+    :param str version: the version asked for, None for the current one.
+
+    :return: the bundle, through the response cache and revalidated with its ETag. 
+        The current bundle refers to its versioned URL in ``Content-Location``. Unlike 
+        searches, the HTTP status is the same as ``['status']['code']``: ``404 
+        Not Found`` when there is no bundle, or not of ``version``.
+    :rtype: Response.
+    """
+
+    current = bundle_version()
+    if current == None or (version != None and version != current):
+        status = (postcode_bundle() if current == None else 
+                  make_status(HTTPStatus.NOT_FOUND, INFO_BUNDLE_VERSION_MSG.format(version)).as_dict())
+        return Response(json_bytes(status), status=status['status']['code'], mimetype=JSON_MIMETYPE)
+
+    response = cached_response((SEARCH_MODE_BUNDLE,), postcode_bundle)
+    if version == None: response.headers['Content-Location'] = f'bundle/{current}.json'
+    else: response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+
+    return response
+
+@tree_ns.route('/bundle.json')
+@tree_ns.response(int(HTTPStatus.NOT_MODIFIED), 'Not modified since the ETag in If-None-Match.')
+@tree_ns.response(int(HTTPStatus.NOT_FOUND), 'No bundle: the search backend is not memory.')
+class PostcodeBundle(Resource):
+    """ Handles HTTP requests to URL: /postcodes/bundle.json. """
+
+    @tree_ns.response(int(HTTPStatus.OK), 'All postcodes, compactly.')
+    def get(self):
+        """All postcodes in a compact bundle, for clients to search on their own.
+
+        Localities and states are listed once each, every postcode refers to them by \
+            index, in the same order searches return postcodes in:
+
+            {
+                "status": {
+                    "code": 200,
+                    "text": ""
+                },
+                "data": {
+                    "bundle": {
+                        "format": 1,
+                        "version": "5f0c...",
+                        "count": 18495,
+                        "localities": ["AARONS PASS", ...],
+                        "states": ["NSW", ...],
+                        "postcodes": [[0, 0, "2850"], ...]
+                    }
+                }
+            }
+
+        The ETag changes with the postcodes, revalidate with ``If-None-Match``. Header \
+            ``Content-Location`` has the versioned URL of the same bundle, which can be \
+            cached for good.
+
+        Only served from the ``memory`` search backend. Unlike searches, the HTTP \
+            status is the same as ``['status']['code']``.
+        """
+
+        return bundle_response()
+
+@tree_ns.route('/bundle/<version>.json')
+@tree_ns.response(int(HTTPStatus.NOT_MODIFIED), 'Not modified since the ETag in If-None-Match.')
+@tree_ns.response(int(HTTPStatus.NOT_FOUND), 'No bundle of this version.')
+@tree_ns.param('version', 'The bundle version, ``data.bundle.version`` of bundle.json')
+class PostcodeBundleVersion(Resource):
+    """ Handles HTTP requests to URL: /postcodes/bundle/<version>.json. """
+
+    @tree_ns.response(int(HTTPStatus.OK), 'All postcodes, compactly.')
+    def get(self, version):
+        """The postcode bundle of a version, cacheable for good.
+
+        The same as ``bundle.json``, only while ``version`` is current. Otherwise \
+            ``404 Not Found``: fetch ``bundle.json`` again.
+        """
+
+        return bundle_response(version)
+
+@tree_ns.route('/near')
+@tree_ns.response(int(HTTPStatus.BAD_REQUEST), 'Validation error, or postcodes have no coordinates.')
+@tree_ns.response(int(HTTPStatus.NOT_FOUND), 'No localities within radius.')
+@tree_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), 'Internal server error.')
+class PostcodeNear(Resource):
+    """ Handles HTTP requests to URL: /postcodes/near. """
+
+    @tree_ns.response(int(HTTPStatus.OK), 'Localities nearest to the point, nearest first.')
+    @tree_ns.expect(near_parser)
+    def get(self):
+        """Search the localities nearest to a point.
+
+        Returns the ``k`` nearest localities to ``lat`` and ``lon``, only those within \
+            ``radius`` kilometres when given, nearest first. Each locality also has its \
+            ``latitude`` and ``longitude``, and its ``distance`` in kilometres.
+
+        On successful, e.g. ``?lat=-37.95&lon=145.15&k=2``:
+
+            {
+                "status": {
+                    "code": 200,
+                    "text": ""
+                },
+                "data": {
+                    "localities": [
+                        {
+                            "locality": "SPRINGVALE",
+                            "state": "VIC",
+                            "postcode": "3171",
+                            "latitude": -37.949,
+                            "longitude": 145.152,
+                            "distance": 0.412
+                        },
+                        ...
+                    ]
+                }
+            }
+
+        Only the ``memory`` search backend can search by distance. Without ``lat`` or \
+            ``lon``, the status code is 400: ``/near`` is never the partial search for \
+            localities which contain ``near``, which ``/NEAR`` is.
+        """
+
+        args = near_parser.parse_args()
+        status = search_near(args['lat'], args['lon'], args['k'], args['radius'])
+        record_outcome(status['status']['code'])
+
+        return Response(json_bytes(status), mimetype=JSON_MIMETYPE)
+
 @tree_ns.route('/<locality>')
+@tree_ns.response(int(HTTPStatus.NOT_MODIFIED), 'Not modified since the ETag in If-None-Match.')
 @tree_ns.response(int(HTTPStatus.BAD_REQUEST), 'Validation error.')
 @tree_ns.response(int(HTTPStatus.NOT_FOUND), 'No matching localities.')
 @tree_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), 'Internal server error.')
@@ -23,6 +316,7 @@ class Postcode(Resource):
     """ Handles HTTP requests to URL: /postcodes. """
 
     @tree_ns.response(int(HTTPStatus.OK), 'Matched localities.')
+    @tree_ns.expect(search_parser)
     def get(self, locality):
         """Search postcodes based on locality. 
 
@@ -82,6 +376,159 @@ class Postcode(Resource):
         In general ``['status']['code']`` other than ``HTTPStatus.OK.value`` signifies search does \
             not return any localities. Always check for ``['status']['code']`` of ``HTTPStatus.OK.value`` \
             before proceeding any further with the result.
+
+        Responses carry an ETag. Send it back in ``If-None-Match`` to get ``304 Not Modified`` \
+            while the result has not changed.
+
+        Use ``state`` to only return localities in that state, e.g. ``?state=vic``.
+
+        Use ``offset`` and ``limit`` to page through matched localities, and ``total=true`` to \
+            get the number of all matched localities in header ``X-Total-Count``.
+
+        With ``stream=true``, matched localities are streamed as they are found, one JSON \
+            object per line ( ``application/x-ndjson`` ). When nothing matches, or the search \
+            is invalid, the only line is the dictionary above instead.
         """
+
+        args = search_parser.parse_args()
+        offset, limit, state = args['offset'], args['limit'], args['state']
+
+        if args['stream']:
+            items = stream_by_locality(locality, offset, limit, state)
+            lines = (json.dumps(item) + '\n' for item in items)
+            return Response(stream_with_context(lines), mimetype=NDJSON_MIMETYPE)
         
-        return search_by_locality(locality)
\ No newline at end of file
+        response = cached_response((SEARCH_MODE_PARTIAL, locality, offset, limit, state), 
+                                   lambda: search_by_locality(locality, offset, limit, state))
+
+        if args['total'] and response.status_code == HTTPStatus.OK.value:
+            response.headers[TOTAL_COUNT_HEADER] = str(count_by_locality(locality, state))
+
+        return response
+
+@tree_ns.route('/prefix/<locality>')
+@tree_ns.response(int(HTTPStatus.NOT_MODIFIED), 'Not modified since the ETag in If-None-Match.')
+@tree_ns.response(int(HTTPStatus.BAD_REQUEST), 'Validation error.')
+@tree_ns.response(int(HTTPStatus.NOT_FOUND), 'No matching localities.')
+@tree_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), 'Internal server error.')
+@tree_ns.param('locality', 'The start of the locality search text')
+class PostcodePrefix(Resource):
+    """ Handles HTTP requests to URL: /postcodes/prefix. """
+
+    @tree_ns.response(int(HTTPStatus.OK), 'Matched localities.')
+    def get(self, locality):
+        """Search postcodes whose locality starts with the search text.
+
+        Validation and the returned dictionary are the same as the partial search.
+
+        On successful:
+
+            {
+                "status": {
+                    "code": 200,
+                    "text": ""
+                },
+                "data": {
+                    "localities": [
+                        {
+                            "locality": "SPRINGVALE",
+                            "state": "VIC",
+                            "postcode": "3171"
+                        },
+                        ...
+                    ]
+                }
+            }
+        """
+        
+        return cached_response((SEARCH_MODE_PREFIX, locality), 
+                               lambda: search_by_locality_prefix(locality))
+
+@tree_ns.route('/by-postcode/<postcode>')
+@tree_ns.response(int(HTTPStatus.NOT_MODIFIED), 'Not modified since the ETag in If-None-Match.')
+@tree_ns.response(int(HTTPStatus.BAD_REQUEST), 'Validation error.')
+@tree_ns.response(int(HTTPStatus.NOT_FOUND), 'No localities have the postcode.')
+@tree_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), 'Internal server error.')
+@tree_ns.param('postcode', 'The postcode, 4 digits')
+class PostcodeLocalities(Resource):
+    """ Handles HTTP requests to URL: /postcodes/by-postcode. """
+
+    @tree_ns.response(int(HTTPStatus.OK), 'Localities which have the postcode.')
+    def get(self, postcode):
+        """Search localities which have a postcode.
+
+        The returned dictionary is the same as the partial search.
+
+        On successful:
+
+            {
+                "status": {
+                    "code": 200,
+                    "text": ""
+                },
+                "data": {
+                    "localities": [
+                        {
+                            "locality": "SPRINGVALE",
+                            "state": "VIC",
+                            "postcode": "3171"
+                        },
+                        ...
+                    ]
+                }
+            }
+
+        Invalid searches:
+
+            {
+                "status": {
+                    "code": 400,
+                    "text": "'317' is invalid. Postcode must be 4 digits."
+                }
+            }
+        """
+        
+        return cached_response((SEARCH_MODE_POSTCODE, postcode), 
+                               lambda: search_by_postcode(postcode))
+
+@tree_ns.route('/fuzzy/<locality>')
+@tree_ns.response(int(HTTPStatus.NOT_MODIFIED), 'Not modified since the ETag in If-None-Match.')
+@tree_ns.response(int(HTTPStatus.BAD_REQUEST), 'Validation error.')
+@tree_ns.response(int(HTTPStatus.NOT_FOUND), 'No matching localities.')
+@tree_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), 'Internal server error.')
+@tree_ns.param('locality', 'The whole locality, possibly misspelt')
+class PostcodeFuzzy(Resource):
+    """ Handles HTTP requests to URL: /postcodes/fuzzy. """
+
+    @tree_ns.response(int(HTTPStatus.OK), 'Matched localities, nearest first.')
+    @tree_ns.expect(fuzzy_parser)
+    def get(self, locality):
+        """Search postcodes whose locality is within a few typos of the search text.
+
+        Validation and the returned dictionary are the same as the partial search. \
+            Matched localities are ranked by the number of typos, fewest first.
+
+        On successful, e.g. ``springvail``:
+
+            {
+                "status": {
+                    "code": 200,
+                    "text": ""
+                },
+                "data": {
+                    "localities": [
+                        {
+                            "locality": "SPRINGVALE",
+                            "state": "VIC",
+                            "postcode": "3171"
+                        },
+                        ...
+                    ]
+                }
+            }
+        """
+
+        distance = fuzzy_parser.parse_args()['distance']
+
+        return cached_response((SEARCH_MODE_FUZZY, locality, distance), 
+                               lambda: search_by_locality_fuzzy(locality, distance))
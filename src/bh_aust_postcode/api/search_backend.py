@@ -0,0 +1,203 @@
+"""
+Interface of the postcode stores which business rules search, and selection of the
+one to use via configuration ``SEARCH_BACKEND``:
+
+    * ``memory``: :class:`~src.bh_aust_postcode.api.postcode_pool.PostcodePool`, all
+      postcodes and their indexes held in every worker. Fastest.
+    * ``postgres``: :class:`~src.bh_aust_postcode.api.postgres_backend.PostgresBackend`,
+      each search is a query, accelerated by a ``pg_trgm`` GIN index when the
+      extension is available. Next to no memory per worker.
+    * ``sqlite``: :class:`~src.bh_aust_postcode.api.sqlite_backend.SqliteBackend`,
+      each search is a query of the embedded SQLite database ``update-postcode``
+      writes to the instance folder. No PostgreSQL needed to serve.
+
+Relevant test modules:
+
+    * ./tests/test_search_backend.py
+"""
+
+from abc import ABC, abstractmethod
+
+from flask import current_app as app
+
+class SearchBackend(ABC):
+    """Postcodes and searches over them.
+
+    Every search returns postcode dictionaries with the text fields ``locality``,
+    ``state`` and ``postcode``, in the same order as the database's
+    ``ORDER BY locality, state, postcode``, whichever the backend. Backends must 
+    implement the abstract methods, the others have defaults.
+    """
+
+    #: Configuration ``SEARCH_BACKEND`` value which selects the backend.
+    name = None
+
+    @abstractmethod
+    def load(self, force_reload: bool=False) -> tuple:
+        """Get ready to search, or pick up changed postcodes when forced.
+
+        :param bool force_reload: load again even if already loaded.
+
+        :return: a Boolean result and a possible error message.
+        :rtype: tuple.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def generation_info(self) -> tuple:
+        """The content digest of the postcodes, the same in every process and backend
+        which serve the same postcodes, and the generation number, incremented every
+        time postcodes are (re)loaded. Both read together, from the same load.
+
+        :rtype: tuple.
+        """
+        raise NotImplementedError
+
+    @property
+    def generation(self) -> int:
+        """Read only property. See :meth:`generation_info`."""
+        return self.generation_info()[1]
+
+    @property
+    @abstractmethod
+    def count(self) -> int:
+        """Read only property. Total number of postcodes."""
+        raise NotImplementedError
+
+    @property
+    @abstractmethod
+    def load_seconds(self) -> float:
+        """Read only property. Seconds the last successful :meth:`load` took to get 
+        postcodes and their indexes ready. None before the first.
+        """
+        raise NotImplementedError
+
+    @property
+    def fuzzy_max_distance(self) -> int:
+        """Read only property. Greatest edit distance :meth:`search_fuzzy` supports.
+        0 when fuzzy search is not available.
+        """
+        return 0
+
+    @property
+    def has_coordinates(self) -> bool:
+        """Read only property. Whether :meth:`search_near` is available, i.e. postcodes
+        have coordinates and a spatial index over them.
+        """
+        return False
+
+    @abstractmethod
+    def search(self, locality: str, offset: int=0, limit: int=None, state: str=None) -> list:
+        """Match postcodes whose locality / suburb contains a text, case insensitive.
+
+        :param str locality: the partial locality / suburb.
+        :param int offset: number of matching postcodes to skip.
+        :param int limit: maximum number of matching postcodes to return. None for all.
+        :param str state: only match postcodes in this state, case insensitive. None for
+            all states.
+
+        :rtype: list.
+        """
+        raise NotImplementedError
+
+    def iter_search(self, locality: str, offset: int=0, limit: int=None, state: str=None):
+        """Lazily match postcodes, see :meth:`search`.
+
+        :return: a generator of matching postcodes.
+        """
+        return iter(self.search(locality, offset, limit, state))
+
+    def search_many(self, queries: list) -> list:
+        """Match postcodes for many locality / suburb texts at once, see :meth:`search`.
+        Backends which can resolve them together override this, by default each is
+        searched in turn.
+
+        :param list queries: ``(locality, state)`` tuples, ``state`` None for all states.
+
+        :return: for each query, in the same order, the list :meth:`search` returns.
+        :rtype: list.
+        """
+        return [self.search(locality, state=state) for locality, state in queries]
+
+    @abstractmethod
+    def count_matches(self, locality: str, state: str=None) -> int:
+        """Count postcodes :meth:`search` matches.
+
+        :rtype: int.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def search_prefix(self, locality: str) -> list:
+        """Match postcodes whose locality / suburb starts with a text, case insensitive.
+
+        :rtype: list.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def search_postcode(self, postcode: str) -> list:
+        """Match postcodes exactly, i.e. localities / suburbs which have a postcode.
+
+        :rtype: list.
+        """
+        raise NotImplementedError
+
+    def search_fuzzy(self, locality: str, max_distance: int=None) -> list:
+        """Match postcodes whose locality / suburb is within an edit distance of a text,
+        nearest first. Only when :attr:`fuzzy_max_distance` is above 0.
+
+        :rtype: list.
+        """
+        return []
+
+    def search_near(self, latitude: float, longitude: float, k: int=None, 
+                    radius: float=None) -> list:
+        """Match the postcodes nearest to a point, nearest first. Only when 
+        :attr:`has_coordinates` is True.
+
+        :param float latitude: latitude of the point, in degrees.
+        :param float longitude: longitude of the point, in degrees.
+        :param int k: the greatest number of postcodes to match. None for all within 
+            ``radius``.
+        :param float radius: only match postcodes within this many kilometres. None for 
+            the ``k`` nearest, however far.
+
+        :return: postcode dictionaries which also have ``latitude``, ``longitude`` and 
+            ``distance``, in kilometres.
+        :rtype: list.
+        """
+        return []
+
+def get_search_backend() -> SearchBackend:
+    """The search backend selected by configuration ``SEARCH_BACKEND``.
+
+    :return: the backend's singleton instance.
+    :rtype: :class:`SearchBackend`.
+
+    :raises ValueError: ``SEARCH_BACKEND`` names no backend.
+    """
+    name = app.config['SEARCH_BACKEND']
+
+    # Imported here: the backends themselves import this module.
+    if name == 'memory':
+        from src.bh_aust_postcode.api.postcode_pool import postcode_pool
+        return postcode_pool
+
+    if name == 'postgres':
+        from src.bh_aust_postcode.api.postgres_backend import postgres_backend
+        return postgres_backend
+
+    if name == 'sqlite':
+        from src.bh_aust_postcode.api.sqlite_backend import sqlite_backend
+        return sqlite_backend
+
+    raise ValueError(f'Unknown SEARCH_BACKEND {name!r}, expected memory, postgres or sqlite.')
+
+def load_search_backend() -> tuple:
+    """Get the configured search backend ready, on start up.
+
+    :return: a Boolean result and a possible error message, see :meth:`SearchBackend.load`.
+    :rtype: tuple.
+    """
+    return get_search_backend().load()
@@ -0,0 +1,313 @@
+"""
+Embedded SQLite database of postcodes, for deployments without PostgreSQL.
+
+The ``update-postcode`` command writes all postcodes to a single SQLite file in the
+application instance folder, with an FTS5 ``trigram`` index over the uppercased
+locality. The file is then enough to serve searches, either:
+
+    * through :class:`SqliteBackend`, configuration ``SEARCH_BACKEND`` ``sqlite``,
+      which queries the file directly. Opening it costs next to nothing, and the
+      operating system's page cache is shared by every worker.
+    * through :class:`~src.bh_aust_postcode.api.postcode_pool.PostcodePool`, which
+      loads postcodes from the file instead of PostgreSQL when there is no usable
+      snapshot.
+
+File layout::
+
+    postcode     : id, in pool order, locality, state, postcode, locality_key,
+                   the uppercased locality, indexed for prefix searches, and
+                   latitude and longitude, NULL when unknown.
+    locality_fts : FTS5 trigram index over postcode.locality_key.
+    metadata     : name / value pairs, ``version`` is the dataset version.
+
+Relevant test modules:
+
+    * ./tests/test_search_backend.py
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from array import array
+
+from flask import current_app as app
+
+from src.bh_aust_postcode.api.search_backend import SearchBackend
+from src.bh_aust_postcode.api.compact_postcodes import coordinate_rows
+from src.bh_aust_postcode.api.postcode_snapshot import dataset_version
+
+#: Bump whenever the layout changes: older files are then refused. Held in ``PRAGMA user_version``.
+FORMAT_VERSION = 2
+
+#: FTS5 trigram queries only match texts of at least this many characters.
+TRIGRAM_LENGTH = 3
+
+SCHEMA = '''
+CREATE TABLE postcode (
+    id INTEGER PRIMARY KEY,
+    locality TEXT NOT NULL,
+    state TEXT NOT NULL,
+    postcode TEXT NOT NULL,
+    locality_key TEXT NOT NULL,
+    latitude REAL,
+    longitude REAL
+);
+CREATE INDEX postcode_locality_key ON postcode (locality_key);
+CREATE INDEX postcode_postcode ON postcode (postcode);
+CREATE VIRTUAL TABLE locality_fts USING fts5(
+    locality_key, content='postcode', content_rowid='id', tokenize='trigram case_sensitive 1'
+);
+CREATE TABLE metadata (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+
+SELECT_POSTCODES = 'SELECT p.locality, p.state, p.postcode FROM postcode p '
+
+class SqliteError(ValueError):
+    """A SQLite postcode database is invalid, and must not be used."""
+
+def sqlite_filename() -> str:
+    """Get the full path of the SQLite postcode database.
+
+    :return: full path of the database file, or None if it is not configured.
+    :rtype: str.
+    """
+    file_name = app.config['SQLITE_DATABASE_FILE']
+
+    return os.path.join(app.instance_path, '', file_name) if file_name else None
+
+def __coordinates(coordinates: array, pos: int) -> tuple:
+    """Latitude and longitude of a postcode, None for unknown, which SQLite stores as NULL.
+    """
+    if coordinates == None: return None, None
+
+    latitude, longitude = coordinates[2 * pos], coordinates[2 * pos + 1]
+    # NaN is the only value not equal to itself.
+    if latitude != latitude or longitude != longitude: return None, None
+
+    return latitude, longitude
+
+def write_sqlite(file_name: str, postcodes, coordinates: array=None) -> int:
+    """Write postcodes and their trigram index to a new SQLite database.
+
+    The database is built next to the target, then renamed over it, so that readers
+    only ever open a complete file.
+
+    :param str file_name: full path of the database file.
+    :param postcodes: postcode dictionaries in pool order. A list or
+        :class:`~src.bh_aust_postcode.api.compact_postcodes.CompactPostcodes`.
+    :param array coordinates: latitude and longitude of each postcode, back to back,
+        NaN when unknown. None when all are unknown.
+
+    :return: size of the written file in bytes.
+    :rtype: int.
+    """
+    temp_name = f'{file_name}.{os.getpid()}.tmp'
+    if os.path.exists(temp_name): os.remove(temp_name)
+
+    connection = sqlite3.connect(temp_name)
+    try:
+        connection.executescript(SCHEMA)
+        connection.executemany('INSERT INTO postcode (locality, state, postcode, locality_key, '
+                               'latitude, longitude) VALUES (?, ?, ?, ?, ?, ?)',
+                               ((pc['locality'], pc['state'], pc['postcode'], pc['locality'].upper())
+                                + __coordinates(coordinates, pos) for pos, pc in enumerate(postcodes)))
+        connection.execute("INSERT INTO locality_fts (locality_fts) VALUES ('rebuild')")
+        connection.executemany('INSERT INTO metadata (name, value) VALUES (?, ?)',
+                               [('version', dataset_version(postcodes)), ('created', str(time.time()))])
+        connection.execute(f'PRAGMA user_version = {FORMAT_VERSION}')
+        connection.commit()
+        connection.execute('VACUUM')
+    finally:
+        connection.close()
+
+    os.replace(temp_name, file_name)
+    return os.path.getsize(file_name)
+
+def open_sqlite(file_name: str) -> sqlite3.Connection:
+    """Open a SQLite postcode database read only, and check its format.
+
+    :param str file_name: full path of the database file.
+
+    :return: the connection.
+    :rtype: sqlite3.Connection.
+
+    :raises SqliteError: the file is missing, not a SQLite database or of another format.
+    """
+    if not os.path.isfile(file_name): raise SqliteError(f'{file_name!r} does not exist.')
+
+    try:
+        connection = sqlite3.connect(f'file:{file_name}?mode=ro', uri=True, check_same_thread=False)
+        format_version = connection.execute('PRAGMA user_version').fetchone()[0]
+    except sqlite3.Error as error:
+        raise SqliteError(f'{file_name!r} is not a SQLite database: {error}')
+
+    if format_version != FORMAT_VERSION:
+        connection.close()
+        raise SqliteError(f'{file_name!r} has format {format_version}, expected {FORMAT_VERSION}.')
+
+    return connection
+
+def read_sqlite(file_name: str) -> tuple:
+    """Read all postcodes of a SQLite postcode database, in pool order.
+
+    :param str file_name: full path of the database file.
+
+    :return: a list of (locality, state, postcode) tuples, the dataset version, and a 
+        float array of the latitude and longitude of each postcode, back to back, NaN
+        when unknown.
+    :rtype: tuple.
+
+    :raises SqliteError: see :func:`open_sqlite`.
+    """
+    connection = open_sqlite(file_name)
+    try:
+        coordinates = array('d')
+        rows = list(coordinate_rows(connection.execute('SELECT locality, state, postcode, latitude, '
+                                                       'longitude FROM postcode ORDER BY id'), 
+                                    coordinates))
+        version = connection.execute("SELECT value FROM metadata WHERE name = 'version'").fetchone()[0]
+    finally:
+        connection.close()
+
+    return rows, version, coordinates
+
+def fts_phrase(text: str) -> str:
+    """Quote a search text as an FTS5 phrase, which the trigram tokenizer matches
+    as a substring.
+
+    :param str text: the search text.
+
+    :return: the text in double quotes, inner double quotes doubled.
+    :rtype: str.
+    """
+    return '"' + text.replace('"', '""') + '"'
+
+class SqliteBackend(SearchBackend):
+    """The ``sqlite`` :class:`~src.bh_aust_postcode.api.search_backend.SearchBackend`.
+
+    Each thread queries over its own read only connection. :meth:`load` does no
+    more than check the file and read its metadata. A reload starts a new
+    generation, connections of the previous one are replaced on their next use, so
+    a file replaced by ``update-postcode`` is picked up.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self):
+        self.__file_name = None
+        self.__info = ('', 0)
+        self.__count = 0
+        self.__seconds = None
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+
+    def __connection(self) -> sqlite3.Connection:
+        """This thread's connection, of the current generation."""
+        generation = self.__info[1]
+        local = self.__local
+        if getattr(local, 'generation', None) != generation:
+            if getattr(local, 'connection', None) != None: local.connection.close()
+            local.connection = open_sqlite(self.__file_name)
+            local.generation = generation
+
+        return local.connection
+
+    def __query(self, sql: str, params: tuple) -> list:
+        rows = self.__connection().execute(sql, params).fetchall()
+        return [{'locality': row[0], 'state': row[1], 'postcode': row[2]} for row in rows]
+
+    def __partial_condition(self, locality: str, state: str) -> tuple:
+        """``FROM`` and ``WHERE`` clauses and parameters of a partial search. Texts too
+        short for the trigram index are scanned for instead.
+        """
+        key = locality.upper()
+        if len(key) >= TRIGRAM_LENGTH:
+            sql = 'JOIN locality_fts f ON f.rowid = p.id WHERE locality_fts MATCH ?'
+            params = (fts_phrase(key),)
+        else:
+            sql = 'WHERE instr(p.locality_key, ?) > 0'
+            params = (key,)
+
+        if state != None:
+            sql += ' AND p.state = ?'
+            params += (state.upper(),)
+
+        return sql, params
+
+    def load(self, force_reload: bool=False) -> tuple:
+        """Check the configured SQLite database, and read its number of postcodes and
+        dataset version.
+
+        :param bool force_reload: check again, and start a new generation, even if
+            already loaded.
+
+        :return: a Boolean result and a possible error message.
+        :rtype: tuple.
+        """
+        with self.__lock:
+            version, generation = self.__info
+            if not force_reload and generation > 0: return True, ''
+
+            file_name = sqlite_filename()
+            if file_name == None: return False, 'SQLITE_DATABASE_FILE is not configured.'
+
+            started = time.perf_counter()
+            try:
+                connection = open_sqlite(file_name)
+                try:
+                    count = connection.execute('SELECT count(*) FROM postcode').fetchone()[0]
+                    version = connection.execute("SELECT value FROM metadata "
+                                                 "WHERE name = 'version'").fetchone()[0]
+                finally:
+                    connection.close()
+            except (SqliteError, sqlite3.Error) as error:
+                return False, str(error)
+
+            self.__file_name = file_name
+            self.__count = count
+            self.__seconds = round(time.perf_counter() - started, 3)
+            self.__info = (version, generation + 1)
+
+        return True, ''
+
+    def generation_info(self) -> tuple:
+        return self.__info
+
+    @property
+    def load_seconds(self) -> float:
+        """Read only property. Seconds the last successful :meth:`load` took."""
+        return self.__seconds
+
+    @property
+    def count(self) -> int:
+        """Read only property. Number of postcodes as of the last :meth:`load`."""
+        return self.__count
+
+    def search(self, locality: str, offset: int=0, limit: int=None, state: str=None) -> list:
+        condition, params = self.__partial_condition(locality, state)
+
+        return self.__query(SELECT_POSTCODES + condition + ' ORDER BY p.id LIMIT ? OFFSET ?',
+                            params + (-1 if limit == None else limit, offset))
+
+    def count_matches(self, locality: str, state: str=None) -> int:
+        condition, params = self.__partial_condition(locality, state)
+
+        return self.__connection().execute('SELECT count(*) FROM postcode p ' + condition,
+                                           params).fetchone()[0]
+
+    def search_prefix(self, locality: str) -> list:
+        # Every key which starts with the text sorts from the text up to the text
+        # followed by the greatest character.
+        key = locality.upper()
+        return self.__query(SELECT_POSTCODES + 'WHERE p.locality_key >= ? AND p.locality_key < ? '
+                            'ORDER BY p.id', (key, key + '\U0010FFFF'))
+
+    def search_postcode(self, postcode: str) -> list:
+        return self.__query(SELECT_POSTCODES + 'WHERE p.postcode = ? ORDER BY p.id', (postcode,))
+
+sqlite_backend = SqliteBackend()
@@ -0,0 +1,184 @@
+"""
+Warm-up of the search backend on start up, and its state for the readiness probe.
+
+With configuration ``WARM_UP_IN_BACKGROUND`` False, :meth:`WarmUp.start` loads the
+configured search backend before it returns, so a worker only starts serving once
+postcodes are loaded, or have failed to. With True, it returns at once and a daemon
+thread loads them: the worker serves ``/health/live`` straight away, and
+``/health/ready`` only succeeds once postcodes are loaded. A failed load, e.g.
+PostgreSQL not yet accepting connections, is tried again every
+``WARM_UP_RETRY_INTERVAL`` seconds.
+
+Gunicorn's ``--preload`` loads the application once, then forks the workers. A fork
+waits for a load under way to finish, so that workers never inherit a half loaded
+backend or a held lock. A worker forked before postcodes are loaded warms up on its
+own.
+
+Relevant test modules:
+
+    * ./tests/test_health.py
+"""
+
+import os
+import logging
+import threading
+import time
+
+from src.bh_aust_postcode.utils import print_log
+from src.bh_aust_postcode.api.search_backend import load_search_backend
+from src.bh_aust_postcode.api.generation_stamp import (
+    generation_watcher,
+    stamp_filename,
+    read_stamp,
+)
+
+logger = logging.getLogger('admin')
+
+#: Warm-up states, see :meth:`WarmUp.info`.
+WARM_UP_PENDING = 'pending'
+WARM_UP_LOADING = 'loading'
+WARM_UP_RETRYING = 'retrying'
+WARM_UP_DONE = 'done'
+WARM_UP_FAILED = 'failed'
+
+class WarmUp(object):
+    """Loads the search backend of an application, in the foreground or in a background
+    thread, and keeps track of how that went.
+    """
+
+    def __init__(self):
+        self.__app = None
+        self.__background = False
+        self.__thread = None
+        #: Held for the duration of each load, which forks wait for.
+        self.__loading = threading.Lock()
+
+        self.__state = WARM_UP_PENDING
+        self.__attempts = 0
+        self.__error = ''
+        self.__seconds = None
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(before=self.__before_fork, after_in_parent=self.__after_fork_in_parent,
+                                after_in_child=self.__after_fork_in_child)
+
+    def __attempt(self) -> bool:
+        """Load the search backend once, recording the outcome.
+
+        :return: whether postcodes were loaded.
+        :rtype: bool.
+        """
+        with self.__loading:
+            self.__state = WARM_UP_LOADING
+            self.__attempts += 1
+            started = time.perf_counter()
+
+            with self.__app.app_context():
+                # Read first: a stamp written while loading reloads again.
+                stamp = read_stamp(stamp_filename())
+                try:
+                    result, message = load_search_backend()
+                except Exception as error:
+                    result, message = False, str(error)
+                    logger.exception(message)
+
+                if result: generation_watcher.loaded(stamp)
+
+            self.__seconds = round(time.perf_counter() - started, 3)
+            self.__error = message
+            self.__state = WARM_UP_DONE if result else WARM_UP_FAILED
+
+        if result:
+            print_log(logger, f'Warmed up in {self.__seconds:.3f} seconds, '
+                              f'attempt {self.__attempts}.', 'info')
+        else:
+            print_log(logger, f'Warm-up attempt {self.__attempts} failed: {message}', 'warning')
+
+        return result
+
+    def __run(self) -> None:
+        """Body of the background thread: load until loaded, retrying at intervals."""
+        while not self.__attempt():
+            interval = self.__app.config['WARM_UP_RETRY_INTERVAL']
+            if interval <= 0: return
+
+            self.__state = WARM_UP_RETRYING
+            time.sleep(interval)
+
+    def __start_thread(self) -> None:
+        self.__thread = threading.Thread(target=self.__run, name='warm-up', daemon=True)
+        self.__thread.start()
+
+    def start(self, app: object, background: bool=None) -> bool:
+        """Load the application's search backend.
+
+        :param object app: the Flask application.
+        :param bool background: whether to load in a background thread. None for
+            configuration ``WARM_UP_IN_BACKGROUND``.
+
+        :return: whether postcodes were loaded. Always False in the background, see
+            :meth:`wait` and :meth:`info`.
+        :rtype: bool.
+        """
+        if self.__thread != None and self.__thread.is_alive():
+            logger.info('Already warming up.')
+            return False
+
+        if background == None: background = app.config['WARM_UP_IN_BACKGROUND']
+
+        self.__app = app
+        self.__background = bool(background)
+        self.__state = WARM_UP_PENDING
+        self.__attempts = 0
+        self.__error = ''
+        self.__seconds = None
+
+        if not self.__background: return self.__attempt()
+
+        self.__start_thread()
+        return False
+
+    def wait(self, timeout: float=None) -> bool:
+        """Wait for a background warm-up to finish, retries included.
+
+        :param float timeout: seconds to wait at most. None to wait for as long as it takes.
+
+        :return: whether postcodes were loaded.
+        :rtype: bool.
+        """
+        if self.__thread != None: self.__thread.join(timeout)
+
+        return self.__state == WARM_UP_DONE
+
+    def info(self) -> dict:
+        """The state of the warm-up, for monitoring.
+
+        :return: ``state``, one of ``pending``, ``loading``, ``retrying``, ``done`` or
+            ``failed``, whether it runs in the ``background``, the number of
+            ``attempts``, the ``error`` of the last failed one, and the ``seconds`` the
+            last one took, None before the first has finished.
+        :rtype: dict.
+        """
+        return {
+            'state': self.__state,
+            'background': self.__background,
+            'attempts': self.__attempts,
+            'error': self.__error,
+            'seconds': self.__seconds,
+        }
+
+    def __before_fork(self) -> None:
+        self.__loading.acquire()
+
+    def __after_fork_in_parent(self) -> None:
+        self.__loading.release()
+
+    def __after_fork_in_child(self) -> None:
+        self.__loading.release()
+
+        # The parent's thread does not exist in the child.
+        if self.__background and self.__state != WARM_UP_DONE:
+            self.__attempts = 0
+            self.__start_thread()
+
+warm_up = WarmUp()
@@ -0,0 +1,58 @@
+"""
+Summarise the profiles of requests written to ``PROFILE_DIR``, see
+:mod:`~src.bh_aust_postcode.api.profiling`: the slowest profiled requests, the
+cProfile statistics of all ``.prof`` profiles added up, and the functions the most
+samples of all ``.folded`` stack profiles were in.
+
+Relevant test modules:
+
+    * ./tests/test_profiling.py
+"""
+
+import os
+import click
+
+from flask import current_app as app
+
+from src.bh_aust_postcode.api.profiling import (
+    CPROFILE_EXTENSION,
+    STACKS_EXTENSION,
+    SORT_KEYS,
+    profile_directory,
+    profile_files,
+    profile_milliseconds,
+    summarise_cprofile,
+    summarise_stacks,
+)
+
+#: Number of slowest profiled requests listed.
+SLOWEST_COUNT = 10
+
+# Command.
+
+@app.cli.command('profile-summary', short_help='Summarise profiles of requests.')
+@click.option('--limit', default=20, show_default=True, help='Number of functions listed.')
+@click.option('--sort', type=click.Choice(SORT_KEYS), default=SORT_KEYS[0], show_default=True,
+              help='Order of the cProfile statistics.')
+def profile_summary(limit, sort):
+    """Summarise profiles of requests."""
+
+    directory = profile_directory()
+    file_names = profile_files(directory)
+    if len(file_names) == 0:
+        click.echo(f'No profiles in {directory!r}.')
+        return
+
+    click.echo(f'{len(file_names)} profiles in {directory!r}, the slowest:')
+    for file_name in sorted(file_names, key=profile_milliseconds, reverse=True)[:SLOWEST_COUNT]:
+        click.echo(f'{profile_milliseconds(file_name):8d} ms  {os.path.basename(file_name)}')
+
+    cprofiles = profile_files(directory, CPROFILE_EXTENSION)
+    if len(cprofiles) > 0:
+        click.echo(f'\ncProfile statistics of {len(cprofiles)} requests:')
+        click.echo(summarise_cprofile(cprofiles, sort, limit))
+
+    stacks = profile_files(directory, STACKS_EXTENSION)
+    if len(stacks) > 0:
+        click.echo(f'\nSampled stacks of {len(stacks)} slow requests:\n')
+        click.echo(summarise_stacks(stacks, limit))
@@ -1,12 +1,52 @@
 CREATE SCHEMA IF NOT EXISTS {0} AUTHORIZATION postgres;
 
-DROP TABLE IF EXISTS {0}.{1};
-
 CREATE TABLE IF NOT EXISTS {0}.{1} (
         id integer NOT NULL GENERATED BY DEFAULT AS IDENTITY ( CYCLE INCREMENT 1 START 1 MINVALUE 1 MAXVALUE 2147483647 CACHE 1 ),
-        locality varchar(128) NOT NULL, 
+        locality varchar(128) NOT NULL,
         state varchar(3) NOT NULL,
         postcode varchar(4) NOT NULL,
+        latitude double precision,
+        longitude double precision,
         created timestamp with time zone NOT NULL DEFAULT CURRENT_TIMESTAMP,
 		PRIMARY KEY (id)
     );
+
+-- Validators of the source postcodes the table was last updated from.
+CREATE TABLE IF NOT EXISTS {0}.{1}_source (
+        url text NOT NULL,
+        etag text,
+        last_modified text,
+        updated timestamp with time zone NOT NULL DEFAULT CURRENT_TIMESTAMP,
+		PRIMARY KEY (url)
+    );
+
+-- Tables created before postcodes had coordinates: add them, and forget the source's 
+-- validators so that the next update downloads the coordinates.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_schema = '{0}' 
+                   AND table_name = '{1}' AND column_name = 'latitude') THEN
+        ALTER TABLE {0}.{1} ADD COLUMN latitude double precision, ADD COLUMN longitude double precision;
+        DELETE FROM {0}.{1}_source;
+    END IF;
+END $$;
+
+-- Tables loaded before updates were incremental may hold the same postcode twice.
+DELETE FROM {0}.{1} a USING {0}.{1} b
+    WHERE a.locality = b.locality AND a.state = b.state AND a.postcode = b.postcode AND a.id > b.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS {1}_locality_state_postcode_key ON {0}.{1} (locality, state, postcode);
+
+CREATE INDEX IF NOT EXISTS {1}_postcode_idx ON {0}.{1} (postcode);
+
+-- Serves the ILIKE searches of the postgres search backend, where pg_trgm is available.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS {1}_locality_trgm_idx ON {0}.{1} USING gin (locality gin_trgm_ops);
+    ELSE
+        RAISE NOTICE 'pg_trgm is not available, locality searches of the postgres backend scan the table.';
+    END IF;
+END $$;
+
@@ -1,31 +1,67 @@
 """
-Download postcodes JSON source, extract locality, state, postcode to write
-to local SQLite database file. Downloaded JSON source also gets written to
-a local JSON file.
+Download postcodes JSON source, extract locality, state, postcode and their
+coordinates to write to the PostgreSQL postcode table. Downloaded JSON source also gets written to
+a local JSON file. Postcodes are then written from the table to the binary 
+snapshot and the embedded SQLite database in the instance folder, and a new 
+generation stamp tells running workers to reload them.
+
+Updates are incremental: the source is only downloaded when it has changed since 
+the last update, according to its ETag and Last-Modified headers, and then only 
+postcodes added to or removed from the source are inserted or deleted.
+
+Relevant test modules:
+
+    * ./tests/test_update_postcode.py
 """
 
 from datetime import datetime
+import io
 import os
 import logging
-import requests
 import traceback
 import sys
-import psycopg2
+import click
 
-from flask import current_app as app
+from array import array
+from http import HTTPStatus
+from itertools import islice
 
-from bh_utils.json_funcs import dumps
+from flask import current_app as app
 
-from src.bh_aust_postcode.config import get_database_connection
+from src.bh_aust_postcode.api.compact_postcodes import (
+    CompactPostcodes,
+    coordinate_rows,
+)
+from src.bh_aust_postcode.api.postcode_snapshot import (
+    snapshot_filename,
+    write_snapshot,
+)
+from src.bh_aust_postcode.api.sqlite_backend import (
+    sqlite_filename,
+    write_sqlite,
+)
+from src.bh_aust_postcode.api.generation_stamp import (
+    stamp_filename,
+    write_stamp,
+)
 from src.bh_aust_postcode.utils import (
     print_log,
     format_sql_statement,
 )
+from src.bh_aust_postcode.utils.json_stream import iter_json_array
+
+# requests is imported by the function which uses it, and psycopg2 by __connection(): 
+# web workers import this module only to register the command.
 
 logger = logging.getLogger('admin')
 
+#: Rows loaded per ``COPY ... FROM STDIN``. Progress is reported after each.
+COPY_CHUNK_SIZE = 5000
+#: Bytes of the source JSON read at a time.
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
 def __schema_filename():
-    """Get SQLite scheme file name to create the database file name.
+    """Get the PostgreSQL database creation script file name.
 
     :return: full path of PostgreSQL database creation script: create schema and table.
     :rtype: str.
@@ -33,128 +69,374 @@ def __schema_filename():
 
     return os.path.join(os.path.dirname(__file__), '', app.config['DB_CREATE_SCRIPT'])
 
+def __connection():
+    """Check a connection out of the connection pool, see 
+    :meth:`~src.bh_aust_postcode.utils.db_pool.ConnectionPool.connection`.
+    """
+    from src.bh_aust_postcode.utils.db_pool import get_connection_pool
+
+    return get_connection_pool().connection()
+
 def create_database():
-    """Creates a new SQLite database file, overwrites any existing one."""
+    """Creates the schema and tables if they do not exist yet. Existing postcodes are kept."""
     try:
-        db_conn_params = get_database_connection()
-        
-        connection = psycopg2.connect(**db_conn_params)
-        cursor = connection.cursor()
+        with __connection() as connection:
+            cursor = connection.cursor()
 
-        with open(__schema_filename(), 'r') as sqlite_file:
-            sql_script = sqlite_file.read()
+            with open(__schema_filename(), 'r') as schema_file:
+                sql_script = schema_file.read()
 
-        cursor.execute(format_sql_statement(sql_script))
-        cursor.close()
+            cursor.execute(format_sql_statement(sql_script))
+            cursor.close()
 
-        connection.commit()
+            connection.commit()
 
     except Exception as e:
         print_log(logger, 'Error creating database file {!r}.'.format(e), 'exception')
 
+def __downloaded_filename() -> str:
+    """Full path of a new local copy of the source postcodes, in the instance folder.
+    """
+
+    local_dt_str = datetime.strftime(datetime.now(), "%Y%m%d_%H%M%S_%f")[:-3]
+    return os.path.join(app.instance_path, '', f"australian_postcodes_{local_dt_str}.json")
+
+def __iter_content(response: object):
+    """Generate the body of a streamed response in chunks, writing them as they are
+    to a local file as well when ``KEEP_DOWNLOADED_POSTCODES`` is True.
+
+    :param Response response: ``requests`` response of a ``stream=True`` request. It is closed
+        once the body has been read, or the generator is closed.
+
+    :return: a generator of ``bytes`` chunks.
+    """
+
+    file_name = __downloaded_filename() if app.config['KEEP_DOWNLOADED_POSTCODES'] else None
+    file = open(file_name, 'wb') if file_name else None
+    try:
+        for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+            if file: file.write(chunk)
+            yield chunk
     finally:
-        if connection:
-            connection.close()
+        response.close()
+        if file:
+            file.close()
+            print_log(logger, "Downloaded JSON: {!r}".format(file_name), 'info')
+
+def get_json_content(validators: dict=None) -> tuple:
+    """Download postcodes JSON source, parsing postcode records as they arrive.
 
-def get_json_content() -> tuple:
-    """Download postcodes JSON source.
+    Neither the whole source nor the list of all records is ever held in memory.
 
-    :return: True, JSON data. False, error message.
+    :param dict validators: ``etag`` and ``last_modified`` of the source when last 
+        downloaded, sent as ``If-None-Match`` and ``If-Modified-Since``. None to 
+        download unconditionally.
+
+    :return: True, a generator of postcode records or None when the source is not 
+        modified, and the source's current validators. False, error message and None.
     :rtype: tuple.
     """
+    headers = {}
+    if validators:
+        if validators.get('etag'): headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'): headers['If-Modified-Since'] = validators['last_modified']
+
+    import requests
+
     try:
-        response = requests.get(app.config['SOURCE_POSTCODE_URL'])
+        response = requests.get(app.config['SOURCE_POSTCODE_URL'], headers=headers, stream=True)
         response.raise_for_status()
 
     except Exception as e:
         msg = "Error getting JSON source {!r}.".format(e)
         print_log(logger, msg, 'exception')
-        return False, msg
+        return False, msg, None
     
-    return True, response.json()
+    current = {'etag': response.headers.get('ETag'), 
+               'last_modified': response.headers.get('Last-Modified')}
 
-def write_downloaded_json_content(json: dict) -> None:
-    """Conditionally write downloaded postcode JSON content to a JSON 
-    file on disk.
+    if response.status_code == HTTPStatus.NOT_MODIFIED.value:
+        response.close()
+        return True, None, validators
 
-    If environment variable KEEP_DOWNLOADED_POSTCODES is True, then
-    write the downloaded source postcodes to disk. 
+    return True, iter_json_array(__iter_content(response), response.encoding or 'utf-8'), current
 
-    :param JSON json: downloaded postcodes to write to a local JSON file.    
+def __read_validators(cursor: object) -> dict:
+    """Validators of the source postcodes the table was last updated from.
+
+    :param object cursor: a cursor of an already established PostgreSQL connection.
+
+    :return: ``etag`` and ``last_modified``, None if never updated from ``SOURCE_POSTCODE_URL``.
+    :rtype: dict.
     """
-    if (not app.config['KEEP_DOWNLOADED_POSTCODES']):
-        return
-    
-    local_dt_str = datetime.strftime(datetime.now(), "%Y%m%d_%H%M%S_%f")[:-3]
-    file_name = os.path.join(app.instance_path, '', f"australian_postcodes_{local_dt_str}.json")
 
-    with open(file_name, 'w', encoding='utf-8') as f:
-        f.write( dumps(json) )
-        f.close()
+    cursor.execute(format_sql_statement('SELECT etag, last_modified FROM {0}.{1}_source WHERE url = %s'), 
+                   (app.config['SOURCE_POSTCODE_URL'],))
+    row = cursor.fetchone()
 
-    print_log(logger, "Downloaded JSON: {!r}".format(file_name), 'info')
+    return None if row == None else {'etag': row[0], 'last_modified': row[1]}
 
-def extract_and_insert():
-    """Download postcodes JSON source, write JSON source to local file,
-    then read locality, state and postcode from JSON data and write to 
-    SQLite database file. 
+def __write_validators(cursor: object, validators: dict):
+    """Record the validators of the source postcodes the table is updated from. 
+    The caller commits, with the postcodes.
+
+    :param object cursor: a cursor of an already established PostgreSQL connection.
+    :param dict validators: ``etag`` and ``last_modified`` of the downloaded source.
+    """
+
+    cursor.execute(format_sql_statement('INSERT INTO {0}.{1}_source (url, etag, last_modified) '
+                                        'VALUES (%s, %s, %s) ON CONFLICT (url) DO UPDATE SET '
+                                        'etag = EXCLUDED.etag, last_modified = EXCLUDED.last_modified, '
+                                        'updated = CURRENT_TIMESTAMP'), 
+                   (app.config['SOURCE_POSTCODE_URL'], validators['etag'], validators['last_modified']))
+
+def __copy_text(value: object) -> str:
+    """Escape a value for the PostgreSQL ``COPY`` text format.
+
+    :param object value: the value, converted to text.
+
+    :return: the value with backslash, tab, new line and carriage return escaped.
+    :rtype: str.
+    """
+
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+def __copy_coordinates(itm: dict) -> str:
+    """The ``lat`` and ``long`` of a postcode record for the PostgreSQL ``COPY`` text 
+    format.
+
+    :param dict itm: the postcode record.
+
+    :return: latitude and longitude separated by a tab. Both ``\\N``, i.e. NULL, when
+        either is missing, not a number, out of range, or both are 0, which the source 
+        uses for unknown.
+    :rtype: str.
     """
 
     try:
-        db_conn_params = get_database_connection()
-        connection = psycopg2.connect(**db_conn_params)
-        cursor = connection.cursor()
+        latitude, longitude = float(itm['lat']), float(itm['long'])
+    except (KeyError, TypeError, ValueError):
+        return '\\N\t\\N'
+
+    if (not -90 <= latitude <= 90 or not -180 <= longitude <= 180 
+        or (latitude == 0 and longitude == 0)):
+        return '\\N\t\\N'
+
+    return f'{latitude!r}\t{longitude!r}'
 
-        res, data = get_json_content()
+def copy_postcodes(cursor: object, records, table_name: str=None) -> int:
+    """Bulk load postcode records with ``COPY ... FROM STDIN``, fed from an in-memory 
+    buffer, ``COPY_CHUNK_SIZE`` rows at a time. The caller commits.
 
-        if (not res): 
-            print_log(logger, "Error getting source JSON postcode data: {!r}".format(data), 'error')
-            return
-        
-        json_obj = data
+    :param object cursor: a cursor of an already established PostgreSQL connection.
+    :param records: postcode dictionaries with ``locality``, ``state``, ``postcode``
+        and optionally ``lat`` and ``long``. Any iterable, e.g. a generator: only one 
+        chunk is held at a time.
+    :param str table_name: the schema qualified table to load into. None for the 
+        configured postcode table.
 
-        print_log(logger, f"Total postcodes read: {len(json_obj)}", "info")
+    :return: number of rows loaded.
+    :rtype: int.
+    """
+
+    if table_name == None: table_name = format_sql_statement('{0}.{1}')
+
+    sql = f'COPY {table_name} (locality, state, postcode, latitude, longitude) FROM STDIN'
+
+    records = iter(records)
+    total = 0
+    while True:
+        buffer = io.StringIO()
+        count = 0
+        for itm in islice(records, COPY_CHUNK_SIZE):
+            buffer.write(f"{__copy_text(itm['locality'])}\t{__copy_text(itm['state'])}\t"
+                         f"{__copy_text(itm['postcode'])}\t{__copy_coordinates(itm)}\n")
+            count += 1
+
+        if count == 0: break
+
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+
+        total += count
+        print_log(logger, f"Inserted into database: {total}.", 'info')
+
+    return total
+
+def apply_postcodes(cursor: object, records) -> dict:
+    """Make the postcode table hold exactly the postcodes in records, keyed on 
+    locality, state and postcode: only postcodes not in the table are inserted, 
+    only postcodes no longer in records are deleted, and only postcodes whose 
+    coordinates have changed are updated. The caller commits.
+
+    Records are first bulk loaded into a temporary table, so the difference is 
+    worked out by the database rather than in memory. A postcode listed more than
+    once gets the average of its coordinates.
+
+    :param object cursor: a cursor of an already established PostgreSQL connection.
+    :param records: postcode dictionaries with ``locality``, ``state``, ``postcode``,
+        ``lat`` and ``long``.
+
+    :return: the numbers of postcodes ``read``, ``inserted``, ``deleted``, ``updated``
+        and ``unchanged``.
+    :rtype: dict.
+    """
+
+    cursor.execute('CREATE TEMP TABLE source_postcode (locality varchar(128), '
+                   'state varchar(3), postcode varchar(4), latitude double precision, '
+                   'longitude double precision) ON COMMIT DROP')
+
+    read = copy_postcodes(cursor, records, 'source_postcode')
+
+    cursor.execute('CREATE TEMP TABLE distinct_postcode ON COMMIT DROP AS '
+                   'SELECT locality, state, postcode, avg(latitude) AS latitude, '
+                   'avg(longitude) AS longitude FROM source_postcode GROUP BY locality, state, postcode')
+    cursor.execute('ANALYZE distinct_postcode')
+
+    cursor.execute(format_sql_statement('DELETE FROM {0}.{1} p WHERE NOT EXISTS ('
+                                        'SELECT 1 FROM distinct_postcode s WHERE s.locality = p.locality '
+                                        'AND s.state = p.state AND s.postcode = p.postcode)'))
+    deleted = cursor.rowcount
+
+    cursor.execute(format_sql_statement('UPDATE {0}.{1} p SET latitude = s.latitude, longitude = s.longitude '
+                                        'FROM distinct_postcode s WHERE s.locality = p.locality '
+                                        'AND s.state = p.state AND s.postcode = p.postcode '
+                                        'AND (p.latitude IS DISTINCT FROM s.latitude '
+                                        'OR p.longitude IS DISTINCT FROM s.longitude)'))
+    updated = cursor.rowcount
+
+    cursor.execute(format_sql_statement('INSERT INTO {0}.{1} (locality, state, postcode, latitude, longitude) '
+                                        'SELECT locality, state, postcode, latitude, longitude '
+                                        'FROM distinct_postcode s '
+                                        'WHERE NOT EXISTS (SELECT 1 FROM {0}.{1} p WHERE p.locality = s.locality '
+                                        'AND p.state = s.state AND p.postcode = s.postcode)'))
+    inserted = cursor.rowcount
+
+    cursor.execute(format_sql_statement('SELECT count(*) FROM {0}.{1}'))
+    unchanged = cursor.fetchone()[0] - inserted - updated
+
+    return {'read': read, 'inserted': inserted, 'deleted': deleted, 'updated': updated, 
+            'unchanged': unchanged}
+
+def extract_and_insert(force: bool=False) -> dict:
+    """Download postcodes JSON source, write JSON source to local file,
+    then read locality, state and postcode from JSON data and write to 
+    the PostgreSQL postcode table. 
 
-        write_downloaded_json_content(json_obj)
+    Records are streamed from the download into the database, so memory use does
+    not grow with the size of the source. Nothing is downloaded when the source has
+    not changed since the last update, and only differences are written.
 
-        print_log(logger, "Processing started...", "info")
+    :param bool force: True to download the source even when it has not changed.
 
-        #
-        # raise Exception("This is a test only...")
-        #
+    :return: the counts of :func:`apply_postcodes`. None when the source has not 
+        changed or on error.
+    :rtype: dict.
+    """
+
+    try:
+        with __connection() as connection:
+            cursor = connection.cursor()
 
-        for idx, itm in enumerate(json_obj, start=1):
-            locality = itm['locality'].replace("'", "''")
-            state = itm['state']
-            postcode = itm['postcode']
+            res, data, validators = get_json_content(None if force else __read_validators(cursor))
 
-            insert_query = ("INSERT INTO {0}.{1} (locality, state, postcode)  "
-                            f"VALUES ('{locality}', '{state}', '{postcode}')")
+            if (not res): 
+                print_log(logger, "Error getting source JSON postcode data: {!r}".format(data), 'error')
+                return
+            
+            if data == None:
+                print_log(logger, "Source postcodes not modified since the last update.", 'info')
+                return
 
-            cursor.execute(format_sql_statement(insert_query))
+            print_log(logger, "Processing started...", "info")
 
-            if (idx % 1000 == 0):
-                print_log(logger, f"Inserted into database: {idx} / {len(json_obj)}.", 'info')
+            #
+            # raise Exception("This is a test only...")
+            #
 
-        connection.commit()
-        cursor.close()
+            counts = apply_postcodes(cursor, data)
+            __write_validators(cursor, validators)
 
-        print_log(logger, f"Total postcodes inserted into database: {idx} / {len(json_obj)}.", 'info')
+            connection.commit()
+            cursor.close()
+
+        print_log(logger, f"Total postcodes read: {counts['read']}. Inserted: {counts['inserted']}, "
+                          f"deleted: {counts['deleted']}, updated: {counts['updated']}, "
+                          f"unchanged: {counts['unchanged']}.", 'info')
+
+        return counts
 
     except Exception as e:
         print_log(logger, 'Error inserting {!r}'.format(e), 'exception')
         print_log(logger, 'Exception traceback:', 'exception')
         exc_type, exc_value, exc_tb = sys.exc_info()
         print_log(logger, traceback.format_exception(exc_type, exc_value, exc_tb), 'exception')
-    finally:
-        if connection:
-            connection.close()
+
+def create_snapshot():
+    """Write postcodes in the database to the binary snapshot in the instance 
+    folder, which the postcode pool memory maps on start up, and to the embedded 
+    SQLite database, which serves deployments without PostgreSQL.
+    """
+    file_name = snapshot_filename()
+    sqlite_file_name = sqlite_filename()
+    if not file_name and not sqlite_file_name: return
+
+    try:
+        with __connection() as connection:
+            cursor = connection.cursor()
+
+            cursor.execute(format_sql_statement('SELECT locality, state, postcode, latitude, longitude '
+                                                'FROM {0}.{1} ORDER BY locality, state, postcode'))
+            coordinates = array('d')
+            postcodes = CompactPostcodes.from_rows(coordinate_rows(cursor, coordinates))
+            cursor.close()
+
+        if file_name:
+            size = write_snapshot(file_name, postcodes, app.config['FUZZY_MAX_DISTANCE'], coordinates)
+
+            print_log(logger, f"Snapshot of {len(postcodes)} postcodes written: {file_name!r}, "
+                              f"{size} bytes.", 'info')
+
+        if sqlite_file_name:
+            size = write_sqlite(sqlite_file_name, postcodes, coordinates)
+
+            print_log(logger, f"SQLite database of {len(postcodes)} postcodes written: "
+                              f"{sqlite_file_name!r}, {size} bytes.", 'info')
+
+    except Exception as e:
+        print_log(logger, 'Error writing snapshot {!r}.'.format(e), 'exception')
+
+def create_stamp(counts: dict=None):
+    """Write a new generation stamp, for running workers to reload postcodes.
+
+    :param dict counts: the counts of :func:`apply_postcodes`, written along with the 
+        stamp. None when postcodes were not updated.
+    """
+    file_name = stamp_filename()
+    if not file_name: return
+
+    try:
+        stamp = write_stamp(file_name, counts)
+        print_log(logger, f'Generation stamp {stamp!r} written: {file_name!r}.', 'info')
+
+    except Exception as e:
+        print_log(logger, 'Error writing generation stamp {!r}.'.format(e), 'exception')
 
 # Command.
 
 @app.cli.command('update-postcode', short_help='Download and update postocdes.')
-def update_postcode():
+@click.option('--force', is_flag=True, help='Download postcodes even if the source has not changed.')
+def update_postcode(force):
     """Download and update postocdes."""
 
     create_database()
-    extract_and_insert()
+    counts = extract_and_insert(force)
+
+    # The snapshot and SQLite database are only out of date if postcodes have changed, 
+    # or either is missing.
+    missing = [file_name for file_name in (snapshot_filename(), sqlite_filename()) 
+               if file_name and not os.path.exists(file_name)]
+    if force or (counts and (counts['inserted'] or counts['deleted'] or counts['updated'])) or missing:
+        create_snapshot()
+        create_stamp(counts)
@@ -9,11 +9,27 @@ from os import (
 
 from dotenv import load_dotenv
 
-from distutils.util import strtobool
-
 basedir = getcwd()
 load_dotenv( path.join(basedir, '.env') )
 
+def strtobool(value: str) -> int:
+    """Convert a string representation of truth to 1 or 0, as the deprecated 
+    ``distutils.util.strtobool`` did, without importing ``distutils``, which takes 
+    longer than the rest of start up.
+
+    :param str value: ``y``, ``yes``, ``t``, ``true``, ``on`` or ``1``, or ``n``, ``no``, 
+        ``f``, ``false``, ``off`` or ``0``, case insensitive.
+
+    :rtype: int.
+
+    :raises ValueError: any other value.
+    """
+    value = value.lower()
+    if value in ('y', 'yes', 't', 'true', 'on', '1'): return 1
+    if value in ('n', 'no', 'f', 'false', 'off', '0'): return 0
+
+    raise ValueError(f'invalid truth value {value!r}')
+
 class Config:
     """Set Flask configuration from .env file."""
 
@@ -46,6 +62,113 @@ class Config:
     #: PostgreSQL port. The PostgreSQL host port.
     PGPORT = environ.get('PGPORT')
 
+    #: Maximum number of pooled PostgreSQL connections open at once per process.
+    DB_POOL_MAX_SIZE = int(environ.get('DB_POOL_MAX_SIZE', '4'))
+    #: Seconds a pooled connection can be idle before it is checked with ``SELECT 1``
+    #: when reused. 0 checks every time.
+    DB_POOL_CHECK_INTERVAL = int(environ.get('DB_POOL_CHECK_INTERVAL', '30'))
+
+    #: Where searches run: ``memory``, all postcodes held in every worker, 
+    #: ``postgres``, a query per search, for workers which cannot spare the memory, or 
+    #: ``sqlite``, a query per search of the embedded SQLite database, without PostgreSQL.
+    SEARCH_BACKEND = environ.get('SEARCH_BACKEND', 'memory')
+
+    #: Whether to load postcodes in a background thread on start up, so that workers 
+    #: serve, and report not ready on ``/health/ready``, until they are loaded, rather 
+    #: than block until then.
+    WARM_UP_IN_BACKGROUND = strtobool(environ.get('WARM_UP_IN_BACKGROUND', 'False'))
+    #: Seconds between attempts to load postcodes in the background, until one 
+    #: succeeds. 0 gives up after the first.
+    WARM_UP_RETRY_INTERVAL = int(environ.get('WARM_UP_RETRY_INTERVAL', '30'))
+
+    #: Generation stamp file, in the instance folder, which the ``update-postcode`` 
+    #: command rewrites whenever postcodes change, for every worker to reload them. 
+    #: Blank disables it.
+    GENERATION_STAMP_FILE = environ.get('GENERATION_STAMP_FILE', 'postcodes.generation')
+    #: Seconds between checks of the generation stamp, per worker. 0 disables them.
+    GENERATION_CHECK_INTERVAL = float(environ.get('GENERATION_CHECK_INTERVAL', '5'))
+
+    #: Whether to record metrics and serve them at ``/metrics``.
+    METRICS_ENABLED = strtobool(environ.get('METRICS_ENABLED', 'True'))
+    #: Directory, in the instance folder, where every worker process writes its metrics
+    #: for ``/metrics`` to report those of all workers, e.g. under Gunicorn. Empty it 
+    #: before the server starts. Blank reports the metrics of the worker serving 
+    #: ``/metrics`` only.
+    METRICS_MULTIPROCESS_DIR = environ.get('METRICS_MULTIPROCESS_DIR', '')
+    #: Seconds between writes of a worker's metrics to the multiprocess directory.
+    METRICS_FLUSH_INTERVAL = float(environ.get('METRICS_FLUSH_INTERVAL', '5'))
+
+    #: Profile 1 in so many requests of ``PROFILE_ENDPOINTS`` with cProfile. 0 disables it.
+    PROFILE_EVERY = int(environ.get('PROFILE_EVERY', '0'))
+    #: Write the sampled stacks of requests of ``PROFILE_ENDPOINTS`` which take longer
+    #: than this many seconds, ready for flame graphs. 0 disables it.
+    PROFILE_SLOW_SECONDS = float(environ.get('PROFILE_SLOW_SECONDS', '0'))
+    #: Seconds between samples of the stacks of requests, with ``PROFILE_SLOW_SECONDS``.
+    PROFILE_SAMPLE_INTERVAL = float(environ.get('PROFILE_SAMPLE_INTERVAL', '0.005'))
+    #: Comma separated endpoints to profile. ``api.postcodes_postcode`` is the partial
+    #: search, ``Postcode.get``.
+    PROFILE_ENDPOINTS = environ.get('PROFILE_ENDPOINTS', 'api.postcodes_postcode')
+    #: Directory, in the instance folder, profiles are written to.
+    PROFILE_DIR = environ.get('PROFILE_DIR', 'profiles')
+    #: Number of profiles kept, the oldest are deleted. 0 keeps all.
+    PROFILE_MAX_FILES = int(environ.get('PROFILE_MAX_FILES', '50'))
+
+    #: Whether to hold postcodes in compact, array-backed storage rather than a list
+    #: of dictionaries. Trades a little search time for much less memory per worker.
+    POSTCODE_POOL_COMPACT = strtobool(environ.get('POSTCODE_POOL_COMPACT', 'False'))
+
+    #: Binary snapshot of the postcode pool, in the instance folder. Written by the
+    #: ``update-postcode`` command, and memory mapped by the pool instead of querying 
+    #: the database. Blank disables snapshots.
+    POSTCODE_SNAPSHOT_FILE = environ.get('POSTCODE_SNAPSHOT_FILE', 'postcodes.snapshot')
+    #: Age in seconds after which the snapshot is stale and the pool loads from the
+    #: database instead. 0 means the snapshot never goes stale.
+    POSTCODE_SNAPSHOT_MAX_AGE = int(environ.get('POSTCODE_SNAPSHOT_MAX_AGE', '0'))
+
+    #: Embedded SQLite database of postcodes, in the instance folder. Written by the 
+    #: ``update-postcode`` command. Served by the ``sqlite`` search backend, and loaded
+    #: by the pool when there is no usable snapshot. Blank disables it.
+    SQLITE_DATABASE_FILE = environ.get('SQLITE_DATABASE_FILE', 'postcodes.sqlite3')
+
+    #: Maximum number of matched localities a client can ask for in one page.
+    SEARCH_MAX_PAGE_LIMIT = int(environ.get('SEARCH_MAX_PAGE_LIMIT', '1000'))
+
+    #: Maximum edit distance of fuzzy searches. The fuzzy index is built, and written to
+    #: the snapshot, for this distance. 0 disables fuzzy search.
+    FUZZY_MAX_DISTANCE = int(environ.get('FUZZY_MAX_DISTANCE', '2'))
+
+    #: Maximum number of localities in one batch search.
+    BATCH_MAX_SIZE = int(environ.get('BATCH_MAX_SIZE', '1000'))
+
+    #: Bearer token of admin endpoints, e.g. reloading postcodes. Blank disables them.
+    ADMIN_TOKEN = environ.get('ADMIN_TOKEN', '')
+
+    #: Maximum number of search results cached per worker. 0 disables the cache.
+    SEARCH_CACHE_MAX_SIZE = int(environ.get('SEARCH_CACHE_MAX_SIZE', '1024'))
+    #: Time to live of a cached search result in seconds. 0 means results never expire:
+    #: they are dropped anyway whenever postcodes are reloaded.
+    SEARCH_CACHE_TTL = int(environ.get('SEARCH_CACHE_TTL', '0'))
+    #: Maximum number of pre-serialised responses cached per worker. 0 disables the cache.
+    #: Entries share the time to live of SEARCH_CACHE_TTL.
+    RESPONSE_CACHE_MAX_SIZE = int(environ.get('RESPONSE_CACHE_MAX_SIZE', '512'))
+
+    #: Maximum memory, in bytes, per worker, of the positions kept for refining partial 
+    #: searches typed character by character. 0 disables refinement.
+    REFINEMENT_CACHE_MAX_BYTES = int(environ.get('REFINEMENT_CACHE_MAX_BYTES', '4194304'))
+
+    #: Content codings JSON responses are compressed with, most preferred first, 
+    #: ``br`` only when the brotli package is installed. Blank disables compression.
+    COMPRESSION_ENCODINGS = environ.get('COMPRESSION_ENCODINGS', 'br,gzip')
+    #: Responses smaller than this many bytes are sent uncompressed.
+    COMPRESSION_MIN_SIZE = int(environ.get('COMPRESSION_MIN_SIZE', '1024'))
+
+    #: Flask-CORS: let cross origin clients read the ETag, to revalidate with If-None-Match,
+    #: the total number of matched localities of a paged search, and the versioned URL of 
+    #: the postcode bundle.
+    CORS_EXPOSE_HEADERS = ['ETag', 'X-Total-Count', 'Content-Location']
+    #: Flask-CORS: seconds browsers may cache preflight results.
+    CORS_MAX_AGE = 600
+
 def get_config():
     """Retrieve environment configuration settings.
 
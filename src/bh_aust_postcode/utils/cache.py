@@ -0,0 +1,116 @@
+"""
+A bounded, thread safe least recently used cache whose entries belong to a
+generation of the postcode pool.
+
+Every :meth:`LRUCache.get` and :meth:`LRUCache.put` is given the pool's current
+generation. As soon as the generation changes, i.e. postcodes have been reloaded,
+all entries of the previous generation are dropped, and values computed from an
+older generation are not stored.
+"""
+
+import time
+import threading
+
+from collections import OrderedDict
+
+class LRUCache(object):
+    """Least recently used cache with optional time to live, tied to a generation."""
+
+    def __init__(self, max_size: int, ttl: float=0):
+        """
+        :param int max_size: maximum number of entries. The least recently used entry
+            is evicted to make room for a new one.
+        :param float ttl: time to live of an entry in seconds. 0 means entries never expire.
+        """
+        self.__max_size = max_size
+        self.__ttl = ttl
+        self.__entries = OrderedDict()
+        self.__generation = None
+        self.__lock = threading.Lock()
+
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__expirations = 0
+        self.__invalidations = 0
+
+    def __check_generation(self, generation: int) -> None:
+        """Drop all entries if the generation has changed. Caller holds the lock.
+        """
+        if generation != self.__generation:
+            if len(self.__entries) > 0: self.__invalidations += 1
+            self.__entries.clear()
+            self.__generation = generation
+
+    def get(self, key: object, generation: int) -> object:
+        """Look up an entry and mark it most recently used.
+
+        :param object key: the entry key.
+        :param int generation: the current generation.
+
+        :return: the cached value, or None if there is no live entry.
+        :rtype: object.
+        """
+        with self.__lock:
+            self.__check_generation(generation)
+
+            entry = self.__entries.get(key)
+            if entry == None:
+                self.__misses += 1
+                return None
+
+            value, expires = entry
+            if expires and expires < time.monotonic():
+                del self.__entries[key]
+                self.__expirations += 1
+                self.__misses += 1
+                return None
+
+            self.__entries.move_to_end(key)
+            self.__hits += 1
+            return value
+
+    def put(self, key: object, value: object, generation: int) -> None:
+        """Add or replace an entry, evicting the least recently used entry when full.
+
+        :param object key: the entry key.
+        :param object value: the value to cache.
+        :param int generation: the generation ``value`` was computed from.
+        """
+        with self.__lock:
+            # Computed from postcodes which have since been reloaded.
+            if self.__generation != None and generation < self.__generation: return
+
+            self.__check_generation(generation)
+
+            expires = time.monotonic() + self.__ttl if self.__ttl else 0
+            self.__entries[key] = (value, expires)
+            self.__entries.move_to_end(key)
+
+            while len(self.__entries) > self.__max_size:
+                self.__entries.popitem(last=False)
+                self.__evictions += 1
+
+    def clear(self) -> None:
+        """Drop all entries. Counters are kept."""
+        with self.__lock:
+            self.__entries.clear()
+
+    def info(self) -> dict:
+        """Counters for monitoring.
+
+        :return: ``hits``, ``misses``, ``evictions``, ``expirations``, ``invalidations``,
+            ``size``, ``max_size`` and ``generation``.
+        :rtype: dict.
+        """
+        with self.__lock:
+            return {
+                'hits': self.__hits,
+                'misses': self.__misses,
+                'evictions': self.__evictions,
+                'expirations': self.__expirations,
+                'invalidations': self.__invalidations,
+                'size': len(self.__entries),
+                'max_size': self.__max_size,
+                'generation': self.__generation,
+            }
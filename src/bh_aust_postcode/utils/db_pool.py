@@ -0,0 +1,183 @@
+"""
+A bounded, thread safe pool of reusable PostgreSQL connections, one pool per process.
+
+The postcode pool loader and the CLI commands check connections out of the pool
+rather than connecting afresh every time, which saves reloads a connection set up,
+and caps the number of connections each worker process holds to ``DB_POOL_MAX_SIZE``.
+
+Relevant test modules:
+
+    * ./tests/test_db_pool.py
+"""
+
+import os
+import time
+import threading
+
+from contextlib import contextmanager
+
+import psycopg2
+
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from flask import current_app as app
+
+from src.bh_aust_postcode.config import get_database_connection
+
+class ConnectionPool(object):
+    """Pool of PostgreSQL connections, opened on demand and kept for reuse."""
+
+    def __init__(self, connection_params: dict, max_size: int, check_interval: float=30):
+        """
+        :param dict connection_params: psycopg2 connection parameters, see
+            :func:`~src.bh_aust_postcode.config.get_database_connection`.
+        :param int max_size: maximum number of connections open at once. Further
+            checkouts wait until a connection is returned.
+        :param float check_interval: connections idle for longer than this many seconds
+            are checked with ``SELECT 1`` before reuse, and replaced if broken. 0 checks
+            every time.
+        """
+        self.__connection_params = connection_params
+        self.__check_interval = check_interval
+        self.__slots = threading.BoundedSemaphore(max_size)
+        self.__idle = []
+        self.__lock = threading.Lock()
+
+        self.__max_size = max_size
+        self.__in_use = 0
+        self.__created = 0
+        self.__reused = 0
+        self.__discarded = 0
+
+    def __healthy(self, connection: object, last_used: float) -> bool:
+        """Whether an idle connection can be reused.
+        """
+        if connection.closed: return False
+        if time.monotonic() - last_used < self.__check_interval: return True
+
+        try:
+            cursor = connection.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+            cursor.close()
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def __discard(self, connection: object) -> None:
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+        with self.__lock:
+            self.__discarded += 1
+
+    def __acquire(self) -> object:
+        """Take a healthy idle connection, or open a new one. Waits for a free slot.
+        """
+        self.__slots.acquire()
+        try:
+            while True:
+                with self.__lock:
+                    if len(self.__idle) == 0: break
+                    connection, last_used = self.__idle.pop()
+
+                if self.__healthy(connection, last_used):
+                    with self.__lock:
+                        self.__reused += 1
+                        self.__in_use += 1
+                    return connection
+
+                self.__discard(connection)
+
+            connection = psycopg2.connect(**self.__connection_params)
+            with self.__lock:
+                self.__created += 1
+                self.__in_use += 1
+            return connection
+
+        except Exception:
+            self.__slots.release()
+            raise
+
+    def __release(self, connection: object) -> None:
+        """Return a connection to the pool. Uncommitted work is rolled back, broken
+        connections are discarded.
+        """
+        try:
+            reusable = not connection.closed
+            if reusable and connection.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except psycopg2.Error:
+            reusable = False
+
+        if not reusable: self.__discard(connection)
+
+        with self.__lock:
+            self.__in_use -= 1
+            if reusable: self.__idle.append((connection, time.monotonic()))
+
+        self.__slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of a ``with`` block.
+
+        The caller commits. Whatever is not committed by the end of the block is
+        rolled back when the connection goes back to the pool.
+
+        :return: a context manager which gives a psycopg2 connection.
+        """
+        connection = self.__acquire()
+        try:
+            yield connection
+        finally:
+            self.__release(connection)
+
+    def close(self) -> None:
+        """Close all idle connections. Connections checked out are closed when returned
+        only if broken, the pool stays usable.
+        """
+        with self.__lock:
+            idle, self.__idle = self.__idle, []
+
+        for connection, _ in idle: self.__discard(connection)
+
+    def info(self) -> dict:
+        """Pool counters, for monitoring.
+
+        :return: ``max_size``, ``idle`` and ``in_use`` connections, and the number of
+            connections ``created``, ``reused`` and ``discarded`` so far.
+        :rtype: dict.
+        """
+        with self.__lock:
+            return {'max_size': self.__max_size, 'idle': len(self.__idle),
+                    'in_use': self.__in_use, 'created': self.__created,
+                    'reused': self.__reused, 'discarded': self.__discarded}
+
+#: Connection pools by process id. A forked worker gets its own pool: connections
+#: inherited from the parent are left alone, since closing them in the child would
+#: also end them for the parent.
+__pools = {}
+__pools_lock = threading.Lock()
+
+def get_connection_pool() -> ConnectionPool:
+    """Get this process's connection pool, creating it from configuration on first use.
+
+    :return: the pool, sized by ``DB_POOL_MAX_SIZE`` and checking idle connections
+        per ``DB_POOL_CHECK_INTERVAL``.
+    :rtype: :class:`ConnectionPool`.
+    """
+    pid = os.getpid()
+
+    pool = __pools.get(pid)
+    if pool != None: return pool
+
+    with __pools_lock:
+        if pid not in __pools:
+            __pools[pid] = ConnectionPool(get_database_connection(),
+                                          app.config['DB_POOL_MAX_SIZE'],
+                                          app.config['DB_POOL_CHECK_INTERVAL'])
+        return __pools[pid]
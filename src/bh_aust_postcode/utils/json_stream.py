@@ -0,0 +1,90 @@
+"""
+Incremental parsing of a large JSON array, item by item, as the document arrives.
+
+Only the current chunk and the item being parsed are held in memory, never the
+whole document or the list of all items. Each item itself is parsed by the
+standard library's C accelerated decoder.
+"""
+
+import codecs
+import json
+
+WHITESPACE = ' \t\n\r'
+
+#: Parser states: before ``[``, before the first item, before an item, after an item,
+#: after ``]``.
+__START, __FIRST, __ITEM, __NEXT, __END = range(5)
+
+def iter_json_array(chunks, encoding: str='utf-8'):
+    """Parse the items of a top level JSON array one by one.
+
+    :param chunks: an iterable of ``bytes``, the document in order, split anywhere.
+    :param str encoding: the document's text encoding.
+
+    :return: a generator of the array items, decoded as :func:`json.loads` does.
+
+    :raises ValueError: the document is not a JSON array, is malformed or is truncated.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder(encoding)()
+
+    chunks = iter(chunks)
+    buffer, pos, eof = '', 0, False
+    state = __START
+
+    def more() -> str:
+        nonlocal eof
+        chunk = next(chunks, None)
+        if chunk == None:
+            eof = True
+            return text_decoder.decode(b'', final=True)
+
+        return text_decoder.decode(chunk)
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in WHITESPACE: pos += 1
+
+        if pos == len(buffer):
+            if eof: break
+            buffer, pos = more(), 0
+            continue
+
+        char = buffer[pos]
+
+        if state == __START:
+            if char != '[': raise ValueError('JSON document is not an array.')
+            pos += 1
+            state = __FIRST
+
+        elif state == __FIRST and char == ']':
+            pos += 1
+            state = __END
+
+        elif state in (__FIRST, __ITEM):
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof: raise
+                end = None
+
+            # Only complete once followed by , or ]: e.g. a number may be cut in two.
+            following = end if end != None else len(buffer)
+            while following < len(buffer) and buffer[following] in WHITESPACE: following += 1
+
+            if not eof and (following == len(buffer) or buffer[following] not in ',]'):
+                buffer, pos = buffer[pos:] + more(), 0
+                continue
+
+            yield item
+            pos = end
+            state = __NEXT
+
+        elif state == __NEXT:
+            if char not in ',]': raise ValueError(f'Expected , or ] in JSON array, got {char!r}.')
+            pos += 1
+            state = __ITEM if char == ',' else __END
+
+        else:
+            raise ValueError('Unexpected data after JSON array.')
+
+    if state != __END: raise ValueError('JSON array is truncated.')
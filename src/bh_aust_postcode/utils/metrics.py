@@ -0,0 +1,444 @@
+"""
+A small, thread safe metrics registry, rendered in the Prometheus text exposition
+format, version 0.0.4.
+
+Counters and histograms are updated in place, under a lock per metric: an update is
+a dictionary lookup and a few additions. Values held elsewhere, e.g. cache counters
+and the number of postcodes, are read by collectors, functions the registry calls
+right before it renders or writes its values.
+
+Gunicorn runs every worker in a process of its own, each with its own registry. With
+a multiprocess directory configured, every process writes its values to a file of its
+own in that directory, at most every ``flush_interval`` seconds, and on exit.
+Rendering merges the files of all processes: counters and histograms are summed,
+those of exited processes included, so that totals never go backwards, while gauges
+are reported per live process, labelled with its ``pid``. The directory should be
+emptied before the server starts.
+
+Relevant test modules:
+
+    * ./tests/test_metrics.py
+"""
+
+import os
+import json
+import glob
+import math
+import atexit
+import bisect
+import threading
+import time
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+#: Content type of :meth:`MetricsRegistry.render`.
+EXPOSITION_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+#: Default histogram buckets, in seconds, for durations from half a millisecond to 5 seconds.
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+#: Name of the file a process writes its values to, in the multiprocess directory.
+PROCESS_FILE_PATTERN = 'metrics_{}.json'
+
+def __format_value(value: float) -> str:
+    if value == math.inf: return '+Inf'
+    if value == -math.inf: return '-Inf'
+    if isinstance(value, int): return str(value)
+
+    return repr(float(value))
+
+def __escape(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+def __format_labels(names: tuple, values: tuple) -> str:
+    if len(names) == 0: return ''
+
+    return '{' + ','.join(f'{name}="{__escape(value)}"' for name, value in zip(names, values)) + '}'
+
+def render_families(families: dict) -> str:
+    """Render metrics in the text exposition format.
+
+    :param dict families: metrics by name, see :meth:`MetricsRegistry.snapshot`.
+
+    :rtype: str.
+    """
+    lines = []
+    for name, family in families.items():
+        lines.append(f'# HELP {name} {family["help"]}'.replace('\n', ' '))
+        lines.append(f'# TYPE {name} {family["type"]}')
+
+        names = tuple(family['labelnames'])
+        samples = sorted(family['samples'], key=lambda sample: sample[0])
+
+        if family['type'] != HISTOGRAM:
+            for labels, value in samples:
+                lines.append(f'{name}{__format_labels(names, labels)} {__format_value(value)}')
+            continue
+
+        bounds = [math.inf if bound == 'inf' else bound for bound in family['buckets']]
+        for labels, value in samples:
+            cumulative = 0
+            for bound, count in zip(bounds, value):
+                cumulative += count
+                bucket_labels = __format_labels(names + ('le',), tuple(labels) + (__format_value(bound),))
+                lines.append(f'{name}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{name}_sum{__format_labels(names, labels)} {__format_value(value[-1])}')
+            lines.append(f'{name}_count{__format_labels(names, labels)} {cumulative}')
+
+    return '\n'.join(lines) + '\n'
+
+class Metric(object):
+    """A metric family: a name, help text, label names, and a value per combination
+    of label values. Values are kept as they are updated, see :meth:`samples`.
+    """
+
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple=()):
+        """
+        :param str name: the metric name, e.g. ``postcode_search_duration_seconds``.
+        :param str documentation: the help text.
+        :param tuple labelnames: names of the labels, values are given in the same order.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def samples(self) -> dict:
+        """A copy of all values.
+
+        :return: values keyed by their tuple of label values.
+        :rtype: dict.
+        """
+        with self._lock:
+            return {labels: self._copy(value) for labels, value in self._values.items()}
+
+    def clear(self) -> None:
+        """Drop all values."""
+        with self._lock:
+            self._values.clear()
+
+    def _copy(self, value: object) -> object:
+        return value
+
+class Counter(Metric):
+    """A total which only goes up."""
+
+    kind = COUNTER
+
+    def inc(self, labels: tuple=(), amount: float=1) -> None:
+        """Add to the total of some label values.
+
+        :param tuple labels: the label values.
+        :param float amount: how much to add, 0 or more.
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set(self, labels: tuple, value: float) -> None:
+        """Set the total of some label values, counted elsewhere. For collectors.
+
+        :param tuple labels: the label values.
+        :param float value: the total so far.
+        """
+        with self._lock:
+            self._values[labels] = value
+
+class Gauge(Metric):
+    """A value which goes up and down. Set by collectors."""
+
+    kind = GAUGE
+
+    def set(self, labels: tuple, value: float) -> None:
+        """Set the value of some label values.
+
+        :param tuple labels: the label values.
+        :param float value: the current value.
+        """
+        with self._lock:
+            self._values[labels] = value
+
+class Histogram(Metric):
+    """Observations counted in buckets by their upper bound, with their sum and count."""
+
+    kind = HISTOGRAM
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple=(),
+                 buckets: tuple=DURATION_BUCKETS):
+        """
+        :param tuple buckets: upper bounds of the buckets, ascending. ``+Inf`` is added.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(float(bound) for bound in buckets if bound != math.inf) + (math.inf,)
+
+    def observe(self, value: float, labels: tuple=()) -> None:
+        """Count one observation.
+
+        :param float value: the observed value, e.g. a duration in seconds.
+        :param tuple labels: the label values.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry == None:
+                # Per bucket counts, not cumulative, then the sum.
+                entry = self._values[labels] = [0] * len(self.buckets) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def _copy(self, value: list) -> list:
+        return list(value)
+
+class MetricsRegistry(object):
+    """Metrics of a process, rendered on their own or merged with those of other
+    processes."""
+
+    def __init__(self):
+        self.__metrics = {}
+        self.__collectors = []
+        self.__lock = threading.Lock()
+
+        self.__directory = None
+        self.__flush_interval = 0
+        self.__next_flush = 0.0
+        self.__flush_lock = threading.Lock()
+        self.__at_exit = False
+
+        #: Whether instrumented code records anything. Off until metrics are configured.
+        self.enabled = False
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.__after_fork_in_child)
+
+    def __register(self, metric: Metric) -> Metric:
+        with self.__lock:
+            if metric.name in self.__metrics:
+                raise ValueError(f'Metric {metric.name!r} is already registered.')
+            self.__metrics[metric.name] = metric
+
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple=()) -> Counter:
+        """Register a :class:`Counter`."""
+        return self.__register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple=()) -> Gauge:
+        """Register a :class:`Gauge`."""
+        return self.__register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple=(),
+                  buckets: tuple=DURATION_BUCKETS) -> Histogram:
+        """Register a :class:`Histogram`."""
+        return self.__register(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, collect):
+        """Register a function without arguments, which sets counters and gauges of
+        values kept elsewhere. Called before values are rendered or written. Usable
+        as a decorator.
+
+        :return: ``collect``.
+        """
+        with self.__lock:
+            self.__collectors.append(collect)
+
+        return collect
+
+    def configure(self, directory: str=None, flush_interval: float=5) -> None:
+        """Turn recording on, in multiprocess mode or not.
+
+        :param str directory: the multiprocess directory, created if need be. None for
+            this process only.
+        :param float flush_interval: seconds between writes of this process's values to
+            its file, in multiprocess mode. 0 writes whenever :meth:`flush` is called.
+        """
+        if directory != None: os.makedirs(directory, exist_ok=True)
+
+        self.__directory = directory
+        self.__flush_interval = flush_interval
+        self.__next_flush = 0.0
+        self.enabled = True
+
+        if directory != None and not self.__at_exit:
+            atexit.register(self.__flush_at_exit)
+            self.__at_exit = True
+
+    @property
+    def directory(self) -> str:
+        """The multiprocess directory, None when not in multiprocess mode."""
+        return self.__directory
+
+    def __collect(self) -> None:
+        for collect in list(self.__collectors):
+            try:
+                collect()
+            except RuntimeError:
+                # Outside of an application context, e.g. on exit: keep the values last collected.
+                pass
+
+    def snapshot(self) -> dict:
+        """Collect, then copy all values of this process.
+
+        :return: metrics by name, each a dictionary of ``type``, ``help``, ``labelnames``,
+            ``buckets`` for histograms, and ``samples``, a list of label values and value
+            pairs. Serialisable as JSON.
+        :rtype: dict.
+        """
+        self.__collect()
+
+        with self.__lock:
+            metrics = list(self.__metrics.values())
+
+        snapshot = {}
+        for metric in metrics:
+            family = {
+                'type': metric.kind,
+                'help': metric.documentation,
+                'labelnames': list(metric.labelnames),
+                'samples': [[list(labels), value] for labels, value in metric.samples().items()],
+            }
+            if metric.kind == HISTOGRAM:
+                family['buckets'] = [bound if bound != math.inf else 'inf' for bound in metric.buckets]
+            snapshot[metric.name] = family
+
+        return snapshot
+
+    def flush(self, force: bool=False) -> bool:
+        """Write this process's values to its file in the multiprocess directory, at
+        most every ``flush_interval`` seconds. Cheap enough for every request.
+
+        :param bool force: write regardless of when the last write was.
+
+        :return: whether the file was written.
+        :rtype: bool.
+        """
+        if self.__directory == None: return False
+        if not force and time.monotonic() < self.__next_flush: return False
+
+        # Another thread is writing already.
+        if not self.__flush_lock.acquire(blocking=force): return False
+        try:
+            self.__next_flush = time.monotonic() + self.__flush_interval
+
+            file_name = os.path.join(self.__directory, PROCESS_FILE_PATTERN.format(os.getpid()))
+            temp_name = f'{file_name}.tmp'
+            with open(temp_name, 'w') as file:
+                json.dump({'pid': os.getpid(), 'metrics': self.snapshot()}, file)
+            os.replace(temp_name, file_name)
+        finally:
+            self.__flush_lock.release()
+
+        return True
+
+    def __flush_at_exit(self) -> None:
+        try:
+            self.flush(True)
+        except OSError:
+            # The directory is gone already.
+            pass
+
+    def __read_processes(self) -> list:
+        """This process's values, and those other processes last wrote."""
+        snapshots = [(os.getpid(), self.snapshot())]
+        if self.__directory == None: return snapshots
+
+        own = PROCESS_FILE_PATTERN.format(os.getpid())
+        for file_name in sorted(glob.glob(os.path.join(self.__directory, PROCESS_FILE_PATTERN.format('*')))):
+            if os.path.basename(file_name) == own: continue
+            try:
+                with open(file_name) as file:
+                    content = json.load(file)
+                snapshots.append((content['pid'], content['metrics']))
+            except (OSError, ValueError, KeyError):
+                # Being replaced, or left over from a crash: skip it.
+                continue
+
+        return snapshots
+
+    @staticmethod
+    def __pid_alive(pid: int) -> bool:
+        """Whether a process is still running. On Windows, where signal 0 would end it,
+        always True."""
+        if pid == os.getpid() or os.name == 'nt': return True
+
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            # Alive, owned by someone else.
+            return True
+
+        return True
+
+    def merged(self) -> dict:
+        """Values of all processes, in the layout of :meth:`snapshot`: counters and
+        histograms summed, gauges of live processes with a ``pid`` label added in
+        multiprocess mode.
+
+        :rtype: dict.
+        """
+        multiprocess = self.__directory != None
+        merged = {}
+        alive = {}
+
+        for pid, snapshot in self.__read_processes():
+            for name, family in snapshot.items():
+                target = merged.get(name)
+                if target == None:
+                    target = merged[name] = dict(family, samples={})
+                    if multiprocess and family['type'] == GAUGE:
+                        target['labelnames'] = family['labelnames'] + ['pid']
+
+                if family['type'] == GAUGE:
+                    if multiprocess:
+                        if pid not in alive: alive[pid] = self.__pid_alive(pid)
+                        if not alive[pid]: continue
+                    for labels, value in family['samples']:
+                        key = tuple(labels) + ((str(pid),) if multiprocess else ())
+                        target['samples'][key] = value
+                    continue
+
+                for labels, value in family['samples']:
+                    key = tuple(labels)
+                    total = target['samples'].get(key)
+                    if total == None:
+                        target['samples'][key] = value
+                    elif family['type'] == HISTOGRAM:
+                        target['samples'][key] = [a + b for a, b in zip(total, value)]
+                    else:
+                        target['samples'][key] = total + value
+
+        for family in merged.values():
+            family['samples'] = [[list(labels), value] for labels, value in family['samples'].items()]
+
+        return merged
+
+    def render(self) -> str:
+        """Render the values of all processes in the text exposition format, writing
+        this process's first in multiprocess mode.
+
+        :rtype: str.
+        """
+        self.flush()
+
+        return render_families(self.merged())
+
+    def clear(self) -> None:
+        """Drop the values of this process. Metrics stay registered."""
+        with self.__lock:
+            metrics = list(self.__metrics.values())
+
+        for metric in metrics: metric.clear()
+
+    def __after_fork_in_child(self) -> None:
+        # Whatever the parent recorded, the parent reports.
+        self.__flush_lock = threading.Lock()
+        self.__next_flush = 0.0
+        self.clear()
+
+#: The registry of this process.
+registry = MetricsRegistry()
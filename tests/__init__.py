@@ -3,10 +3,34 @@ Tests helper functions.
 """
 
 import os
+import json
+
+#: Postcodes the tests load, in the source's record format and in pool order, 
+#: rather than the instance folder's.
+POSTCODES_FILE = os.path.join(os.path.dirname(__file__), 'data', 'australian_postcodes.json')
 
 def database_filename(app):
     return os.path.join(app.instance_path, '', app.config['DATABASE'])
 
+def fixture_postcodes() -> list:
+    """The postcode records of ``POSTCODES_FILE``: ``locality``, ``state``, 
+    ``postcode``, ``lat`` and ``long``, 0 and 0 when unknown, as the source has them.
+
+    :rtype: list.
+    """
+    with open(POSTCODES_FILE) as file:
+        return json.load(file)
+
+def fixture_rows() -> list:
+    """The postcode records of ``POSTCODES_FILE`` as ``(locality, state, postcode, 
+    latitude, longitude)`` rows, latitude and longitude None when unknown.
+
+    :rtype: list.
+    """
+    return [(itm['locality'], itm['state'], itm['postcode']) 
+            + ((None, None) if itm['lat'] == 0 and itm['long'] == 0 else (itm['lat'], itm['long']))
+            for itm in fixture_postcodes()]
+
 def search_postcode(list: list, locality: str, state: str, postcode: str) -> bool:
     found = False
     for pc in list:
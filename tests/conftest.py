@@ -1,21 +1,67 @@
 """pytest entry.
+
+Tests which need PostgreSQL take the postgres() fixture, and are skipped when it
+cannot be reached. Everything else runs offline: postcodes are loaded from the 
+checked-in ./tests/data/australian_postcodes.json, which the postcode_files() 
+fixture writes to a snapshot and a SQLite database in a temporary directory, as
+``flask update-postcode`` writes them to the instance folder.
 """
 
+import os
+import threading
+
+from array import array
+from functools import partial
+from http import HTTPStatus
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import psycopg2
 import pytest
 
-from bh_aust_postcode import create_app
+from src.bh_aust_postcode import create_app
+from src.bh_aust_postcode.config import get_config, get_database_connection
 
-from bh_aust_postcode.api.postcode_pool import (
+from src.bh_aust_postcode.api.compact_postcodes import CompactPostcodes, coordinate_rows
+from src.bh_aust_postcode.api.postcode_snapshot import write_snapshot
+from src.bh_aust_postcode.api.sqlite_backend import write_sqlite
+from src.bh_aust_postcode.api.postcode_pool import (
     PostcodePool,
     postcode_pool,
     load_postcode,
 )
 
-from tests import database_filename
+from tests import (
+    database_filename,
+    fixture_postcodes,
+    fixture_rows,
+)
+
+@pytest.fixture(scope='session')
+def postcode_files(tmp_path_factory):
+    """The fixture postcodes, written to a snapshot and a SQLite database in a 
+    temporary directory.
+
+    :return: configuration ``POSTCODE_SNAPSHOT_FILE`` and ``SQLITE_DATABASE_FILE``, 
+        full paths, which are used as they are.
+    :rtype: dict.
+    """
+
+    directory = tmp_path_factory.mktemp('instance')
+    files = {'POSTCODE_SNAPSHOT_FILE': str(directory / 'postcodes.snapshot'),
+             'SQLITE_DATABASE_FILE': str(directory / 'postcodes.sqlite3')}
+
+    coordinates = array('d')
+    postcodes = CompactPostcodes.from_rows(coordinate_rows(fixture_rows(), coordinates))
+    write_snapshot(files['POSTCODE_SNAPSHOT_FILE'], postcodes, get_config().FUZZY_MAX_DISTANCE, 
+                   coordinates)
+    write_sqlite(files['SQLITE_DATABASE_FILE'], postcodes, coordinates)
+
+    return files
 
 @pytest.fixture(scope='module')
-def app():
+def app(postcode_files):
     app = create_app()
+    app.config.update(postcode_files, SEARCH_BACKEND='memory')
 
     app.app_context().push()
 
@@ -34,4 +80,68 @@ def ensure_postcodes_loaded(app):
     """
     
     load_postcode()
-    assert postcode_pool.count >= 18000
+    assert postcode_pool.count == len(fixture_postcodes())
+
+@pytest.fixture(scope='session')
+def postgres():
+    """Skip the test when PostgreSQL cannot be reached.
+    """
+
+    try:
+        connection = psycopg2.connect(connect_timeout=3, **get_database_connection())
+    except psycopg2.Error as error:
+        pytest.skip(f'PostgreSQL is not available: {str(error).splitlines()[0]}')
+
+    connection.close()
+
+class QuietHTTPRequestHandler(SimpleHTTPRequestHandler):
+    """Serves files without logging each request to stderr. 
+    
+    Files also get an ETag, from their modification time and size, and are not sent 
+    again when it matches If-None-Match. If-Modified-Since is handled by the base class.
+    """
+
+    etag = None
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            self.etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+            if self.headers.get('If-None-Match') == self.etag:
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.end_headers()
+                return None
+
+        return super().send_head()
+
+    def end_headers(self):
+        if self.etag: self.send_header('ETag', self.etag)
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def http_server(tmp_path):
+    """A local HTTP stand-in for the source postcodes server.
+
+    Serves the files written to the yielded directory.
+
+    :return: the base URL, e.g. ``http://127.0.0.1:54321``, and the served directory.
+    :rtype: tuple.
+    """
+
+    directory = tmp_path / 'www'
+    directory.mkdir()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), 
+                                 partial(QuietHTTPRequestHandler, directory=str(directory)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}', directory
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -11,6 +11,8 @@ loads postcodes for testing.
 It gets called repeatedly for each test method, however, the loading only carried out
 only once.
 """
+import gzip
+
 from http import HTTPStatus
 import pytest
 import simplejson as json
@@ -40,3 +42,347 @@ def test_locality_search_endpoints(ensure_postcodes_loaded, app, test_client):
 
     found = search_postcode(localities, 'SPRINGVALE', 'VIC', '3171')
     assert found == True
+
+@pytest.mark.api_endpoints
+def test_locality_prefix_search_endpoints(ensure_postcodes_loaded, app, test_client):
+    """Test end point such as 
+    http://localhost:5000/api/v0/aust-postcode/prefix/springva
+    """
+
+    response = test_client.get('/api/v0/aust-postcode/prefix/springva')
+
+    assert response != None
+    assert response.status_code == HTTPStatus.OK.value
+
+    status = json.loads(response.get_data(as_text=True))
+
+    assert status['status']['code'] == HTTPStatus.OK.value
+
+    localities = status['data']['localities']
+    found = search_postcode(localities, 'SPRINGVALE', 'VIC', '3171')
+    assert found == True
+
+@pytest.mark.api_endpoints
+def test_locality_search_endpoints_etag(ensure_postcodes_loaded, app, test_client):
+    """Test a response can be revalidated with its ETag.
+    """
+
+    response = test_client.get('/api/v0/aust-postcode/springva')
+    assert response.status_code == HTTPStatus.OK.value
+
+    etag = response.headers.get('ETag')
+    assert etag != None
+
+    response_2 = test_client.get('/api/v0/aust-postcode/springva', 
+                                 headers={'If-None-Match': etag})
+    assert response_2.status_code == HTTPStatus.NOT_MODIFIED.value
+    assert response_2.headers.get('ETag') == etag
+    assert len(response_2.get_data()) == 0
+
+    # Another spelling has its own ETag: error bodies echo the search text as spelt.
+    response_3 = test_client.get('/api/v0/aust-postcode/SpringVa', 
+                                 headers={'If-None-Match': etag})
+    assert response_3.status_code == HTTPStatus.OK.value
+    assert response_3.get_data() == response.get_data()
+
+@pytest.mark.api_endpoints
+def test_locality_search_endpoints_page(ensure_postcodes_loaded, app, test_client):
+    """Test end point such as 
+    http://localhost:5000/api/v0/aust-postcode/spring?offset=5&limit=10&total=true
+    """
+
+    response = test_client.get('/api/v0/aust-postcode/spring')
+    localities = json.loads(response.get_data(as_text=True))['data']['localities']
+
+    response = test_client.get('/api/v0/aust-postcode/spring?offset=5&limit=10&total=true')
+    assert response.status_code == HTTPStatus.OK.value
+    assert response.headers.get('X-Total-Count') == str(len(localities))
+
+    status = json.loads(response.get_data(as_text=True))
+    assert status['data']['localities'] == localities[5:15]
+
+    response = test_client.get('/api/v0/aust-postcode/spring?limit=-1')
+    assert response.status_code == HTTPStatus.BAD_REQUEST.value
+
+@pytest.mark.api_endpoints
+def test_locality_search_endpoints_stream(ensure_postcodes_loaded, app, test_client):
+    """Test end point such as 
+    http://localhost:5000/api/v0/aust-postcode/spring?stream=true
+    """
+
+    response = test_client.get('/api/v0/aust-postcode/spring')
+    localities = json.loads(response.get_data(as_text=True))['data']['localities']
+
+    response = test_client.get('/api/v0/aust-postcode/spring?stream=true')
+    assert response.status_code == HTTPStatus.OK.value
+    assert response.mimetype == 'application/x-ndjson'
+
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == localities
+
+@pytest.mark.api_endpoints
+def test_locality_search_endpoints_batch(ensure_postcodes_loaded, app, test_client):
+    """Test end point
+    POST http://localhost:5000/api/v0/aust-postcode/batch
+    """
+
+    response = test_client.post('/api/v0/aust-postcode/batch', json={
+        'localities': [{'locality': 'springvale', 'state': 'vic'}, {'locality': 'xyz'}]
+    })
+    assert response.status_code == HTTPStatus.OK.value
+
+    status = json.loads(response.get_data(as_text=True))
+    assert status['status']['code'] == HTTPStatus.OK.value
+
+    results = status['data']['results']
+    assert len(results) == 2
+
+    found = search_postcode(results[0]['data']['localities'], 'SPRINGVALE', 'VIC', '3171')
+    assert found == True
+    assert results[1]['status']['code'] == HTTPStatus.NOT_FOUND.value
+
+    # A locality item without locality does not pass the request model.
+    response = test_client.post('/api/v0/aust-postcode/batch', json={
+        'localities': [{'state': 'vic'}]
+    })
+    assert response.status_code == HTTPStatus.BAD_REQUEST.value
+
+    # 'batch' is still a locality to GET.
+    response = test_client.get('/api/v0/aust-postcode/batch')
+    assert response.status_code == HTTPStatus.OK.value
+
+@pytest.mark.api_endpoints
+def test_postcode_search_endpoints(ensure_postcodes_loaded, app, test_client):
+    """Test end point such as 
+    http://localhost:5000/api/v0/aust-postcode/by-postcode/3171
+    """
+
+    response = test_client.get('/api/v0/aust-postcode/by-postcode/3171')
+    assert response.status_code == HTTPStatus.OK.value
+
+    status = json.loads(response.get_data(as_text=True))
+    assert status['status']['code'] == HTTPStatus.OK.value
+
+    found = search_postcode(status['data']['localities'], 'SPRINGVALE', 'VIC', '3171')
+    assert found == True
+
+    response = test_client.get('/api/v0/aust-postcode/by-postcode/317')
+    status = json.loads(response.get_data(as_text=True))
+    assert status['status']['code'] == HTTPStatus.BAD_REQUEST.value
+
+@pytest.mark.api_endpoints
+def test_locality_search_endpoints_state(ensure_postcodes_loaded, app, test_client):
+    """Test end point such as 
+    http://localhost:5000/api/v0/aust-postcode/spring?state=vic
+    """
+
+    response = test_client.get('/api/v0/aust-postcode/spring?state=vic&total=true')
+    assert response.status_code == HTTPStatus.OK.value
+
+    localities = json.loads(response.get_data(as_text=True))['data']['localities']
+    assert len(localities) > 0
+    assert all(pc['state'] == 'VIC' for pc in localities)
+    assert response.headers.get('X-Total-Count') == str(len(localities))
+
+    # Each state has its own response.
+    response_2 = test_client.get('/api/v0/aust-postcode/spring?state=nsw')
+    assert response_2.headers.get('ETag') != response.headers.get('ETag')
+
+@pytest.mark.api_endpoints
+def test_locality_fuzzy_search_endpoints(ensure_postcodes_loaded, app, test_client):
+    """Test end point such as 
+    http://localhost:5000/api/v0/aust-postcode/fuzzy/springvail?distance=2
+    """
+
+    if app.config['FUZZY_MAX_DISTANCE'] < 2: pytest.skip('Fuzzy search distance is below 2.')
+
+    response = test_client.get('/api/v0/aust-postcode/fuzzy/springvail?distance=2')
+    assert response.status_code == HTTPStatus.OK.value
+
+    status = json.loads(response.get_data(as_text=True))
+    assert status['status']['code'] == HTTPStatus.OK.value
+
+    found = search_postcode(status['data']['localities'], 'SPRINGVALE', 'VIC', '3171')
+    assert found == True
+
+    response = test_client.get('/api/v0/aust-postcode/fuzzy/springvail?distance=1')
+    status = json.loads(response.get_data(as_text=True))
+    found = search_postcode(status.get('data', {}).get('localities', []), 'SPRINGVALE', 'VIC', '3171')
+    assert found == False
+
+@pytest.mark.api_endpoints
+def test_admin_reload_endpoint(ensure_postcodes_loaded, app, test_client, monkeypatch):
+    """Reloading needs the admin token, and publishes a new generation.
+    """
+
+    from src.bh_aust_postcode.api.postcode_pool import postcode_pool
+
+    url = '/api/v0/aust-postcode/admin/reload'
+
+    monkeypatch.setitem(app.config, 'ADMIN_TOKEN', '')
+    response = test_client.post(url, headers={'Authorization': 'Bearer '})
+    assert response.status_code == HTTPStatus.FORBIDDEN.value
+
+    monkeypatch.setitem(app.config, 'ADMIN_TOKEN', 'secret-token')
+    for headers in [{}, {'Authorization': 'Bearer wrong'}, {'Authorization': 'Basic secret-token'}]:
+        response = test_client.post(url, headers=headers)
+        assert response.status_code == HTTPStatus.UNAUTHORIZED.value
+        status = json.loads(response.get_data(as_text=True))
+        assert status['status']['code'] == HTTPStatus.UNAUTHORIZED.value
+
+    generation = postcode_pool.generation
+    response = test_client.post(url, headers={'Authorization': 'Bearer secret-token'})
+    assert response.status_code == HTTPStatus.OK.value
+
+    reload = json.loads(response.get_data(as_text=True))['data']['reload']
+    assert reload['generation'] == generation + 1 == postcode_pool.generation
+    assert reload['postcodes'] == postcode_pool.count
+    assert reload['delta'] == 0
+
+@pytest.mark.api_endpoints
+def test_locality_search_endpoints_gzip(ensure_postcodes_loaded, app, test_client):
+    """Test responses are compressed per Accept-Encoding, each representation with 
+    its own ETag, and small responses are not.
+    """
+
+    if 'gzip' not in app.config['COMPRESSION_ENCODINGS']: pytest.skip('gzip is disabled.')
+
+    response = test_client.get('/api/v0/aust-postcode/spring')
+    assert response.headers.get('Content-Encoding') == None
+    assert 'Accept-Encoding' in response.vary
+
+    headers = {'Accept-Encoding': 'gzip;q=1.0, br;q=0.5'}
+    response_2 = test_client.get('/api/v0/aust-postcode/spring', headers=headers)
+    assert response_2.status_code == HTTPStatus.OK.value
+    assert response_2.headers.get('Content-Encoding') == 'gzip'
+    assert 'Accept-Encoding' in response_2.vary
+    assert gzip.decompress(response_2.get_data()) == response.get_data()
+    assert len(response_2.get_data()) < len(response.get_data()) / 4
+
+    etag = response_2.headers.get('ETag')
+    assert etag != response.headers.get('ETag')
+
+    # Cached compressed: the same bytes again.
+    response_3 = test_client.get('/api/v0/aust-postcode/spring', headers=headers)
+    assert response_3.get_data() == response_2.get_data()
+
+    response_4 = test_client.get('/api/v0/aust-postcode/spring', 
+                                 headers={**headers, 'If-None-Match': etag})
+    assert response_4.status_code == HTTPStatus.NOT_MODIFIED.value
+    # The uncompressed representation is another one.
+    response_5 = test_client.get('/api/v0/aust-postcode/spring', 
+                                 headers={'If-None-Match': etag})
+    assert response_5.status_code == HTTPStatus.OK.value
+
+    # Not accepted.
+    response_6 = test_client.get('/api/v0/aust-postcode/spring', 
+                                 headers={'Accept-Encoding': 'gzip;q=0'})
+    assert response_6.headers.get('Content-Encoding') == None
+
+    # Under COMPRESSION_MIN_SIZE.
+    response_7 = test_client.get('/api/v0/aust-postcode/xyz', headers=headers)
+    assert len(response_7.get_data()) < app.config['COMPRESSION_MIN_SIZE']
+    assert response_7.headers.get('Content-Encoding') == None
+
+    # Not cached responses are compressed on the way out.
+    batch = {'localities': [{'locality': 'spring'}, {'locality': 'mount'}]}
+    response_8 = test_client.post('/api/v0/aust-postcode/batch', json=batch, headers=headers)
+    assert response_8.headers.get('Content-Encoding') == 'gzip'
+    status = json.loads(gzip.decompress(response_8.get_data()))
+    assert status['status']['code'] == HTTPStatus.OK.value
+
+    # Streams are not.
+    response_9 = test_client.get('/api/v0/aust-postcode/spring?stream=true', headers=headers)
+    assert response_9.headers.get('Content-Encoding') == None
+
+@pytest.mark.api_endpoints
+def test_locality_search_endpoints_brotli(ensure_postcodes_loaded, app, test_client):
+    """Test brotli is preferred when installed and accepted.
+    """
+
+    brotli = pytest.importorskip('brotli')
+    if 'br' not in app.config['COMPRESSION_ENCODINGS']: pytest.skip('br is disabled.')
+
+    response = test_client.get('/api/v0/aust-postcode/spring')
+    response_2 = test_client.get('/api/v0/aust-postcode/spring', 
+                                 headers={'Accept-Encoding': 'gzip, deflate, br'})
+    assert response_2.headers.get('Content-Encoding') == 'br'
+    assert brotli.decompress(response_2.get_data()) == response.get_data()
+
+@pytest.mark.api_endpoints
+def test_bundle_endpoints(ensure_postcodes_loaded, app, test_client, monkeypatch):
+    """Test end points
+    http://localhost:5000/api/v0/aust-postcode/bundle.json and
+    http://localhost:5000/api/v0/aust-postcode/bundle/<version>.json
+    """
+
+    response = test_client.get('/api/v0/aust-postcode/bundle.json')
+    assert response.status_code == HTTPStatus.OK.value
+    assert response.headers.get('Cache-Control') == 'no-cache'
+
+    bundle = json.loads(response.get_data(as_text=True))['data']['bundle']
+    version = bundle['version']
+    assert response.headers.get('Content-Location') == f'bundle/{version}.json'
+
+    etag = response.headers.get('ETag')
+    response_2 = test_client.get('/api/v0/aust-postcode/bundle.json', 
+                                 headers={'If-None-Match': etag})
+    assert response_2.status_code == HTTPStatus.NOT_MODIFIED.value
+
+    response_3 = test_client.get(f'/api/v0/aust-postcode/bundle/{version}.json')
+    assert response_3.status_code == HTTPStatus.OK.value
+    assert response_3.get_data() == response.get_data()
+    assert 'immutable' in response_3.headers.get('Cache-Control')
+
+    response_4 = test_client.get('/api/v0/aust-postcode/bundle/0123abcd.json')
+    assert response_4.status_code == HTTPStatus.NOT_FOUND.value
+
+    # 'bundle' is still a locality to search.
+    response_5 = test_client.get('/api/v0/aust-postcode/bundle')
+    status = json.loads(response_5.get_data(as_text=True))
+    assert status['status']['code'] == HTTPStatus.NOT_FOUND.value
+    assert 'bundle' in status['status']['text']
+
+    monkeypatch.setitem(app.config, 'SEARCH_BACKEND', 'sqlite')
+    response_6 = test_client.get('/api/v0/aust-postcode/bundle.json')
+    assert response_6.status_code == HTTPStatus.NOT_FOUND.value
+
+@pytest.mark.api_endpoints
+def test_near_endpoint(ensure_postcodes_loaded, test_client):
+    """Test end point
+    http://localhost:5000/api/v0/aust-postcode/near?lat=-37.95&lon=145.15&k=5
+    """
+
+    from src.bh_aust_postcode.api.bro import search_by_locality
+    from src.bh_aust_postcode.api.postcode_pool import postcode_pool
+    if not postcode_pool.has_coordinates: pytest.skip('Postcodes have no coordinates.')
+
+    response = test_client.get('/api/v0/aust-postcode/near?lat=-37.95&lon=145.15&k=5')
+    assert response.status_code == HTTPStatus.OK.value
+
+    status = json.loads(response.get_data(as_text=True))
+    assert status['status']['code'] == HTTPStatus.OK.value
+    localities = status['data']['localities']
+    assert [(pc['locality'], pc['postcode']) for pc in localities] == \
+        [(pc['locality'], pc['postcode']) for pc in postcode_pool.search_near(-37.95, 145.15, 5)]
+
+    response = test_client.get('/api/v0/aust-postcode/near?lat=-37.95&lon=145.15&radius=5')
+    status = json.loads(response.get_data(as_text=True))
+    assert all(pc['distance'] <= 5 for pc in status['data'].get('localities', []))
+
+    response = test_client.get('/api/v0/aust-postcode/near?lat=-95&lon=145.15')
+    status = json.loads(response.get_data(as_text=True))
+    assert status['status']['code'] == HTTPStatus.BAD_REQUEST.value
+
+    response = test_client.get('/api/v0/aust-postcode/near?lat=north&lon=145.15')
+    assert response.status_code == HTTPStatus.BAD_REQUEST.value
+
+    # Always a search by distance, never the partial search for 'near'.
+    for query in ['', '?k=5', '?lat=-37.95', '?lon=145.15']:
+        response = test_client.get(f'/api/v0/aust-postcode/near{query}')
+        status = json.loads(response.get_data(as_text=True))
+        assert status['status']['code'] == HTTPStatus.BAD_REQUEST.value
+
+    response = test_client.get('/api/v0/aust-postcode/NEAR')
+    status = json.loads(response.get_data(as_text=True))
+    assert status == json.loads(json.dumps(search_by_locality('NEAR')))
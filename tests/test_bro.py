@@ -13,7 +13,21 @@ from http import HTTPStatus
 
 import pytest
 
-from bh_aust_postcode.api.bro import search_by_locality
+from src.bh_aust_postcode.api.bro import (
+    search_by_locality,
+    search_by_locality_prefix,
+    search_by_localities,
+    search_by_postcode,
+    search_by_locality_fuzzy,
+    count_by_locality,
+    search_cache_info,
+    stream_by_locality,
+    bundle_version,
+    postcode_bundle,
+    search_near,
+    NEAR_DEFAULT_COUNT,
+)
+from src.bh_aust_postcode.api.postcode_pool import postcode_pool
 
 from tests import search_postcode
 
@@ -64,4 +78,254 @@ def test_bro_search_by_locality_invalid_02(ensure_postcodes_loaded):
     status = search_by_locality('%^& Spring')
 
     assert status['status']['code'] == HTTPStatus.BAD_REQUEST.value
-        
\ No newline at end of file
+
+@pytest.mark.bro
+def test_bro_search_by_locality_prefix(ensure_postcodes_loaded):
+    """Search for localities which start with a text.
+    """
+
+    status = search_by_locality_prefix('springva')
+
+    assert status['status']['code'] == HTTPStatus.OK.value
+
+    localities = status['data']['localities']
+    assert all(pc['locality'].startswith('SPRINGVA') for pc in localities) == True
+
+    found = search_postcode(localities, 'SPRINGVALE', 'VIC', '3171')
+    assert found == True
+
+    status = search_by_locality_prefix('xyz')
+    assert status['status']['code'] == HTTPStatus.NOT_FOUND.value
+
+    status = search_by_locality_prefix('Sp')
+    assert status['status']['code'] == HTTPStatus.BAD_REQUEST.value
+
+    status = search_by_locality_prefix('%^& Spring')
+    assert status['status']['code'] == HTTPStatus.BAD_REQUEST.value
+
+@pytest.mark.bro
+def test_bro_search_cache(ensure_postcodes_loaded):
+    """Repeated searches are served from the cache, until postcodes are reloaded.
+    """
+
+    if not search_cache_info(): pytest.skip('Search results cache is disabled.')
+
+    status = search_by_locality('springvale')
+    info = search_cache_info()
+
+    assert search_by_locality('SpringVale') is status
+    assert search_cache_info()['hits'] == info['hits'] + 1
+
+    # No matches are cached, and still echo the search text as spelt.
+    search_by_locality('qxzq')
+    status = search_by_locality('QXZQ')
+    assert status['status']['code'] == HTTPStatus.NOT_FOUND.value
+    assert "'QXZQ'" in status['status']['text']
+    assert search_cache_info()['hits'] == info['hits'] + 2
+
+    result, _ = postcode_pool.load(force_reload=True)
+    assert result == True
+
+    reloaded = search_by_locality('springvale')
+    assert reloaded['status']['code'] == HTTPStatus.OK.value
+    assert search_by_locality('springvale') is reloaded
+    assert search_cache_info()['generation'] == postcode_pool.generation
+
+@pytest.mark.bro
+def test_bro_search_by_locality_page(ensure_postcodes_loaded):
+    """Search a page of localities, and invalid pages.
+    """
+
+    localities = search_by_locality('spring')['data']['localities']
+
+    status = search_by_locality('spring', 2, 5)
+    assert status['status']['code'] == HTTPStatus.OK.value
+    assert status['data']['localities'] == localities[2:7]
+
+    assert list(stream_by_locality('spring', 2, 5)) == localities[2:7]
+
+    status = search_by_locality('spring', -1, 5)
+    assert status['status']['code'] == HTTPStatus.BAD_REQUEST.value
+
+    status = search_by_locality('spring', 0, 0)
+    assert status['status']['code'] == HTTPStatus.BAD_REQUEST.value
+
+    status = list(stream_by_locality('xyz'))
+    assert len(status) == 1
+    assert status[0]['status']['code'] == HTTPStatus.NOT_FOUND.value
+
+
+@pytest.mark.bro
+def test_bro_search_by_localities(ensure_postcodes_loaded, app):
+    """Search many localities at once, each with its own result.
+    """
+
+    status = search_by_localities([
+        {'locality': 'springvale'},
+        {'locality': 'spring', 'state': 'vic'},
+        {'locality': 'xyz'},
+        {'locality': 'Sp'},
+        {'locality': 'springvale', 'state': 'ZZ'},
+        {'locality': 'spring', 'state': 'Victoria'},
+        {'locality': 'springvale'},
+    ])
+    assert status['status']['code'] == HTTPStatus.OK.value
+
+    results = status['data']['results']
+    assert len(results) == 7
+
+    assert results[0] == search_by_locality('springvale')
+
+    localities = results[1]['data']['localities']
+    assert len(localities) > 0
+    assert all(pc['state'] == 'VIC' for pc in localities)
+    assert [pc for pc in search_by_locality('spring')['data']['localities']
+            if pc['state'] == 'VIC'] == localities
+
+    assert results[2]['status']['code'] == HTTPStatus.NOT_FOUND.value
+    assert results[3]['status']['code'] == HTTPStatus.BAD_REQUEST.value
+    assert results[4]['status']['code'] == HTTPStatus.NOT_FOUND.value
+    assert results[5]['status']['code'] == HTTPStatus.BAD_REQUEST.value
+    assert results[6] == results[0]
+
+    # Spellings share a search, errors and no matches echo their own.
+    status = search_by_localities([{'locality': 'xyz'}, {'locality': 'XYZ'}, 
+                                   {'locality': 'SpringVale', 'state': 'Vic'}])
+    results = status['data']['results']
+    assert results[0]['status']['text'] == "No localities matched 'xyz'"
+    assert results[1]['status']['text'] == "No localities matched 'XYZ'"
+    assert results[2] == search_by_locality('springvale', state='VIC')
+
+    status = search_by_localities([])
+    assert status['status']['code'] == HTTPStatus.BAD_REQUEST.value
+
+    too_many = [{'locality': 'spring'}] * (app.config['BATCH_MAX_SIZE'] + 1)
+    status = search_by_localities(too_many)
+    assert status['status']['code'] == HTTPStatus.BAD_REQUEST.value
+
+@pytest.mark.bro
+def test_bro_search_by_postcode(ensure_postcodes_loaded):
+    """Search localities which have a postcode, and invalid postcodes.
+    """
+
+    status = search_by_postcode('3171')
+    assert status['status']['code'] == HTTPStatus.OK.value
+    assert all(pc['postcode'] == '3171' for pc in status['data']['localities'])
+
+    found = search_postcode(status['data']['localities'], 'SPRINGVALE', 'VIC', '3171')
+    assert found == True
+
+    status = search_by_postcode('0001')
+    assert status['status']['code'] == HTTPStatus.NOT_FOUND.value
+
+    for postcode in ['317', '31711', 'abcd']:
+        status = search_by_postcode(postcode)
+        assert status['status']['code'] == HTTPStatus.BAD_REQUEST.value
+
+@pytest.mark.bro
+def test_bro_search_by_locality_state(ensure_postcodes_loaded):
+    """Search localities in a state, and invalid states.
+    """
+
+    localities = search_by_locality('spring')['data']['localities']
+    expected = [pc for pc in localities if pc['state'] == 'VIC']
+
+    status = search_by_locality('spring', state='vic')
+    assert status['status']['code'] == HTTPStatus.OK.value
+    assert status['data']['localities'] == expected
+    assert count_by_locality('spring', 'Vic') == len(expected)
+    assert list(stream_by_locality('spring', 1, 3, 'VIC')) == expected[1:4]
+
+    status = search_by_locality('spring', state='ZZ')
+    assert status['status']['code'] == HTTPStatus.NOT_FOUND.value
+
+    status = search_by_locality('spring', state='Victoria')
+    assert status['status']['code'] == HTTPStatus.BAD_REQUEST.value
+    assert count_by_locality('spring', 'Victoria') == 0
+
+@pytest.mark.bro
+def test_bro_search_by_locality_fuzzy(ensure_postcodes_loaded, app):
+    """Search misspelt localities, and invalid distances.
+    """
+
+    max_distance = app.config['FUZZY_MAX_DISTANCE']
+    if max_distance == 0:
+        status = search_by_locality_fuzzy('springvail')
+        assert status['status']['code'] == HTTPStatus.BAD_REQUEST.value
+        return
+
+    status = search_by_locality_fuzzy('springvail')
+    assert status['status']['code'] == HTTPStatus.OK.value
+    assert status['data']['localities'][0]['locality'] == 'SPRINGVALE'
+
+    status = search_by_locality_fuzzy('Sprignvale', 1)
+    assert status['status']['code'] == HTTPStatus.OK.value
+    assert status['data']['localities'][0]['locality'] == 'SPRINGVALE'
+
+    status = search_by_locality_fuzzy('qxzqxzq')
+    assert status['status']['code'] == HTTPStatus.NOT_FOUND.value
+
+    status = search_by_locality_fuzzy('springvail', max_distance + 1)
+    assert status['status']['code'] == HTTPStatus.BAD_REQUEST.value
+
+    status = search_by_locality_fuzzy('Sp')
+    assert status['status']['code'] == HTTPStatus.BAD_REQUEST.value
+
+@pytest.mark.bro
+def test_bro_postcode_bundle(ensure_postcodes_loaded, app, monkeypatch):
+    """The bundle holds every postcode of the pool, in pool order, and is only 
+    available from the memory search backend.
+    """
+
+    status = postcode_bundle()
+    assert status['status']['code'] == HTTPStatus.OK.value
+
+    bundle = status['data']['bundle']
+    assert bundle['version'] == bundle_version() == postcode_pool.version
+    assert bundle['count'] == postcode_pool.count
+    assert len(bundle['localities']) == len(set(bundle['localities']))
+
+    localities, states = bundle['localities'], bundle['states']
+    postcodes = [{'locality': localities[locality], 'state': states[state], 'postcode': postcode}
+                 for locality, state, postcode in bundle['postcodes']]
+    assert postcodes == list(postcode_pool.postcodes)
+
+    monkeypatch.setitem(app.config, 'SEARCH_BACKEND', 'postgres')
+    assert bundle_version() == None
+    assert postcode_bundle()['status']['code'] == HTTPStatus.NOT_FOUND.value
+
+@pytest.mark.bro
+def test_bro_search_near(ensure_postcodes_loaded, app, monkeypatch):
+    """Nearest localities come nearest first, within radius, and searches are validated.
+    """
+
+    if not postcode_pool.has_coordinates: pytest.skip('Postcodes have no coordinates.')
+
+    status = search_near(-37.95, 145.15)
+    assert status['status']['code'] == HTTPStatus.OK.value
+
+    localities = status['data']['localities']
+    assert len(localities) == NEAR_DEFAULT_COUNT
+    distances = [locality['distance'] for locality in localities]
+    assert distances == sorted(distances)
+    assert all(set(locality) == {'locality', 'state', 'postcode', 'latitude', 'longitude', 'distance'}
+               for locality in localities)
+
+    within = search_near(-37.95, 145.15, radius=distances[-1])['data']['localities']
+    assert len(within) >= NEAR_DEFAULT_COUNT
+    assert all(locality['distance'] <= distances[-1] for locality in within)
+    assert search_near(-37.95, 145.15, 3, distances[-1])['data']['localities'] == localities[:3]
+
+    # Middle of the Southern Ocean.
+    status = search_near(-60.0, 100.0, radius=1)
+    assert status['status']['code'] == HTTPStatus.NOT_FOUND.value
+
+    for latitude, longitude, k, radius in [(-91, 145, None, None), (-37, 181, None, None), 
+                                           (None, 145, None, None), (-37, 145, 0, None),
+                                           (-37, 145, app.config['SEARCH_MAX_PAGE_LIMIT'] + 1, None),
+                                           (-37, 145, None, 0), (-37, 145, None, float('nan'))]:
+        status = search_near(latitude, longitude, k, radius)
+        assert status['status']['code'] == HTTPStatus.BAD_REQUEST.value
+
+    monkeypatch.setitem(app.config, 'SEARCH_BACKEND', 'postgres')
+    assert search_near(-37.95, 145.15)['status']['code'] == HTTPStatus.BAD_REQUEST.value
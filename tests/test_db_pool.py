@@ -0,0 +1,105 @@
+"""Test the PostgreSQL connection pool.
+
+Pools are created directly, with their own sizes, rather than through 
+get_connection_pool(), so the process's pool is left as it is.
+"""
+
+import threading
+import time
+
+import psycopg2
+import pytest
+
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from src.bh_aust_postcode.config import get_database_connection
+from src.bh_aust_postcode.utils.db_pool import (
+    ConnectionPool,
+    get_connection_pool,
+)
+
+@pytest.mark.db_pool
+def test_db_pool_reuse(app, postgres):
+    """Connections are reused, and returned without uncommitted work.
+    """
+
+    pool = ConnectionPool(get_database_connection(), 2)
+    try:
+        with pool.connection() as first:
+            cursor = first.cursor()
+            cursor.execute('CREATE TEMP TABLE db_pool_test (id integer)')
+            cursor.close()
+
+        assert first.info.transaction_status == TRANSACTION_STATUS_IDLE
+
+        with pool.connection() as second:
+            assert second is first
+            cursor = second.cursor()
+            cursor.execute("SELECT to_regclass('pg_temp.db_pool_test')")
+            assert cursor.fetchone()[0] == None
+            cursor.close()
+
+        info = pool.info()
+        assert (info['created'], info['reused'], info['idle'], info['in_use']) == (1, 1, 1, 0)
+    finally:
+        pool.close()
+
+    assert first.closed
+    assert get_connection_pool() is get_connection_pool()
+
+@pytest.mark.db_pool
+def test_db_pool_health_check(app, postgres):
+    """Broken connections are replaced, whether closed while checked out or ended
+    by the server while idle.
+    """
+
+    pool = ConnectionPool(get_database_connection(), 2, check_interval=0)
+    try:
+        with pool.connection() as connection:
+            connection.close()
+
+        with pool.connection() as connection:
+            backend_pid = connection.get_backend_pid()
+
+        killer = psycopg2.connect(**get_database_connection())
+        try:
+            cursor = killer.cursor()
+            cursor.execute('SELECT pg_terminate_backend(%s)', (backend_pid,))
+            killer.commit()
+        finally:
+            killer.close()
+
+        with pool.connection() as connection:
+            assert connection.get_backend_pid() != backend_pid
+            cursor = connection.cursor()
+            cursor.execute('SELECT 1')
+            assert cursor.fetchone()[0] == 1
+
+        assert pool.info()['discarded'] == 2
+    finally:
+        pool.close()
+
+@pytest.mark.db_pool
+def test_db_pool_max_size(app, postgres):
+    """Checkouts beyond the maximum size wait for a connection to be returned.
+    """
+
+    pool = ConnectionPool(get_database_connection(), 1)
+    events = []
+
+    def worker():
+        with pool.connection():
+            events.append('worker')
+
+    try:
+        with pool.connection():
+            thread = threading.Thread(target=worker)
+            thread.start()
+            time.sleep(0.2)
+            events.append('main')
+
+        thread.join()
+        assert events == ['main', 'worker']
+        assert pool.info()['created'] == 1
+    finally:
+        pool.close()
@@ -0,0 +1,180 @@
+"""Test propagating postcode updates to every worker through the generation stamp.
+
+test_generation_stamp_workers() runs workers as separate processes, which load
+postcodes from a SQLite database in a temporary directory rather than the instance
+folder, then rewrites the database and the stamp, as ``flask update-postcode`` does.
+"""
+
+import os
+import sys
+import json
+import subprocess
+import time
+
+import pytest
+
+from src.bh_aust_postcode.api.postcode_pool import postcode_pool, PostcodePool
+from src.bh_aust_postcode.api.postcode_snapshot import dataset_version
+from src.bh_aust_postcode.api.sqlite_backend import write_sqlite
+from src.bh_aust_postcode.api.generation_stamp import (
+    GenerationWatcher,
+    write_stamp,
+    read_stamp,
+)
+
+def wait_for(condition, timeout: float=30) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline: return False
+        time.sleep(0.01)
+
+    return True
+
+@pytest.mark.generation_stamp
+def test_stamp_file(tmp_path):
+    file_name = str(tmp_path / 'postcodes.generation')
+
+    assert read_stamp(None) == None
+    assert read_stamp(file_name) == None
+
+    stamp = write_stamp(file_name, {'inserted': 1})
+    assert read_stamp(file_name) == stamp
+    with open(file_name) as file:
+        content = json.load(file)
+    assert content['stamp'] == stamp
+    assert content['inserted'] == 1
+    assert 'written' in content
+
+    assert write_stamp(file_name) != stamp
+    assert os.listdir(tmp_path) == ['postcodes.generation']
+
+    with open(file_name, 'w') as file:
+        file.write('{"stam')
+    assert read_stamp(file_name) == None
+
+@pytest.mark.generation_stamp
+def test_generation_watcher(ensure_postcodes_loaded, app, tmp_path, monkeypatch):
+    file_name = str(tmp_path / 'postcodes.generation')
+    monkeypatch.setitem(app.config, 'GENERATION_STAMP_FILE', file_name)
+    monkeypatch.setitem(app.config, 'GENERATION_CHECK_INTERVAL', 0.5)
+
+    watcher = GenerationWatcher()
+
+    # No stamp yet: postcodes were loaded under none.
+    assert watcher.check(app) == False
+    assert watcher.info()['stamp'] == None
+    assert watcher.info()['checks'] == 1
+
+    # Not checked again until the interval has passed.
+    stamp = write_stamp(file_name)
+    assert watcher.check(app) == False
+    assert watcher.info()['checks'] == 1
+
+    time.sleep(0.5)
+    monkeypatch.setitem(app.config, 'GENERATION_CHECK_INTERVAL', 0.01)
+    generation = PostcodePool.generation
+    assert watcher.check(app) == True
+    assert wait_for(lambda: watcher.info()['reloads'] == 1)
+
+    info = watcher.info()
+    assert info['stamp'] == stamp
+    assert info['reloading'] == False
+    assert info['failures'] == 0
+    assert info['seconds'] >= 0
+    assert info['reloaded'] != None
+    assert PostcodePool.generation == generation + 1
+
+    # Unchanged: nothing to do.
+    time.sleep(0.05)
+    assert watcher.check(app) == False
+    assert watcher.info()['checks'] == 3
+    assert PostcodePool.generation == generation + 1
+
+    # Postcodes loaded under the current stamp, e.g. by the warm-up.
+    watcher = GenerationWatcher()
+    watcher.loaded(stamp)
+    assert watcher.check(app) == False
+    assert watcher.info()['stamp'] == stamp
+
+    # Disabled.
+    write_stamp(file_name)
+    monkeypatch.setitem(app.config, 'GENERATION_CHECK_INTERVAL', 0)
+    assert watcher.check(app) == False
+    monkeypatch.setitem(app.config, 'GENERATION_CHECK_INTERVAL', 0.01)
+    monkeypatch.setitem(app.config, 'GENERATION_STAMP_FILE', '')
+    assert watcher.check(app) == False
+    assert watcher.info()['checks'] == 1
+
+WORKER_SCRIPT = """
+import json, sys, time
+
+from app import app
+
+client = app.test_client()
+target = int(sys.argv[1])
+last = None
+deadline = time.monotonic() + 60
+while time.monotonic() < deadline:
+    ready = client.get('/health/ready').get_json()['data']['ready']
+    seen = (ready['generation'], ready['postcodes'], ready['stamp']['reloading'])
+    if seen != last:
+        last = seen
+        # Not stdout, which the reload thread also prints to.
+        print('READY ' + json.dumps(ready), file=sys.stderr, flush=True)
+    if ready['postcodes'] == target and not ready['stamp']['reloading']: break
+    time.sleep(0.02)
+"""
+
+def read_ready(worker: subprocess.Popen) -> dict:
+    """The next readiness a worker reports, skipping warnings."""
+    for line in worker.stderr:
+        if line.startswith('READY '): return json.loads(line[6:])
+
+    return None
+
+@pytest.mark.generation_stamp
+def test_generation_stamp_workers(ensure_postcodes_loaded, tmp_path):
+    postcodes = list(postcode_pool.postcodes)
+    updated = postcodes[:-100]
+
+    sqlite_file = str(tmp_path / 'postcodes.sqlite3')
+    stamp_file = str(tmp_path / 'postcodes.generation')
+    write_sqlite(sqlite_file, updated)
+    first = write_stamp(stamp_file)
+
+    env = dict(os.environ, SEARCH_BACKEND='memory', POSTCODE_SNAPSHOT_FILE='',
+               SQLITE_DATABASE_FILE=sqlite_file, GENERATION_STAMP_FILE=stamp_file,
+               GENERATION_CHECK_INTERVAL='0.05', FUZZY_MAX_DISTANCE='0',
+               WARM_UP_IN_BACKGROUND='False')
+    workers = [subprocess.Popen([sys.executable, '-c', WORKER_SCRIPT, str(len(postcodes))],
+                                env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                text=True)
+               for _ in range(3)]
+    try:
+        for worker in workers:
+            ready = read_ready(worker)
+            assert ready['postcodes'] == len(updated)
+            assert ready['generation'] == 1
+            assert ready['stamp']['stamp'] == first
+
+        # As update-postcode does: data first, then the stamp.
+        write_sqlite(sqlite_file, postcodes)
+        second = write_stamp(stamp_file)
+
+        for worker in workers:
+            # The last readiness reported, once reloaded.
+            ready = read_ready(worker)
+            while ready['postcodes'] != len(postcodes) or ready['stamp']['reloading']:
+                ready = read_ready(worker)
+            assert worker.wait(60) == 0
+
+            assert ready['postcodes'] == len(postcodes)
+            assert ready['generation'] == 2
+            assert ready['version'] == dataset_version(postcodes)
+            assert ready['stamp']['stamp'] == second
+            assert ready['stamp']['reloads'] == 1
+            assert ready['stamp']['failures'] == 0
+    finally:
+        for worker in workers:
+            if worker.poll() == None: worker.kill()
+            worker.stderr.close()
@@ -0,0 +1,195 @@
+"""Test the liveness and readiness probes, and warming up in the background.
+
+Warming up is tested against a stand-in backend whose loads wait to be let through,
+so that the probes can be checked before, while and after postcodes are loaded.
+"""
+
+import os
+import sys
+import json
+import subprocess
+import threading
+import time
+
+from http import HTTPStatus
+
+import pytest
+
+from src.bh_aust_postcode.api.search_backend import SearchBackend
+from src.bh_aust_postcode.api.warm_up import (
+    warm_up,
+    WARM_UP_LOADING,
+    WARM_UP_DONE,
+)
+
+from tests import fixture_postcodes
+
+class GatedBackend(SearchBackend):
+    """Loads wait for ``gate``, then fail until ``succeed`` is True."""
+
+    name = 'gated'
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.succeed = False
+        self.attempts = 0
+        self.__count = 0
+
+    def load(self, force_reload: bool=False) -> tuple:
+        self.gate.wait(10)
+        self.attempts += 1
+        if not self.succeed: return False, 'PostgreSQL is not up yet.'
+
+        self.__count = 18495
+        return True, ''
+
+    def generation_info(self) -> tuple:
+        return ('gated', 1) if self.__count > 0 else ('', 0)
+
+    @property
+    def count(self) -> int:
+        return self.__count
+
+    @property
+    def load_seconds(self) -> float:
+        return 0.5 if self.__count > 0 else None
+
+    # Nothing is searched.
+    def search(self, locality: str, offset: int=0, limit: int=None, state: str=None) -> list:
+        return []
+
+    def count_matches(self, locality: str, state: str=None) -> int:
+        return 0
+
+    def search_prefix(self, locality: str) -> list:
+        return []
+
+    def search_postcode(self, postcode: str) -> list:
+        return []
+
+def wait_for(condition, timeout: float=10) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline: return False
+        time.sleep(0.01)
+
+    return True
+
+@pytest.mark.health
+def test_health_probes(ensure_postcodes_loaded, app, test_client):
+    response = test_client.get('/health/live')
+    assert response.status_code == HTTPStatus.OK.value
+    assert response.headers['Cache-Control'] == 'no-store'
+
+    status = json.loads(response.get_data(as_text=True))
+    assert status['status']['code'] == HTTPStatus.OK.value
+    assert status['data']['live']['pid'] == os.getpid()
+    assert status['data']['live']['uptime'] >= 0
+
+    response = test_client.get('/health/ready')
+    assert response.status_code == HTTPStatus.OK.value
+    assert response.headers['Cache-Control'] == 'no-store'
+
+    ready = json.loads(response.get_data(as_text=True))['data']['ready']
+    assert ready['backend'] == 'memory'
+    assert ready['postcodes'] == len(fixture_postcodes())
+    assert ready['generation'] >= 1
+    assert len(ready['version']) > 0
+    assert ready['seconds'] >= 0
+    assert set(ready['warm_up']) == {'state', 'background', 'attempts', 'error', 'seconds'}
+
+@pytest.mark.health
+def test_warm_up_in_background(app, test_client, monkeypatch):
+    backend = GatedBackend()
+    monkeypatch.setattr('src.bh_aust_postcode.api.warm_up.load_search_backend', backend.load)
+    monkeypatch.setattr('src.bh_aust_postcode.api.health.get_search_backend', lambda: backend)
+    monkeypatch.setitem(app.config, 'WARM_UP_RETRY_INTERVAL', 0.01)
+
+    started = time.perf_counter()
+    assert warm_up.start(app, background=True) == False
+    # Returns without waiting for the load.
+    assert time.perf_counter() - started < 1
+
+    try:
+        assert wait_for(lambda: warm_up.info()['state'] == WARM_UP_LOADING)
+
+        # Serving, but not ready.
+        assert test_client.get('/health/live').status_code == HTTPStatus.OK.value
+
+        response = test_client.get('/health/ready')
+        assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE.value
+        status = json.loads(response.get_data(as_text=True))
+        assert status['status']['code'] == HTTPStatus.SERVICE_UNAVAILABLE.value
+        assert status['data']['ready']['postcodes'] == 0
+        assert status['data']['ready']['warm_up']['state'] == WARM_UP_LOADING
+        assert status['data']['ready']['warm_up']['background'] == True
+
+        # Failed loads are retried.
+        backend.gate.set()
+        assert wait_for(lambda: backend.attempts >= 2)
+
+        response = test_client.get('/health/ready')
+        assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE.value
+        assert 'PostgreSQL is not up yet.' in json.loads(response.get_data(as_text=True))['status']['text']
+
+        backend.succeed = True
+        assert warm_up.wait(10) == True
+    finally:
+        backend.gate.set()
+        backend.succeed = True
+        warm_up.wait(10)
+
+    info = warm_up.info()
+    assert info['state'] == WARM_UP_DONE
+    assert info['attempts'] == backend.attempts
+    assert info['error'] == ''
+    assert info['seconds'] >= 0
+
+    response = test_client.get('/health/ready')
+    assert response.status_code == HTTPStatus.OK.value
+    ready = json.loads(response.get_data(as_text=True))['data']['ready']
+    assert ready['backend'] == 'gated'
+    assert ready['postcodes'] == 18495
+    assert ready['generation'] == 1
+    assert ready['seconds'] == 0.5
+    assert ready['warm_up']['state'] == WARM_UP_DONE
+
+STARTUP_SCRIPT = """
+import json, sys, time
+
+started = time.perf_counter()
+from app import app
+imported = time.perf_counter() - started
+
+from src.bh_aust_postcode.api.warm_up import warm_up
+loaded = warm_up.wait(30)
+
+response = app.test_client().get('/health/ready')
+print(json.dumps({
+    'imported': imported,
+    'loaded': loaded,
+    'ready': response.status_code,
+    'modules': [name for name in ('psycopg2', 'requests', 'distutils') if name in sys.modules],
+}))
+"""
+
+@pytest.mark.health
+def test_startup_time(postcode_files):
+    """Import the application in a fresh interpreter, as a worker does, warming up in
+    the background from the fixture postcodes.
+    """
+
+    env = dict(os.environ, **postcode_files, SEARCH_BACKEND='memory', WARM_UP_IN_BACKGROUND='True', 
+               WARM_UP_RETRY_INTERVAL='0')
+    result = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+
+    startup = json.loads(result.stdout.splitlines()[-1])
+    print(f"Application imported in {startup['imported']:.3f} seconds.")
+
+    # Loaded from the snapshot or SQLite database, without PostgreSQL or downloads.
+    assert startup['loaded'] == True
+    assert startup['ready'] == HTTPStatus.OK.value
+    assert startup['modules'] == []
+    assert startup['imported'] < 5
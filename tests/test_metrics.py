@@ -0,0 +1,156 @@
+"""Test the metrics registry, merging metrics of several processes, and /metrics.
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+from http import HTTPStatus
+
+import pytest
+
+from src.bh_aust_postcode.utils.metrics import (
+    MetricsRegistry,
+    EXPOSITION_CONTENT_TYPE,
+    PROCESS_FILE_PATTERN,
+)
+
+from tests import fixture_postcodes
+
+def parse_exposition(text: str) -> dict:
+    """Sample values by sample name and labels, e.g. ``requests_total{code="200"}``."""
+    samples = {}
+    for line in text.splitlines():
+        if line == '' or line.startswith('#'): continue
+        name, value = line.rsplit(' ', 1)
+        samples[name] = float(value)
+
+    return samples
+
+def make_registry() -> MetricsRegistry:
+    registry = MetricsRegistry()
+    registry.enabled = True
+
+    requests = registry.counter('requests_total', 'Requests.', ('code',))
+    requests.inc(('200',))
+    requests.inc(('200',), 2)
+    requests.inc(('404',))
+
+    duration = registry.histogram('duration_seconds', 'Duration.', ('mode',), buckets=(0.1, 1))
+    duration.observe(0.05, ('partial',))
+    duration.observe(0.1, ('partial',))
+    duration.observe(3, ('partial',))
+
+    size = registry.gauge('size', 'Size of "things".\nTwo lines.', ('name',))
+    size.set(('a\\b "c"',), 2.5)
+
+    return registry
+
+@pytest.mark.metrics
+def test_render():
+    registry = make_registry()
+    text = registry.render()
+
+    assert '# HELP requests_total Requests.\n# TYPE requests_total counter\n' in text
+    assert '# TYPE duration_seconds histogram\n' in text
+    assert '# HELP size Size of "things". Two lines.\n' in text
+
+    samples = parse_exposition(text)
+    assert samples == {
+        'requests_total{code="200"}': 3,
+        'requests_total{code="404"}': 1,
+        'duration_seconds_bucket{mode="partial",le="0.1"}': 2,
+        'duration_seconds_bucket{mode="partial",le="1.0"}': 2,
+        'duration_seconds_bucket{mode="partial",le="+Inf"}': 3,
+        'duration_seconds_sum{mode="partial"}': 3.15,
+        'duration_seconds_count{mode="partial"}': 3,
+        'size{name="a\\\\b \\"c\\""}': 2.5,
+    }
+
+    # Collectors run before every render.
+    calls = []
+    registry.collector(lambda: calls.append(1))
+    registry.render()
+    registry.snapshot()
+    assert len(calls) == 2
+
+    with pytest.raises(ValueError):
+        registry.counter('requests_total', 'Again.')
+
+    registry.clear()
+    assert parse_exposition(registry.render()) == {}
+
+@pytest.mark.metrics
+def test_multiprocess(tmp_path):
+    directory = str(tmp_path / 'metrics')
+
+    registry = make_registry()
+    registry.configure(directory, flush_interval=60)
+
+    # Not written until rendered, or flushed.
+    assert os.listdir(directory) == []
+    assert registry.flush() == True
+    assert registry.flush() == False
+    assert os.listdir(directory) == [PROCESS_FILE_PATTERN.format(os.getpid())]
+
+    # Another worker, which has exited since: its counters still count, its gauges do not.
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    other = make_registry()
+    with open(os.path.join(directory, PROCESS_FILE_PATTERN.format(exited.pid)), 'w') as file:
+        json.dump({'pid': exited.pid, 'metrics': other.snapshot()}, file)
+
+    # Half written by another worker.
+    with open(os.path.join(directory, PROCESS_FILE_PATTERN.format(1)), 'w') as file:
+        file.write('{"pid": 1, "metr')
+
+    samples = parse_exposition(registry.render())
+    assert samples['requests_total{code="200"}'] == 6
+    assert samples['requests_total{code="404"}'] == 2
+    assert samples['duration_seconds_bucket{mode="partial",le="0.1"}'] == 4
+    assert samples['duration_seconds_bucket{mode="partial",le="+Inf"}'] == 6
+    assert samples['duration_seconds_count{mode="partial"}'] == 6
+    assert samples['duration_seconds_sum{mode="partial"}'] == pytest.approx(6.3)
+
+    gauges = [name for name in samples if name.startswith('size')]
+    assert gauges == [f'size{{name="a\\\\b \\"c\\"",pid="{os.getpid()}"}}']
+
+@pytest.mark.metrics
+def test_metrics_endpoint(ensure_postcodes_loaded, test_client):
+    before = parse_exposition(test_client.get('/metrics').get_data(as_text=True))
+
+    assert test_client.get('/api/v0/aust-postcode/glen').status_code == HTTPStatus.OK.value
+    # From the response cache.
+    assert test_client.get('/api/v0/aust-postcode/glen').status_code == HTTPStatus.OK.value
+    test_client.get('/api/v0/aust-postcode/xyzqqw')
+    test_client.get('/api/v0/aust-postcode/qj')
+    test_client.get('/api/v0/aust-postcode/by-postcode/3171')
+
+    response = test_client.get('/metrics')
+    assert response.status_code == HTTPStatus.OK.value
+    assert response.content_type == EXPOSITION_CONTENT_TYPE
+    assert response.headers['Cache-Control'] == 'no-store'
+    after = parse_exposition(response.get_data(as_text=True))
+
+    def delta(name: str) -> float:
+        return after.get(name, 0) - before.get(name, 0)
+
+    request = 'postcode_request_duration_seconds_count{{endpoint="api.postcodes_postcode",code="{}"}}'
+    assert delta(request.format(200)) == 2
+    assert delta(request.format(404)) == 1
+    assert delta(request.format(400)) == 1
+    assert delta('postcode_request_duration_seconds_count{endpoint="api.postcodes_postcode_localities",'
+                 'code="200"}') == 1
+
+    search = 'postcode_search_duration_seconds_count{{mode="partial",code="{}"}}'
+    assert delta(search.format(200)) == 1
+    assert delta(search.format(404)) == 1
+    assert delta(search.format(400)) == 1
+    assert delta('postcode_search_results_count{mode="partial"}') == 2
+    assert delta('postcode_search_results_bucket{mode="partial",le="0.0"}') == 1
+    assert delta('postcode_backend_search_duration_seconds_count{backend="memory",method="search"}') == 2
+
+    assert after['postcode_backend_postcodes{backend="memory"}'] == len(fixture_postcodes())
+    assert after['postcode_backend_generation{backend="memory"}'] >= 1
+    assert delta('postcode_cache_hits_total{cache="response"}') >= 1
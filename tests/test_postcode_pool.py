@@ -9,14 +9,41 @@ It gets called repeatedly for each test method, however, the loading only carrie
 only once.
 """
 
+import sys
+import random
+import struct
+import threading
+import tracemalloc
+
+from array import array
+
 import pytest
 
-from bh_aust_postcode.api.postcode_pool import (
+from src.bh_aust_postcode.api.postcode_pool import (
+    PoolGeneration,
     PostcodePool,
     postcode_pool,
 )
+from src.bh_aust_postcode.api.postcode_index import (
+    NgramIndex,
+    FuzzyIndex,
+    SpatialIndex,
+    edit_distance,
+    haversine_km,
+)
+from src.bh_aust_postcode.api.compact_postcodes import CompactPostcodes
+from src.bh_aust_postcode.api.refinement_cache import RefinementCache
+from src.bh_aust_postcode.api.postcode_snapshot import (
+    HEADER,
+    SnapshotError,
+    write_snapshot,
+    read_snapshot,
+)
 
-from tests import search_postcode
+from tests import (
+    fixture_postcodes,
+    search_postcode,
+)
 
 @pytest.mark.postcode_pool
 def test_postcode_pool_singleton(ensure_postcodes_loaded, app):
@@ -30,7 +57,7 @@ def test_postcode_pool_singleton(ensure_postcodes_loaded, app):
     # Singleton.
     assert (postcode_pool_2 is postcode_pool) == True
 
-    assert postcode_pool.count >= 18000
+    assert postcode_pool.count == len(fixture_postcodes())
 
 @pytest.mark.postcode_pool
 def test_postcode_pool_search(ensure_postcodes_loaded, app):
@@ -38,7 +65,7 @@ def test_postcode_pool_search(ensure_postcodes_loaded, app):
     """
 
     assert postcode_pool != None
-    assert postcode_pool.count >= 18000
+    assert postcode_pool.count == len(fixture_postcodes())
 
     result = postcode_pool.search('springva')
 
@@ -46,3 +73,443 @@ def test_postcode_pool_search(ensure_postcodes_loaded, app):
 
     found = search_postcode(result, 'SPRINGVALE', 'VIC', '3171')
     assert found == True
+
+@pytest.mark.postcode_pool
+def test_postcode_pool_search_matches_linear_scan(ensure_postcodes_loaded, app):
+    """Test PostcodePool search method returns exactly what a linear scan does, in 
+    the same order.
+    """
+
+    for locality in ['springva', 'Spring', 'sp', 'ale', "o'c", 'glen wa', 'xyz', 'mount ']:
+        expected = [pc for pc in PostcodePool.postcodes 
+                    if locality.upper() in pc['locality'].upper()]
+
+        assert postcode_pool.search(locality) == expected
+
+@pytest.mark.postcode_pool
+def test_postcode_pool_compact_postcodes(ensure_postcodes_loaded, app):
+    """Test compact storage holds the same postcodes and searches the same.
+    """
+
+    postcodes = list(PostcodePool.postcodes)
+    compact = CompactPostcodes.from_rows((pc['locality'], pc['state'], pc['postcode']) 
+                                         for pc in postcodes)
+
+    assert len(compact) == len(postcodes)
+    assert list(compact) == postcodes
+    assert compact[-1] == postcodes[-1]
+
+    for name in ['locality', 'state', 'postcode']:
+        assert compact.field(name) == [pc[name] for pc in postcodes]
+
+    index = NgramIndex(compact.locality_keys())
+    for locality in ['SPRINGVA', 'ALE', 'SP', 'XYZ']:
+        expected = [pos for pos, pc in enumerate(postcodes) if locality in pc['locality'].upper()]
+        assert index.search(locality) == expected
+
+@pytest.mark.postcode_pool
+def test_postcode_pool_compact_memory(ensure_postcodes_loaded, app):
+    """Compare memory taken by compact storage against a list of dictionaries.
+    """
+
+    # Fresh copies of the text fields, as the database driver would have created.
+    rows = [(pc['locality'].encode().decode(), pc['state'].encode().decode(), 
+             pc['postcode'].encode().decode()) for pc in PostcodePool.postcodes]
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        dicts = [{'locality': row[0].encode().decode(), 'state': row[1].encode().decode(), 
+                  'postcode': row[2].encode().decode()} for row in rows]
+        dicts_size = tracemalloc.get_traced_memory()[0] - before
+
+        before = tracemalloc.get_traced_memory()[0]
+        compact = CompactPostcodes.from_rows(rows)
+        compact_size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+    assert len(compact) == len(dicts)
+    assert compact_size * 5 < dicts_size
+
+@pytest.mark.postcode_pool
+def test_postcode_pool_snapshot(ensure_postcodes_loaded, app, tmp_path):
+    """Test a snapshot reads back the same postcodes and index it was written with.
+    """
+
+    postcodes = list(PostcodePool.postcodes)
+    compact = CompactPostcodes.from_rows((pc['locality'], pc['state'], pc['postcode']) 
+                                         for pc in postcodes)
+
+    file_name = str(tmp_path / 'postcodes.snapshot')
+    assert write_snapshot(file_name, compact, 2, PostcodePool.coordinates) > 0
+
+    (snapshot, index, prefix_index, postcode_index, state_index, 
+     fuzzy_index, version, coordinates, spatial_index) = read_snapshot(file_name)
+
+    assert list(snapshot) == postcodes
+    assert version == postcode_pool.version
+    for locality in ['SPRINGVA', 'ALE', 'SP', 'XYZ']:
+        assert index.search(locality) == PostcodePool.locality_index.search(locality)
+        assert prefix_index.search(locality) == PostcodePool.prefix_index.search(locality)
+
+    for postcode in ['3171', '0870', '0001']:
+        assert (list(postcode_index.search(postcode)) 
+                == list(PostcodePool.postcode_index.search(postcode)))
+
+    for state in ['VIC', 'NT', 'ZZ']:
+        assert list(state_index.search(state)) == list(PostcodePool.state_index.search(state))
+
+    expected = FuzzyIndex(compact.locality_keys(), 2)
+    for locality in ['SPRINGVAIL', 'WOLONGONG', 'XYZ']:
+        assert fuzzy_index.search(locality) == expected.search(locality)
+        assert fuzzy_index.search(locality, 1) == expected.search(locality, 1)
+
+    assert spatial_index.count == PostcodePool.spatial_index.count
+    for latitude, longitude in [(-37.95, 145.15), (-12.46, 130.84), (0.0, 0.0)]:
+        assert (spatial_index.nearest(latitude, longitude, 10) 
+                == PostcodePool.spatial_index.nearest(latitude, longitude, 10))
+
+@pytest.mark.postcode_pool
+def test_postcode_pool_snapshot_invalid(ensure_postcodes_loaded, app, tmp_path):
+    """Test corrupted and missing snapshots are refused.
+    """
+
+    compact = CompactPostcodes.from_rows([('SPRINGVALE', 'VIC', '3171')])
+
+    file_name = str(tmp_path / 'postcodes.snapshot')
+    write_snapshot(file_name, compact)
+
+    with open(file_name, 'r+b') as f:
+        f.seek(-1, 2)
+        last = f.read(1)
+        f.seek(-1, 2)
+        f.write(bytes([last[0] ^ 0xFF]))
+
+    with pytest.raises(SnapshotError):
+        read_snapshot(file_name)
+
+    with pytest.raises(OSError):
+        read_snapshot(str(tmp_path / 'missing.snapshot'))
+
+@pytest.mark.postcode_pool
+def test_postcode_pool_snapshot_lazy(tmp_path):
+    """Test texts are read from the mapped file as they are searched, not copied, 
+    multibyte characters included.
+    """
+
+    rows = [('CÔTE', 'QLD', '4000'), ('ÉLAN', 'NSW', '2000'), ('SPRINGVALE', 'VIC', '3171'),
+            ('ÉLANS', 'NSW', '2001')]
+    compact = CompactPostcodes.from_rows(rows)
+
+    file_name = str(tmp_path / 'postcodes.snapshot')
+    write_snapshot(file_name, compact, 1)
+
+    (snapshot, index, prefix_index, postcode_index, state_index, 
+     fuzzy_index, *_) = read_snapshot(file_name)
+
+    assert isinstance(index.keys.text, memoryview)
+    assert list(index.keys) == ['CÔTE', 'ÉLAN', 'SPRINGVALE', 'ÉLANS']
+    assert index.search('ÔTE') == [0]
+    assert index.search('LAN') == [1, 3]
+    assert prefix_index.search('ÉL') == [1, 3]
+    assert list(postcode_index.search('2001')) == [3]
+    assert list(state_index.search('NSW')) == [1, 3]
+    assert list(state_index.search('WA')) == []
+    assert fuzzy_index.search('ÉLAM') == [1]
+    assert fuzzy_index.search('ÉLANT') == [1, 3]
+
+@pytest.mark.postcode_pool
+def test_postcode_pool_snapshot_byte_order(ensure_postcodes_loaded, app, tmp_path):
+    """Test a snapshot written on a machine of the other byte order is refused.
+    """
+
+    compact = CompactPostcodes.from_rows([('SPRINGVALE', 'VIC', '3171')])
+
+    file_name = str(tmp_path / 'postcodes.snapshot')
+    write_snapshot(file_name, compact)
+    read_snapshot(file_name)
+
+    other = '>' if sys.byteorder == 'little' else '<'
+    with open(file_name, 'r+b') as f:
+        header = HEADER.unpack(f.read(HEADER.size))
+        f.seek(0)
+        f.write(struct.pack(other + HEADER.format[1:], *header))
+
+    with pytest.raises(SnapshotError, match='incompatible format'):
+        read_snapshot(file_name)
+
+@pytest.mark.postcode_pool
+def test_postcode_pool_search_many(ensure_postcodes_loaded, app):
+    """Test many searches at once find what each finds on its own.
+    """
+
+    queries = [('spring', None), ('SPRING', 'vic'), ('xyz', None), ('Spring', 'VIC'), 
+               ('ale', 'nt'), ('ale', None), ('spring', 'ZZ')]
+    assert (postcode_pool.search_many(queries) 
+            == [postcode_pool.search(locality, state=state) for locality, state in queries])
+    assert postcode_pool.search_many([]) == []
+
+@pytest.mark.postcode_pool
+def test_postcode_pool_search_prefix(ensure_postcodes_loaded, app):
+    """Test PostcodePool search_prefix method returns exactly what a linear scan does, 
+    in the same order.
+    """
+
+    result = postcode_pool.search_prefix('springva')
+    assert len(result) >= 1
+    found = search_postcode(result, 'SPRINGVALE', 'VIC', '3171')
+    assert found == True
+
+    for locality in ['springva', 'Spring', 'sp', 'mount ', "o'c", 'xyz', 'zzzz']:
+        expected = [pc for pc in PostcodePool.postcodes 
+                    if pc['locality'].upper().startswith(locality.upper())]
+
+        assert postcode_pool.search_prefix(locality) == expected
+
+@pytest.mark.postcode_pool
+def test_postcode_pool_search_page(ensure_postcodes_loaded, app):
+    """Test PostcodePool search method pages through the same result.
+    """
+
+    result = postcode_pool.search('spring')
+    assert len(result) > 10
+
+    assert postcode_pool.count_matches('spring') == len(result)
+    assert postcode_pool.search('spring', 0, 10) == result[:10]
+    assert postcode_pool.search('spring', 5, 10) == result[5:15]
+    assert postcode_pool.search('spring', len(result) - 2, 10) == result[-2:]
+    assert postcode_pool.search('spring', len(result), 10) == []
+    assert list(postcode_pool.iter_search('spring', 3)) == result[3:]
+
+@pytest.mark.postcode_pool
+def test_postcode_pool_search_postcode_and_state(ensure_postcodes_loaded, app):
+    """Test PostcodePool search_postcode method, and search restricted to a state, 
+    return exactly what a linear scan does, in the same order.
+    """
+
+    result = postcode_pool.search_postcode('3171')
+    found = search_postcode(result, 'SPRINGVALE', 'VIC', '3171')
+    assert found == True
+
+    for postcode in ['3171', '0870', '2000', '0001', '317']:
+        expected = [pc for pc in PostcodePool.postcodes if pc['postcode'] == postcode]
+        assert postcode_pool.search_postcode(postcode) == expected
+
+    for state in ['VIC', 'nsw', 'ZZ']:
+        for locality in ['spring', 'ale', 'sp', 'xyz']:
+            expected = [pc for pc in PostcodePool.postcodes 
+                        if locality.upper() in pc['locality'].upper() 
+                        and pc['state'] == state.upper()]
+
+            assert postcode_pool.search(locality, state=state) == expected
+            assert postcode_pool.search(locality, 1, 5, state) == expected[1:6]
+            assert postcode_pool.count_matches(locality, state) == len(expected)
+
+@pytest.mark.postcode_pool
+def test_postcode_pool_search_fuzzy(ensure_postcodes_loaded, app):
+    """Test PostcodePool search_fuzzy method returns exactly what comparing with every 
+    locality does, nearest first.
+    """
+
+    if PostcodePool.fuzzy_index == None: pytest.skip('Fuzzy search is disabled.')
+
+    assert edit_distance('SPRINGVAIL', 'SPRINGVALE', 2) == 2
+    assert edit_distance('WOLONGONG', 'WOLLONGONG', 2) == 1
+    assert edit_distance('SPRIGNVALE', 'SPRINGVALE', 2) == 1
+    assert edit_distance('SPRINGVALE', 'XYZ', 2) == 3
+
+    result = postcode_pool.search_fuzzy('springvail')
+    found = search_postcode(result, 'SPRINGVALE', 'VIC', '3171')
+    assert found == True
+
+    for locality in ['springvail', 'Sprignvale', 'wolongong', "o'conor", 'xyz']:
+        for max_distance in [1, 2]:
+            ranked = sorted((edit_distance(locality.upper(), pc['locality'].upper(), max_distance), pos)
+                            for pos, pc in enumerate(PostcodePool.postcodes))
+            expected = [PostcodePool.postcodes[pos] for distance, pos in ranked 
+                        if distance <= max_distance]
+
+            assert postcode_pool.search_fuzzy(locality, max_distance) == expected
+
+def __nearest_scan(coordinates, latitude: float, longitude: float, k: int=None, 
+                   radius: float=None) -> list:
+    """The nearest positions, by measuring the distance to every one."""
+    ranked = sorted((haversine_km(latitude, longitude, coordinates[2 * pos], coordinates[2 * pos + 1]), pos)
+                    for pos in range(len(coordinates) // 2) if coordinates[2 * pos] == coordinates[2 * pos])
+    if radius != None: ranked = [(distance, pos) for distance, pos in ranked if distance <= radius]
+
+    return ranked if k == None else ranked[:k]
+
+@pytest.mark.postcode_pool
+def test_spatial_index():
+    """Test SpatialIndex finds exactly what measuring the distance to every point does,
+    with unknown coordinates, across the antimeridian, and from far away.
+    """
+
+    rng = random.Random(0)
+    nan = float('nan')
+    coordinates = array('d')
+    for _ in range(2000):
+        if rng.random() < 0.05: coordinates.extend((nan, nan))
+        else: coordinates.extend((rng.uniform(-44, -10), rng.uniform(113, 154)))
+    coordinates.extend((-29.0, 179.95, -29.0, -179.95))
+
+    for leaf_size in [1, 8]:
+        index = SpatialIndex(coordinates, leaf_size)
+        assert index.count == sum(1 for value in coordinates[::2] if value == value)
+
+        restored = SpatialIndex.restore(coordinates, leaf_size, *index.tables())
+
+        points = [(-37.95, 145.15), (-29.0, 179.99), (-29.0, -179.9), (51.5, -0.12), (-90.0, 0.0)]
+        points += [(rng.uniform(-45, -9), rng.uniform(110, 156)) for _ in range(20)]
+        for latitude, longitude in points:
+            for k, radius in [(1, None), (10, None), (None, 50.0), (10, 50.0), (5000, None)]:
+                expected = __nearest_scan(coordinates, latitude, longitude, k, radius)
+                found = index.nearest(latitude, longitude, k, radius)
+                assert [pos for _, pos in found] == [pos for _, pos in expected]
+                assert [distance for distance, _ in found] == pytest.approx([distance for distance, _ in expected])
+                assert restored.nearest(latitude, longitude, k, radius) == found
+
+    assert SpatialIndex(array('d')).nearest(-37.95, 145.15, 10) == []
+    assert index.nearest(-37.95, 145.15) == []
+
+@pytest.mark.postcode_pool
+def test_postcode_pool_search_near(ensure_postcodes_loaded, app):
+    """Test PostcodePool search_near method returns the same postcodes as measuring the
+    distance to every postcode.
+    """
+
+    if not postcode_pool.has_coordinates: pytest.skip('Postcodes have no coordinates.')
+
+    coordinates = PostcodePool.coordinates
+    for latitude, longitude in [(-37.95, 145.15), (-33.87, 151.21), (-12.46, 130.84)]:
+        for k, radius in [(10, None), (None, 25.0)]:
+            expected = __nearest_scan(coordinates, latitude, longitude, k, radius)
+            result = postcode_pool.search_near(latitude, longitude, k, radius)
+
+            assert result == [dict(PostcodePool.postcodes[pos], latitude=coordinates[2 * pos], 
+                                   longitude=coordinates[2 * pos + 1], distance=distance)
+                              for distance, pos in expected]
+
+@pytest.mark.postcode_pool
+def test_postcode_pool_reload_atomic(ensure_postcodes_loaded, app):
+    """Searches during reloads always see a complete pool, and a search under way 
+    finishes against the generation it started with.
+    """
+
+    expected = postcode_pool.search('spring')
+    assert len(expected) > 0
+
+    stop = threading.Event()
+    failures = []
+
+    def search():
+        while not stop.is_set():
+            found = postcode_pool.search('spring')
+            if found != expected: failures.append(len(found))
+
+    threads = [threading.Thread(target=search) for _ in range(4)]
+    for thread in threads: thread.start()
+    try:
+        previous = PostcodePool.current
+        for _ in range(3):
+            result, _ = postcode_pool.load(force_reload=True)
+            assert result == True
+    finally:
+        stop.set()
+        for thread in threads: thread.join()
+
+    assert failures == []
+    assert PostcodePool.current is not previous
+    assert PostcodePool.generation == previous.generation + 3
+
+    # A search under way finishes against its generation, even an emptied pool is published.
+    pending = postcode_pool.iter_search('spring')
+    first = next(pending)
+
+    published = PostcodePool.current
+    PostcodePool.current = PoolGeneration(generation=published.generation + 1)
+    try:
+        assert postcode_pool.search('spring') == []
+        rest = list(pending)
+    finally:
+        PostcodePool.current = published
+
+    assert [first] + rest == expected
+
+@pytest.mark.postcode_pool
+def test_refinement_cache():
+    """Texts are refined from the longest cached text they start or end with, within
+    a generation, and entries are bounded by memory.
+    """
+
+    cache = RefinementCache(64 * 1024)
+    cache.put('SPR', [1, 5, 9], 1)
+    cache.put('SPRI', [1, 9], 1)
+
+    positions, found = cache.lookup('SPRI', 1)
+    assert (list(positions), found) == ([1, 9], 'SPRI')
+    assert cache.lookup('SPRIN', 1)[1] == 'SPRI'
+    assert cache.lookup('ASPR', 1)[1] == 'SPR'
+    assert cache.lookup('XSPRX', 1) == (None, None)
+
+    info = cache.info()
+    assert (info['hits'], info['refinements'], info['misses'], info['size']) == (1, 2, 1, 2)
+
+    # An older generation is not served, nor does it drop the newer entries.
+    assert cache.lookup('SPRI', 0) == (None, None)
+    cache.put('SPRIN', [1], 0)
+    assert cache.info()['size'] == 2
+
+    # A newer generation drops them.
+    assert cache.lookup('SPRI', 2) == (None, None)
+    assert cache.info()['size'] == 0
+    assert cache.info()['invalidations'] == 1
+
+    # Least recently used entries make room, entries over the bound are not cached.
+    cache = RefinementCache(20 * 1024)
+    for i in range(10):
+        cache.put(f'TEXT{i}', range(1000), 1)
+
+    info = cache.info()
+    assert info['bytes'] <= info['max_bytes']
+    assert info['evictions'] == 10 - info['size'] > 0
+    assert cache.lookup('TEXT9', 1)[1] == 'TEXT9'
+    assert cache.lookup('TEXT0', 1)[1] == None
+
+    cache.put('HUGE', range(10000), 1)
+    assert cache.lookup('HUGE', 1)[1] == None
+
+@pytest.mark.postcode_pool
+def test_postcode_pool_search_refinement(ensure_postcodes_loaded, app):
+    """Texts typed character by character are refined from the previous matches,
+    which gives the same results as searching the locality index.
+    """
+
+    previous = PostcodePool.refinement_cache
+    PostcodePool.refinement_cache = cache = RefinementCache(1024 * 1024)
+    try:
+        keys = PostcodePool.locality_index.keys
+        for word in ['springvale', 'mount eliza', "o'connor"]:
+            for length in range(1, len(word) + 1):
+                typed = word[:length]
+                expected = [PostcodePool.postcodes[pos] for pos in range(len(keys))
+                            if typed.upper() in keys[pos]]
+
+                assert postcode_pool.search(typed) == expected
+                assert postcode_pool.count_matches(typed) == len(expected)
+                assert postcode_pool.search(typed, 1, 3) == expected[1:4]
+                assert (postcode_pool.search(typed, state='vic') 
+                        == [pc for pc in expected if pc['state'] == 'VIC'])
+                assert (postcode_pool.count_matches(typed, 'vic') 
+                        == len([pc for pc in expected if pc['state'] == 'VIC']))
+
+            # Deleting back and typing again.
+            assert postcode_pool.search(word[:-2] + 'x') == []
+
+        info = cache.info()
+        assert info['refinements'] > 0
+        assert info['hits'] > 0
+    finally:
+        PostcodePool.refinement_cache = previous
@@ -0,0 +1,110 @@
+"""Test profiling requests, and summarising the profiles with ``flask profile-summary``.
+"""
+
+import os
+import time
+import pstats
+
+from http import HTTPStatus
+
+import pytest
+
+from src.bh_aust_postcode.api.profiling import (
+    RequestProfiler,
+    CPROFILE_EXTENSION,
+    STACKS_EXTENSION,
+    register_profiling,
+    profile_files,
+    profile_milliseconds,
+    summarise_stacks,
+)
+
+PROFILED_ENDPOINT = 'api.postcodes_postcode'
+
+def slow_view(seconds: float) -> str:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline: pass
+
+    return 'done'
+
+@pytest.mark.profiling
+def test_profile_every(tmp_path):
+    directory = str(tmp_path / 'profiles')
+    profiler = RequestProfiler(directory, every=3, max_files=2)
+    view = profiler.wrap(slow_view)
+    assert view.__name__ == 'slow_view'
+
+    # The 1st, 4th and 7th requests, the oldest of which is deleted.
+    for _ in range(8):
+        assert view(0.001) == 'done'
+
+    file_names = profile_files(directory)
+    assert len(file_names) == 2
+    assert profile_files(directory, CPROFILE_EXTENSION) == file_names
+    assert profile_milliseconds(file_names[0]) >= 1
+
+    stats = pstats.Stats(*file_names)
+    assert any(function == 'slow_view' for _, _, function in stats.stats)
+
+@pytest.mark.profiling
+def test_profile_slow(tmp_path):
+    directory = str(tmp_path / 'profiles')
+    profiler = RequestProfiler(directory, slow_seconds=0.05, sample_interval=0.001)
+    view = profiler.wrap(slow_view)
+
+    view(0.001)
+    assert profile_files(directory) == []
+
+    view(0.1)
+    file_names = profile_files(directory, STACKS_EXTENSION)
+    assert len(file_names) == 1
+    assert profile_milliseconds(file_names[0]) >= 100
+
+    with open(file_names[0]) as file:
+        lines = file.read().splitlines()
+    stack, samples = lines[0].rsplit(' ', 1)
+    assert int(samples) > 0
+    # Root first, the profiled view innermost.
+    assert stack.split(';')[-1].startswith('slow_view (test_profiling.py:')
+
+    summary = summarise_stacks(file_names, limit=5)
+    assert 'slow_view (test_profiling.py:' in summary.splitlines()[3]
+
+@pytest.mark.profiling
+def test_profile_summary(ensure_postcodes_loaded, app, test_client, tmp_path, monkeypatch):
+    from src.bh_aust_postcode.commands import profile_summary
+
+    directory = str(tmp_path / 'profiles')
+    monkeypatch.setitem(app.config, 'PROFILE_DIR', directory)
+    runner = app.test_cli_runner()
+
+    # Disabled: the view is left as it is.
+    view = app.view_functions[PROFILED_ENDPOINT]
+    assert register_profiling(app) == None
+    assert app.view_functions[PROFILED_ENDPOINT] is view
+
+    result = runner.invoke(args=['profile-summary'])
+    assert result.exit_code == 0
+    assert 'No profiles' in result.output
+
+    monkeypatch.setitem(app.view_functions, PROFILED_ENDPOINT, view)
+    monkeypatch.setitem(app.config, 'PROFILE_EVERY', 1)
+    assert register_profiling(app) != None
+    assert app.view_functions[PROFILED_ENDPOINT] is not view
+
+    for locality in ('mount', 'creek', 'xyzqqz'):
+        response = test_client.get(f'/api/v0/aust-postcode/{locality}')
+        assert response.status_code == HTTPStatus.OK.value
+    # Not a profiled endpoint.
+    test_client.get('/api/v0/aust-postcode/prefix/mount')
+
+    assert len(profile_files(directory)) == 3
+
+    result = runner.invoke(args=['profile-summary', '--limit', '500', '--sort', 'tottime'])
+    assert result.exit_code == 0
+    assert '3 profiles' in result.output
+    assert 'cProfile statistics of 3 requests' in result.output
+    assert 'Ordered by: internal time' in result.output
+    # Dispatch, validation, search and serialisation all show.
+    for function in ('dispatch_request', 'search_by_locality', '__validate_locality', 'json_bytes'):
+        assert function in result.output
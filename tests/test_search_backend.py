@@ -0,0 +1,314 @@
+"""Test search backends.
+
+The postgres and sqlite backends must find the same postcodes, in the same order,
+as the in-memory postcode pool, which ensure_postcodes_loaded() loads.
+
+The postgres backend is tested against a scratch postcode table, loaded with the 
+same fixture postcodes, so the configured postcode table is never touched.
+
+The sqlite backend is tested against a database written from the pool's postcodes
+into a temporary directory, so it does not need PostgreSQL.
+"""
+
+import sqlite3
+import threading
+import time
+
+from http import HTTPStatus
+
+import pytest
+
+from src.bh_aust_postcode.utils import format_sql_statement
+from src.bh_aust_postcode.utils.db_pool import get_connection_pool
+from src.bh_aust_postcode.api.postcode_pool import postcode_pool, PostcodePool
+from src.bh_aust_postcode.api.postgres_backend import (
+    postgres_backend,
+    like_pattern,
+)
+from src.bh_aust_postcode.api.search_backend import (
+    SearchBackend,
+    get_search_backend,
+)
+from src.bh_aust_postcode.api.sqlite_backend import (
+    SqliteError,
+    sqlite_backend,
+    write_sqlite,
+    read_sqlite,
+    open_sqlite,
+)
+
+from tests import fixture_postcodes
+
+LOCALITIES = ['spring', 'SPRINGVALE', 'ale', "o'c", 'mount e', 'xyz']
+
+#: Shorter than a trigram, the sqlite backend scans for these.
+SHORT_LOCALITIES = ['sp', 'a', "'", '']
+
+@pytest.fixture(scope='module')
+def postgres_loaded(app, postgres):
+    """Point the postgres backend at a scratch postcode table in the configured schema,
+    loaded with the fixture postcodes. The scratch tables are dropped afterwards.
+    """
+
+    from src.bh_aust_postcode.commands.update_postcode import (
+        create_database,
+        copy_postcodes,
+    )
+
+    def execute(sql: str, records: list=None) -> None:
+        with get_connection_pool().connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(format_sql_statement(sql))
+            if records != None: copy_postcodes(cursor, records)
+            cursor.close()
+            connection.commit()
+
+    configured = app.config['POSTCODE_TABLE_NAME']
+    app.config['POSTCODE_TABLE_NAME'] = 'postcode_backend_test'
+    try:
+        create_database()
+        execute('TRUNCATE {0}.{1}', fixture_postcodes())
+
+        result, message = postgres_backend.load(force_reload=True)
+        assert result, message
+        yield
+    finally:
+        execute('DROP TABLE IF EXISTS {0}.{1}, {0}.{1}_source')
+        app.config['POSTCODE_TABLE_NAME'] = configured
+
+@pytest.fixture(scope='module')
+def sqlite_file(app, ensure_postcodes_loaded, tmp_path_factory):
+    """A SQLite database of the pool's postcodes, which the sqlite backend is loaded 
+    from. An absolute ``SQLITE_DATABASE_FILE`` is used as it is.
+
+    :return: full path of the database file.
+    :rtype: str.
+    """
+
+    file_name = str(tmp_path_factory.mktemp('sqlite') / 'postcodes.sqlite3')
+    assert write_sqlite(file_name, postcode_pool.postcodes, PostcodePool.coordinates) > 0
+
+    configured = app.config['SQLITE_DATABASE_FILE']
+    app.config['SQLITE_DATABASE_FILE'] = file_name
+    try:
+        result, message = sqlite_backend.load(force_reload=True)
+        assert result, message
+        yield file_name
+    finally:
+        app.config['SQLITE_DATABASE_FILE'] = configured
+
+@pytest.mark.search_backend
+def test_search_backend_selection(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'SEARCH_BACKEND', 'memory')
+    assert get_search_backend() is postcode_pool
+
+    monkeypatch.setitem(app.config, 'SEARCH_BACKEND', 'postgres')
+    assert get_search_backend() is postgres_backend
+
+    monkeypatch.setitem(app.config, 'SEARCH_BACKEND', 'sqlite')
+    assert get_search_backend() is sqlite_backend
+
+    monkeypatch.setitem(app.config, 'SEARCH_BACKEND', 'sqlite3')
+    with pytest.raises(ValueError):
+        get_search_backend()
+
+@pytest.mark.search_backend
+def test_search_backend_abstract():
+    with pytest.raises(TypeError):
+        SearchBackend()
+
+    class PartialBackend(SearchBackend):
+        def search(self, locality: str, offset: int=0, limit: int=None, state: str=None) -> list:
+            return []
+
+    # Only some of the abstract methods implemented.
+    with pytest.raises(TypeError):
+        PartialBackend()
+
+    assert not SearchBackend.__abstractmethods__ - PartialBackend.__abstractmethods__ - {'search'}
+    assert len(SearchBackend.__abstractmethods__) == 8
+
+@pytest.mark.search_backend
+def test_search_backend_postgres_same_as_memory(ensure_postcodes_loaded, postgres_loaded):
+    assert postgres_backend.count == postcode_pool.count
+    assert postgres_backend.generation_info()[0] == postcode_pool.generation_info()[0]
+
+    for locality in LOCALITIES:
+        assert postgres_backend.search(locality) == postcode_pool.search(locality)
+        assert postgres_backend.count_matches(locality) == postcode_pool.count_matches(locality)
+        assert postgres_backend.search_prefix(locality) == postcode_pool.search_prefix(locality)
+
+        for state in ['vic', 'NT']:
+            assert (postgres_backend.search(locality, state=state) 
+                    == postcode_pool.search(locality, state=state))
+            assert (postgres_backend.count_matches(locality, state) 
+                    == postcode_pool.count_matches(locality, state))
+
+        assert (postgres_backend.search(locality, 3, 5, 'vic') 
+                == postcode_pool.search(locality, 3, 5, 'vic'))
+        assert (list(postgres_backend.iter_search(locality, 2, 4)) 
+                == list(postcode_pool.iter_search(locality, 2, 4)))
+
+    for postcode in ['3171', '0870', '0001']:
+        assert postgres_backend.search_postcode(postcode) == postcode_pool.search_postcode(postcode)
+
+@pytest.mark.search_backend
+def test_search_backend_postgres_wildcards(ensure_postcodes_loaded, postgres_loaded):
+    """Search texts are matched as they are, LIKE wildcards included."""
+
+    assert like_pattern('a_b%c\\') == 'a\\_b\\%c\\\\'
+    assert postgres_backend.search('%') == []
+    assert postgres_backend.search_prefix('_') == []
+
+@pytest.mark.search_backend
+def test_search_backend_postgres_bro(ensure_postcodes_loaded, postgres_loaded, app, monkeypatch):
+    """Business rules serve from the configured backend."""
+
+    from src.bh_aust_postcode.api.bro import (
+        search_by_locality_fuzzy,
+        reload_postcodes,
+    )
+
+    monkeypatch.setitem(app.config, 'SEARCH_BACKEND', 'postgres')
+
+    status = search_by_locality_fuzzy('springvail')
+    assert status['status']['code'] == HTTPStatus.BAD_REQUEST.value
+
+    generation = postgres_backend.generation
+    reload = reload_postcodes()['data']['reload']
+    assert reload['generation'] == generation + 1
+    assert reload['postcodes'] == postcode_pool.count
+    assert reload['delta'] == 0
+
+@pytest.mark.search_backend
+def test_search_backend_postgres_changes(ensure_postcodes_loaded, postgres_loaded, app, monkeypatch):
+    """Changes to the table, whoever makes them, move the generation on."""
+
+    def execute(sql: str) -> None:
+        with get_connection_pool().connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(format_sql_statement(sql))
+            cursor.close()
+            connection.commit()
+
+    monkeypatch.setitem(app.config, 'GENERATION_CHECK_INTERVAL', 0.01)
+    assert postgres_backend.load(force_reload=True)[0]
+    version, generation = postgres_backend.generation_info()
+
+    time.sleep(0.02)
+    assert postgres_backend.generation_info() == (version, generation)
+
+    execute("INSERT INTO {0}.{1} (locality, state, postcode) VALUES ('ZZCHANGEVILLE', 'VIC', '3999')")
+    try:
+        # Not before the next check.
+        assert postgres_backend.generation_info() == (version, generation)
+
+        time.sleep(0.02)
+        changed, changed_generation = postgres_backend.generation_info()
+        assert changed_generation == generation + 1 and changed != version
+        assert postgres_backend.count == postcode_pool.count + 1
+    finally:
+        execute("DELETE FROM {0}.{1} WHERE locality = 'ZZCHANGEVILLE'")
+
+    time.sleep(0.02)
+    assert postgres_backend.generation_info() == (version, generation + 2)
+
+    monkeypatch.undo()
+    assert postgres_backend.load(force_reload=True)[0]
+
+@pytest.mark.search_backend
+def test_search_backend_sqlite_same_as_memory(ensure_postcodes_loaded, sqlite_file):
+    assert sqlite_backend.count == postcode_pool.count
+    assert sqlite_backend.generation_info()[0] == postcode_pool.generation_info()[0]
+
+    for locality in LOCALITIES + SHORT_LOCALITIES:
+        assert sqlite_backend.search(locality) == postcode_pool.search(locality)
+        assert sqlite_backend.count_matches(locality) == postcode_pool.count_matches(locality)
+        assert sqlite_backend.search_prefix(locality) == postcode_pool.search_prefix(locality)
+
+        for state in ['vic', 'NT']:
+            assert (sqlite_backend.search(locality, state=state) 
+                    == postcode_pool.search(locality, state=state))
+            assert (sqlite_backend.count_matches(locality, state) 
+                    == postcode_pool.count_matches(locality, state))
+
+        assert (sqlite_backend.search(locality, 3, 5, 'vic') 
+                == postcode_pool.search(locality, 3, 5, 'vic'))
+        assert (list(sqlite_backend.iter_search(locality, 2, 4)) 
+                == list(postcode_pool.iter_search(locality, 2, 4)))
+
+    # FTS5 query syntax in search texts is matched as it is.
+    for locality in ['"', 'a" OR "b', 'NEAR(a b)', '*']:
+        assert sqlite_backend.search(locality) == postcode_pool.search(locality)
+
+    for postcode in ['3171', '0870', '0001']:
+        assert sqlite_backend.search_postcode(postcode) == postcode_pool.search_postcode(postcode)
+
+@pytest.mark.search_backend
+def test_search_backend_sqlite_file(ensure_postcodes_loaded, sqlite_file, tmp_path):
+    """The database holds the pool's postcodes in pool order, and invalid files are 
+    refused.
+    """
+
+    rows, version, coordinates = read_sqlite(sqlite_file)
+    assert version == postcode_pool.generation_info()[0]
+    assert rows == [(pc['locality'], pc['state'], pc['postcode']) for pc in postcode_pool.postcodes]
+    # NaN, for unknown coordinates, is not equal to itself.
+    assert ([value if value == value else None for value in coordinates] 
+            == [value if value == value else None for value in PostcodePool.coordinates])
+
+    with pytest.raises(SqliteError):
+        open_sqlite(str(tmp_path / 'missing.sqlite3'))
+
+    not_sqlite = tmp_path / 'not.sqlite3'
+    not_sqlite.write_bytes(b'not a database' * 100)
+    with pytest.raises(SqliteError):
+        read_sqlite(str(not_sqlite))
+
+    # A SQLite database, but not of postcodes.
+    other = tmp_path / 'other.sqlite3'
+    sqlite3.connect(str(other)).close()
+    with pytest.raises(SqliteError):
+        read_sqlite(str(other))
+
+@pytest.mark.search_backend
+def test_search_backend_sqlite_reload(ensure_postcodes_loaded, sqlite_file):
+    """A reload starts a new generation, whose connections are new ones, in every
+    thread.
+    """
+
+    generation = sqlite_backend.generation
+    found = sqlite_backend.search('spring')
+
+    result, message = sqlite_backend.load(force_reload=True)
+    assert result, message
+    assert sqlite_backend.generation == generation + 1
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(sqlite_backend.search('spring')))
+    thread.start()
+    thread.join()
+    assert results == [found]
+    assert sqlite_backend.search('spring') == found
+
+@pytest.mark.search_backend
+def test_search_backend_pool_from_sqlite(ensure_postcodes_loaded, sqlite_file, app, monkeypatch):
+    """Without a snapshot, the postcode pool loads from the SQLite database rather 
+    than PostgreSQL.
+    """
+
+    version, generation = postcode_pool.generation_info()
+    count = postcode_pool.count
+
+    monkeypatch.setitem(app.config, 'POSTCODE_SNAPSHOT_FILE', '')
+    monkeypatch.setitem(app.config, 'SQLITE_DATABASE_FILE', sqlite_file)
+    # PostgreSQL would be used if the SQLite database were not.
+    monkeypatch.setitem(app.config, 'SCHEMA_NAME', 'no_such_schema')
+
+    result, message = postcode_pool.load(force_reload=True)
+    assert result, message
+    assert postcode_pool.generation_info() == (version, generation + 1)
+    assert postcode_pool.count == count
+    assert postcode_pool.search('springvale') != []
+    assert postcode_pool.has_coordinates
+    assert postcode_pool.search_near(-37.95, 145.15, 5) != []
@@ -0,0 +1,287 @@
+"""Test the update-postcode command's database loading.
+
+Rows are loaded into a temporary table, which PostgreSQL drops when the 
+connection closes, so the postcode table is never touched. Downloads are served
+by a local HTTP stand-in, the http_server() fixture.
+
+The command module registers itself with the application on import, so it is 
+imported within the application context the app() fixture pushes.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+
+import psycopg2
+import pytest
+
+from src.bh_aust_postcode.config import get_database_connection
+
+@pytest.mark.update_postcode
+def test_copy_postcodes(app, postgres):
+    """Records are loaded as they are, whatever characters they contain, across 
+    several chunks. Unknown coordinates are loaded as NULL.
+    """
+
+    from src.bh_aust_postcode.commands.update_postcode import (
+        COPY_CHUNK_SIZE,
+        copy_postcodes,
+    )
+
+    records = [{'locality': "O'CONNOR", 'state': 'ACT', 'postcode': '2602', 
+                'lat': -35.264, 'long': 149.122},
+               {'locality': 'BACK\\SLASH\tTAB\nNEW LINE', 'state': 'VIC', 'postcode': 3171}]
+    records += [{'locality': f'LOCALITY {i}', 'state': 'NSW', 'postcode': '2000'} 
+                for i in range(COPY_CHUNK_SIZE)]
+
+    connection = psycopg2.connect(**get_database_connection())
+    try:
+        cursor = connection.cursor()
+        cursor.execute('CREATE TEMP TABLE copy_postcodes_test ('
+                       'locality varchar(128), state varchar(3), postcode varchar(4), '
+                       'latitude double precision, longitude double precision)')
+
+        assert copy_postcodes(cursor, records, 'copy_postcodes_test') == len(records)
+
+        cursor.execute('SELECT locality, state, postcode, latitude, longitude FROM copy_postcodes_test')
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        connection.close()
+
+    assert [row[:3] for row in rows] == [(itm['locality'], itm['state'], str(itm['postcode'])) 
+                                         for itm in records]
+    assert rows[0][3:] == (-35.264, 149.122)
+    assert all(row[3:] == (None, None) for row in rows[1:])
+
+@pytest.mark.update_postcode
+def test_iter_json_array():
+    """Items are parsed as json.loads does, wherever the document is split."""
+
+    from src.bh_aust_postcode.utils.json_stream import iter_json_array
+
+    document = json.dumps([{'locality': 'ÉCOLE "QUOTED"', 'postcode': 3171, 'lat': -37.95}, 
+                           [], {}, 2.5, -1e-3, 'text', True, None, [[1], {'a': [2]}]]).encode()
+
+    for size in (1, 2, 3, 7, len(document)):
+        chunks = [document[i:i + size] for i in range(0, len(document), size)]
+        assert list(iter_json_array(chunks)) == json.loads(document)
+
+    assert list(iter_json_array([b' [ ] '])) == []
+
+    for bad in (b'', b'{}', b'[1,', b'[1 2]', b'[1,]', b'[1] 2', b'[{"a": }]'):
+        with pytest.raises(ValueError):
+            list(iter_json_array([bad]))
+
+@pytest.fixture
+def http_server_process(tmp_path):
+    """As the http_server() fixture, but served by another process, so that only the 
+    download's own allocations are traced.
+
+    :return: the base URL and the served directory.
+    :rtype: tuple.
+    """
+
+    directory = tmp_path / 'www'
+    directory.mkdir()
+
+    server = subprocess.Popen([sys.executable, '-u', '-m', 'http.server', '0', '--bind', '127.0.0.1',
+                               '--directory', str(directory)],
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        # Serving HTTP on 127.0.0.1 port 54321 (http://127.0.0.1:54321/) ...
+        port = int(server.stdout.readline().split(' port ')[1].split()[0])
+        yield f'http://127.0.0.1:{port}', directory
+    finally:
+        server.kill()
+        server.wait()
+        server.stdout.close()
+
+@pytest.mark.update_postcode
+def test_get_json_content_streams(app, http_server_process, tmp_path, monkeypatch):
+    """A large source is parsed as it is downloaded, and kept byte for byte, 
+    without ever being held in memory whole.
+    """
+
+    from src.bh_aust_postcode.commands.update_postcode import get_json_content
+
+    base_url, directory = http_server_process
+    records = [{'id': i, 'postcode': f'{i % 10000:04}', 'locality': f'LOCALITY NUMBER {i}', 
+                'state': 'VIC', 'long': 145.1, 'lat': -37.9, 'dc': 'SPRINGVALE DC', 'type': 'Delivery Area'} 
+               for i in range(50000)]
+    source = directory / 'australian_postcodes.json'
+    source.write_text(json.dumps(records))
+    size = source.stat().st_size
+    del records
+
+    instance_path = tmp_path / 'instance'
+    instance_path.mkdir()
+    monkeypatch.setitem(app.config, 'SOURCE_POSTCODE_URL', f'{base_url}/australian_postcodes.json')
+    monkeypatch.setitem(app.config, 'KEEP_DOWNLOADED_POSTCODES', True)
+    monkeypatch.setattr(app, 'instance_path', str(instance_path))
+
+    # get_json_content() imports requests on first use: importing it is not downloading.
+    import requests
+
+    tracemalloc.start()
+    try:
+        result, data, _ = get_json_content()
+        assert result
+
+        count = 0
+        for i, itm in enumerate(data):
+            assert itm['locality'] == f'LOCALITY NUMBER {i}'
+            count += 1
+
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    assert count == 50000
+    assert peak < size / 10
+
+    downloaded = list(instance_path.iterdir())
+    assert len(downloaded) == 1
+    assert downloaded[0].read_bytes() == source.read_bytes()
+
+@pytest.mark.update_postcode
+def test_get_json_content_error(app, http_server, monkeypatch):
+    from src.bh_aust_postcode.commands.update_postcode import get_json_content
+
+    base_url, _ = http_server
+    monkeypatch.setitem(app.config, 'SOURCE_POSTCODE_URL', f'{base_url}/missing.json')
+
+    result, msg, _ = get_json_content()
+    assert not result
+    assert '404' in msg
+
+@pytest.fixture
+def delta_table(app, postgres, http_server, monkeypatch):
+    """Point the update-postcode command at a scratch postcode table in the configured 
+    schema, and at a source served by the local HTTP stand-in. The scratch tables are
+    dropped afterwards.
+
+    :return: writes a list of postcode records as the source.
+    :rtype: function.
+    """
+
+    from src.bh_aust_postcode.utils import format_sql_statement
+
+    base_url, directory = http_server
+    monkeypatch.setitem(app.config, 'POSTCODE_TABLE_NAME', 'postcode_delta_test')
+    monkeypatch.setitem(app.config, 'SOURCE_POSTCODE_URL', f'{base_url}/australian_postcodes.json')
+    monkeypatch.setitem(app.config, 'KEEP_DOWNLOADED_POSTCODES', False)
+
+    source = directory / 'australian_postcodes.json'
+    def write_source(records, mtime):
+        source.write_text(json.dumps(records))
+        os.utime(source, (mtime, mtime))
+
+    yield write_source
+
+    connection = psycopg2.connect(**get_database_connection())
+    try:
+        cursor = connection.cursor()
+        cursor.execute(format_sql_statement('DROP TABLE IF EXISTS {0}.{1}, {0}.{1}_source'))
+        connection.commit()
+    finally:
+        connection.close()
+
+def __table_rows(app) -> list:
+    from src.bh_aust_postcode.utils import format_sql_statement
+
+    connection = psycopg2.connect(**get_database_connection())
+    try:
+        cursor = connection.cursor()
+        cursor.execute(format_sql_statement('SELECT locality, state, postcode, id FROM {0}.{1} '
+                                            'ORDER BY locality, state, postcode'))
+        return cursor.fetchall()
+    finally:
+        connection.close()
+
+@pytest.mark.update_postcode
+def test_delta_update(app, delta_table):
+    """Unchanged sources are not downloaded again, changed sources only insert and 
+    delete the postcodes which differ.
+    """
+
+    from src.bh_aust_postcode.commands.update_postcode import (
+        create_database,
+        extract_and_insert,
+    )
+
+    springvale = {'locality': 'SPRINGVALE', 'state': 'VIC', 'postcode': '3171'}
+    alice = {'locality': 'ALICE SPRINGS', 'state': 'NT', 'postcode': '0870'}
+    ascot = {'locality': 'ASCOT', 'state': 'QLD', 'postcode': '4007'}
+    ascot_wa = {'locality': 'ASCOT', 'state': 'WA', 'postcode': '6104'}
+
+    create_database()
+    # The source may list the same postcode twice, e.g. with different coordinates.
+    delta_table([springvale, alice, ascot, ascot], 1_600_000_000)
+    assert extract_and_insert() == {'read': 4, 'inserted': 3, 'deleted': 0, 'updated': 0, 'unchanged': 0}
+
+    rows = __table_rows(app)
+    assert [row[:3] for row in rows] == [('ALICE SPRINGS', 'NT', '0870'), ('ASCOT', 'QLD', '4007'), 
+                                          ('SPRINGVALE', 'VIC', '3171')]
+
+    # Not modified: ETag and Last-Modified.
+    create_database()
+    assert extract_and_insert() == None
+
+    delta_table([springvale, ascot_wa, alice], 1_700_000_000)
+    assert extract_and_insert() == {'read': 3, 'inserted': 1, 'deleted': 1, 'updated': 0, 'unchanged': 2}
+
+    updated = __table_rows(app)
+    assert [row[:3] for row in updated] == [('ALICE SPRINGS', 'NT', '0870'), ('ASCOT', 'WA', '6104'), 
+                                             ('SPRINGVALE', 'VIC', '3171')]
+    # Unchanged postcodes are left alone rather than reinserted.
+    assert updated[0][3] == rows[0][3] and updated[2][3] == rows[2][3]
+
+    assert extract_and_insert() == None
+    assert extract_and_insert(force=True) == {'read': 3, 'inserted': 0, 'deleted': 0, 'updated': 0, 'unchanged': 3}
+
+@pytest.mark.update_postcode
+def test_delta_update_coordinates(app, delta_table):
+    """Coordinates are stored, NULL when unknown, and postcodes whose coordinates 
+    change are updated in place.
+    """
+
+    from src.bh_aust_postcode.utils import format_sql_statement
+    from src.bh_aust_postcode.commands.update_postcode import (
+        create_database,
+        extract_and_insert,
+    )
+
+    springvale = {'locality': 'SPRINGVALE', 'state': 'VIC', 'postcode': '3171', 
+                  'lat': -37.949, 'long': 145.152}
+    alice = {'locality': 'ALICE SPRINGS', 'state': 'NT', 'postcode': '0870', 'lat': 0, 'long': 0}
+    ascot = {'locality': 'ASCOT', 'state': 'QLD', 'postcode': '4007', 'lat': -27.43, 'long': 153.06}
+
+    def coordinates():
+        connection = psycopg2.connect(**get_database_connection())
+        try:
+            cursor = connection.cursor()
+            cursor.execute(format_sql_statement('SELECT locality, latitude, longitude FROM {0}.{1} '
+                                                'ORDER BY locality, state, postcode'))
+            return cursor.fetchall()
+        finally:
+            connection.close()
+
+    create_database()
+    # Listed twice: the average of both.
+    delta_table([springvale, alice, ascot, dict(ascot, lat=-27.45, long=153.08)], 1_600_000_000)
+    assert extract_and_insert() == {'read': 4, 'inserted': 3, 'deleted': 0, 'updated': 0, 'unchanged': 0}
+
+    rows = coordinates()
+    assert rows[0] == ('ALICE SPRINGS', None, None)
+    assert rows[1][0] == 'ASCOT' and rows[1][1:] == pytest.approx((-27.44, 153.07))
+    assert rows[2] == ('SPRINGVALE', -37.949, 145.152)
+
+    delta_table([dict(springvale, lat=-37.95), alice, ascot], 1_700_000_000)
+    assert extract_and_insert() == {'read': 3, 'inserted': 0, 'deleted': 0, 'updated': 2, 'unchanged': 1}
+
+    rows = coordinates()
+    assert rows[1][1:] == (-27.43, 153.06)
+    assert rows[2] == ('SPRINGVALE', -37.95, 145.152)